@@ -3,136 +3,216 @@
 
 import os
 import struct
-from typing import Optional, List, Tuple
+import threading
+from typing import Optional, List, Tuple, Dict
+
+from teltonika_protocol import MAX_AVL_DATA_LENGTH, calculate_crc16, get_codec
+
+AVL_PREAMBLE = b'\x00\x00\x00\x00'
+AVL_HEADER_LENGTH = 8       # preamble(4) + data length(4)
+AVL_CRC_LENGTH = 4
+
+_DATA_LENGTH = struct.Struct('>I')
+
+
+class StreamBuffer:
+    """
+    Paměťový reassembly buffer jednoho TCP spojení
+    Data drží v jednom bytearray s kurzorem, kompletní AVL rámce vrací jako
+    memoryview bez kopírování. Rámce jsou platné i po dalším feed().
+    Vrací jen rámce s platným CRC, přeskočená data počítá v discarded.
+    """
+    __slots__ = ('_buf', '_pos', 'discarded')
+
+    def __init__(self, initial: bytes = b''):
+        self._buf = bytearray(initial)
+        self._pos = 0
+        # Počet bytů zahozených při hledání platného rámce
+        self.discarded = 0
+
+    def __len__(self) -> int:
+        """Počet bytů čekajících na dokončení rámce"""
+        return len(self._buf) - self._pos
+
+    def feed(self, data: bytes):
+        """Připojí nově přijatá data"""
+        try:
+            # Zahoď už zpracovaná data a připoj nová
+            if self._pos:
+                del self._buf[:self._pos]
+            self._buf += data
+        except BufferError:
+            # Předchozí rámce jsou stále exportované jako memoryview - začni nový buffer
+            pending = bytearray(memoryview(self._buf)[self._pos:])
+            pending += data
+            self._buf = pending
+        self._pos = 0
+
+    def pop_frames(self) -> List[memoryview]:
+        """
+        Vrátí kompletní AVL rámce (preamble + length + data + CRC) a posune kurzor
+        Kandidát s neplatnou délkou nebo CRC (neúplný s neznámým kodekem) se zahodí
+        a hledá se další preamble - náhodné nuly v datech tak nespolknou následující
+        platné rámce.
+        """
+        buf = self._buf
+        end = len(buf)
+        pos = start = self._pos
+        frames = []
+        view = None
+        skipped = 0
+
+        while end - pos >= AVL_HEADER_LENGTH:
+            # Kontrola preamble (4 nulové bytes)
+            if not buf.startswith(AVL_PREAMBLE, pos):
+                # Hledej začátek dalšího packetu
+                found = buf.find(AVL_PREAMBLE, pos + 1)
+                if found == -1:
+                    # Ponech poslední 3 byty - mohou být začátkem preamble
+                    pos = max(pos, end - 3)
+                    break
+                pos = found
+                continue
+
+            # Načti a zvaliduj délku dat (stejný limit jako parser)
+            data_length = _DATA_LENGTH.unpack_from(buf, pos + 4)[0]
+            if data_length < 4 or data_length > MAX_AVL_DATA_LENGTH:
+                # Nevalidní délka, hledej další preamble
+                pos += 1
+                continue
+
+            # Celková délka packetu: preamble(4) + length(4) + data + CRC(4)
+            total_packet_length = AVL_HEADER_LENGTH + data_length + AVL_CRC_LENGTH
+            if pos + total_packet_length > end:
+                if end > pos + AVL_HEADER_LENGTH and get_codec(buf[pos + AVL_HEADER_LENGTH]) is None:
+                    # Neznámý kodek - falešná preamble, nečekej na data podle její délky
+                    pos += 1
+                    continue
+                # Neúplný packet - počkej na další data
+                break
+
+            if view is None:
+                view = memoryview(buf)
+            data_end = pos + AVL_HEADER_LENGTH + data_length
+            if calculate_crc16(view[pos + AVL_HEADER_LENGTH:data_end]) != _DATA_LENGTH.unpack_from(buf, data_end)[0]:
+                # Poškozený rámec nebo falešná preamble uvnitř dat
+                pos += 1
+                continue
+
+            skipped += pos - start
+            frames.append(view[pos:pos + total_packet_length])
+            pos += total_packet_length
+            start = pos
+
+        self.discarded += skipped + pos - start
+        self._pos = pos
+        return frames
+
+    def remaining(self) -> bytes:
+        """Vrátí kopii neúplných dat"""
+        return bytes(self._buf[self._pos:])
+
+    def clear(self):
+        """Zahodí všechna data"""
+        try:
+            del self._buf[:]
+        except BufferError:
+            self._buf = bytearray()
+        self._pos = 0
 
 
 class BufferManager:
-    def __init__(self, base_dir='/share/teltonika'):
+    def __init__(self, base_dir='/share/teltonika', spill_to_disk=False):
         self.base_dir = base_dir
         self.devices_dir = os.path.join(base_dir, 'devices')
-        
+        # Při odpojení uložit neúplná data do buffer.tmp (pro diagnostiku)
+        self.spill_to_disk = spill_to_disk
+
+        # Aktivní paměťové buffery podle IMEI
+        self._buffers: Dict[str, StreamBuffer] = {}
+        self._lock = threading.Lock()
+
         # Vytvoř složku pro zařízení
         os.makedirs(self.devices_dir, exist_ok=True)
-    
+
     def _get_buffer_file(self, imei: str) -> str:
         """Vrátí cestu k buffer souboru pro dané IMEI"""
         device_dir = os.path.join(self.devices_dir, imei)
         os.makedirs(device_dir, exist_ok=True)
         return os.path.join(device_dir, 'buffer.tmp')
-    
+
+    def open_buffer(self, imei: str) -> StreamBuffer:
+        """Vytvoří paměťový buffer pro nové spojení daného IMEI"""
+        stream_buffer = StreamBuffer()
+        with self._lock:
+            self._buffers[imei] = stream_buffer
+        return stream_buffer
+
+    def close_buffer(self, imei: str, stream_buffer: Optional[StreamBuffer] = None):
+        """Uvolní buffer při odpojení, volitelně uloží neúplná data na disk"""
+        with self._lock:
+            current = self._buffers.get(imei)
+            if stream_buffer is None:
+                stream_buffer = current
+            # Nové spojení téhož IMEI mohlo buffer mezitím nahradit
+            if current is stream_buffer:
+                del self._buffers[imei]
+
+        if stream_buffer is not None and self.spill_to_disk and len(stream_buffer):
+            try:
+                with open(self._get_buffer_file(imei), 'wb') as f:
+                    f.write(stream_buffer.remaining())
+            except Exception as e:
+                print(f"⚠️ Nelze uložit buffer pro IMEI {imei}: {e}")
+
     def append_data(self, imei: str, data: bytes):
         """Připojí nová data do bufferu pro dané IMEI"""
-        buffer_file = self._get_buffer_file(imei)
-        
-        with open(buffer_file, 'ab') as f:
-            f.write(data)
-    
-    def get_complete_packets(self, imei: str) -> Tuple[List[bytes], bytes]:
+        with self._lock:
+            stream_buffer = self._buffers.get(imei)
+            if stream_buffer is None:
+                stream_buffer = self._buffers[imei] = StreamBuffer()
+        stream_buffer.feed(data)
+
+    def get_complete_packets(self, imei: str) -> Tuple[List[memoryview], bytes]:
         """
         Vrátí seznam kompletních AVL paketů a zbývající neúplná data
         Returns: (complete_packets, remaining_data)
         """
-        buffer_file = self._get_buffer_file(imei)
-        
-        if not os.path.exists(buffer_file):
-            return [], b''
-        
-        # Načti všechna data z bufferu
-        with open(buffer_file, 'rb') as f:
-            buffer_data = f.read()
-        
-        if len(buffer_data) == 0:
+        stream_buffer = self._buffers.get(imei)
+        if stream_buffer is None:
             return [], b''
-        
-        complete_packets = []
-        offset = 0
-        
-        while offset < len(buffer_data):
-            # Zkontroluj jestli máme dostatek dat pro header (8 bytes)
-            if offset + 8 > len(buffer_data):
-                # Nedostatek dat pro header
-                remaining = buffer_data[offset:]
-                break
-            
-            # Kontrola preamble (4 nulové bytes)
-            preamble = buffer_data[offset:offset+4]
-            if preamble != b'\x00\x00\x00\x00':
-                # Hledej začátek dalšího packetu
-                found = False
-                for i in range(offset + 1, len(buffer_data) - 3):
-                    if buffer_data[i:i+4] == b'\x00\x00\x00\x00':
-                        offset = i
-                        found = True
-                        break
-                if not found:
-                    # Žádný validní packet nenalezen
-                    remaining = b''
-                    break
-                continue
-            
-            # Načti délku dat
-            try:
-                data_length = struct.unpack('>I', buffer_data[offset+4:offset+8])[0]
-            except:
-                # Chyba při čtení délky
-                offset += 4
-                continue
-            
-            # Validace délky
-            if data_length < 4 or data_length > 100000:
-                # Nevalidní délka, posuň se
-                offset += 4
-                continue
-            
-            # Celková délka packetu: preamble(4) + length(4) + data + CRC(4)
-            total_packet_length = 8 + data_length + 4
-            
-            # Zkontroluj jestli máme kompletní packet
-            if offset + total_packet_length > len(buffer_data):
-                # Neúplný packet
-                remaining = buffer_data[offset:]
-                break
-            
-            # Extrahuj kompletní packet
-            packet = buffer_data[offset:offset + total_packet_length]
-            complete_packets.append(packet)
-            offset += total_packet_length
-        else:
-            # Všechna data byla zpracována
-            remaining = b''
-        
-        # Přepiš buffer soubor se zbývajícími daty
-        if remaining:
-            with open(buffer_file, 'wb') as f:
-                f.write(remaining)
-        else:
-            # Smaž prázdný buffer
-            try:
-                os.remove(buffer_file)
-            except:
-                pass
-        
-        return complete_packets, remaining
-    
+
+        complete_packets = stream_buffer.pop_frames()
+        return complete_packets, stream_buffer.remaining()
+
     def clear_buffer(self, imei: str):
         """Vyčistí buffer pro dané IMEI"""
-        buffer_file = self._get_buffer_file(imei)
+        stream_buffer = self._buffers.get(imei)
+        if stream_buffer is not None:
+            stream_buffer.clear()
+
+        buffer_file = os.path.join(self.devices_dir, imei, 'buffer.tmp')
         try:
             os.remove(buffer_file)
         except:
             pass
-    
+
     def get_buffer_size(self, imei: str) -> int:
         """Vrátí velikost bufferu pro dané IMEI v bytech"""
-        buffer_file = self._get_buffer_file(imei)
+        stream_buffer = self._buffers.get(imei)
+        if stream_buffer is not None:
+            return len(stream_buffer)
+
+        buffer_file = os.path.join(self.devices_dir, imei, 'buffer.tmp')
         try:
             return os.path.getsize(buffer_file)
         except:
             return 0
-    
+
     def get_all_buffered_imeis(self) -> List[str]:
-        """Vrátí seznam všech IMEI s aktivními buffery"""
-        imeis = []
+        """Vrátí seznam všech IMEI s aktivními nebo uloženými buffery"""
+        with self._lock:
+            imeis = {imei for imei, stream_buffer in self._buffers.items() if len(stream_buffer)}
         try:
             if os.path.exists(self.devices_dir):
                 for dirname in os.listdir(self.devices_dir):
@@ -140,16 +220,16 @@ class BufferManager:
                     if os.path.isdir(device_dir):
                         buffer_file = os.path.join(device_dir, 'buffer.tmp')
                         if os.path.exists(buffer_file) and os.path.getsize(buffer_file) > 0:
-                            imeis.append(dirname)
+                            imeis.add(dirname)
         except:
             pass
         return sorted(imeis)
-    
+
     def cleanup_old_buffers(self, max_size_mb=10):
         """Smaže buffery větší než max_size_mb MB (ochrana proti zahlcení)"""
         max_size_bytes = max_size_mb * 1024 * 1024
-        
+
         for imei in self.get_all_buffered_imeis():
             if self.get_buffer_size(imei) > max_size_bytes:
                 print(f"⚠️ Buffer pro IMEI {imei} je příliš velký ({self.get_buffer_size(imei)} bytes), mažu...")
-                self.clear_buffer(imei)
\ No newline at end of file
+                self.clear_buffer(imei)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Fronta příkazů pro připojená zařízení (Codec12 přes otevřené TCP spojení)"""
+
+import itertools
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from time_service import epoch_ms
+
+# Kolik nevyřízených příkazů smí čekat na jedno zařízení
+MAX_PENDING_COMMANDS = 32
+# Maximální délka textu příkazu (znaků ASCII)
+MAX_COMMAND_LENGTH = 512
+# Jak dlouho (s) se čeká na odpověď odeslaného příkazu, než se pošle další
+COMMAND_RESPONSE_TIMEOUT = 60.0
+# Kolik posledních příkazů (všech zařízení) se drží pro dotazy přes API
+COMMAND_HISTORY_SIZE = 1000
+
+# Stavy příkazu
+QUEUED = 'queued'
+SENT = 'sent'
+ANSWERED = 'answered'
+REJECTED = 'rejected'
+TIMEOUT = 'timeout'
+FAILED = 'failed'
+
+
+class DeviceCommand:
+    """Jeden příkaz a jeho stav - odpověď zařízení se doplní při korelaci"""
+    __slots__ = ('command_id', 'imei', 'command', 'status', 'created_ms', 'sent_ms', 'answered_ms', 'response')
+
+    def __init__(self, command_id: int, imei: str, command: str):
+        self.command_id = command_id
+        self.imei = imei
+        self.command = command
+        self.status = QUEUED
+        self.created_ms = epoch_ms()
+        self.sent_ms = None
+        self.answered_ms = None
+        self.response = None
+
+    def to_dict(self) -> dict:
+        return {'id': self.command_id, 'imei': self.imei, 'command': self.command, 'status': self.status,
+                'created_ms': self.created_ms, 'sent_ms': self.sent_ms, 'answered_ms': self.answered_ms,
+                'response': self.response}
+
+
+class CommandQueue:
+    """
+    Příkazy podle IMEI - spojení zařízení si po odeslání ACK vyzvedne další příkaz
+    a pošle ho stejným socketem. Odpovědi Codec12 neobsahují ID příkazu, proto
+    je na zařízení odeslaný vždy nejvýše jeden příkaz a první odpověď patří jemu.
+    """
+
+    def __init__(self, response_timeout: float = COMMAND_RESPONSE_TIMEOUT, max_pending: int = MAX_PENDING_COMMANDS,
+                 history_size: int = COMMAND_HISTORY_SIZE):
+        self.response_timeout = response_timeout
+        self.max_pending = max_pending
+        self.history_size = history_size
+        self._pending: Dict[str, deque] = {}
+        self._in_flight: Dict[str, DeviceCommand] = {}
+        self._history = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Callback při změně stavu příkazu (např. živý proud web UI)
+        self.on_change = None
+
+    def enqueue(self, imei: str, command: str) -> DeviceCommand:
+        """Zařadí příkaz - ValueError při neplatném textu nebo plné frontě zařízení"""
+        command = command.strip()
+        if not command or len(command) > MAX_COMMAND_LENGTH or not command.isascii() or not command.isprintable():
+            raise ValueError(f"Command must be 1-{MAX_COMMAND_LENGTH} printable ASCII characters")
+        with self._lock:
+            pending = self._pending.setdefault(imei, deque())
+            if len(pending) >= self.max_pending:
+                raise ValueError(f"Too many pending commands for IMEI {imei}")
+            item = DeviceCommand(next(self._ids), imei, command)
+            pending.append(item)
+            self._remember(item)
+        self._changed(item)
+        return item
+
+    def has_pending(self, imei: str) -> bool:
+        """Levná kontrola ve spojení - bez zámku, jen zda je co posílat"""
+        return bool(self._pending.get(imei)) or imei in self._in_flight
+
+    def next_command(self, imei: str) -> Optional[DeviceCommand]:
+        """
+        Vyzvedne další příkaz k odeslání a označí ho jako odeslaný
+        Dokud odeslaný příkaz čeká na odpověď, vrací None (po timeoutu se pokračuje dalším)
+        """
+        expired = None
+        with self._lock:
+            current = self._in_flight.get(imei)
+            if current is not None:
+                if epoch_ms() - current.sent_ms < self.response_timeout * 1000:
+                    return None
+                current.status = TIMEOUT
+                expired = self._in_flight.pop(imei)
+            pending = self._pending.get(imei)
+            item = pending.popleft() if pending else None
+            if pending is not None and not pending:
+                del self._pending[imei]
+            if item is not None:
+                item.status = SENT
+                item.sent_ms = epoch_ms()
+                self._in_flight[imei] = item
+        if expired is not None:
+            self._changed(expired)
+        if item is not None:
+            self._changed(item)
+        return item
+
+    def complete(self, imei: str, response: str, rejected: bool = False) -> Optional[DeviceCommand]:
+        """Přiřadí odpověď zařízení odeslanému příkazu, None pokud žádný nečeká"""
+        with self._lock:
+            item = self._in_flight.pop(imei, None)
+            if item is None:
+                return None
+            item.status = REJECTED if rejected else ANSWERED
+            item.answered_ms = epoch_ms()
+            item.response = response
+        self._changed(item)
+        return item
+
+    def disconnect(self, imei: str):
+        """Spojení skončilo - na odeslaný příkaz už odpověď nepřijde, čekající zůstávají"""
+        with self._lock:
+            item = self._in_flight.pop(imei, None)
+            if item is None:
+                return
+            item.status = FAILED
+        self._changed(item)
+
+    def get(self, command_id: int) -> Optional[dict]:
+        with self._lock:
+            item = self._history.get(command_id)
+            return item.to_dict() if item is not None else None
+
+    def list_commands(self, imei: Optional[str] = None) -> List[dict]:
+        """Poslední příkazy od nejnovějšího (volitelně jen jednoho zařízení)"""
+        with self._lock:
+            return [item.to_dict() for item in reversed(self._history.values()) if imei is None or item.imei == imei]
+
+    def stats(self) -> dict:
+        """Metriky pro /api/stats"""
+        with self._lock:
+            return {'pending': sum(len(pending) for pending in self._pending.values()),
+                    'in_flight': len(self._in_flight)}
+
+    def _remember(self, item: DeviceCommand):
+        self._history[item.command_id] = item
+        while len(self._history) > self.history_size:
+            self._history.popitem(last=False)
+
+    def _changed(self, item: DeviceCommand):
+        if self.on_change is not None:
+            self.on_change(item.to_dict())
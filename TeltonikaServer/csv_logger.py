@@ -1,44 +1,437 @@
 #!/usr/bin/env python3
 """CSV Logger for Teltonika GPS data"""
 
+import base64
+import binascii
 import csv
+import json
 import os
+import threading
+import zlib
+from collections import OrderedDict, deque
 from datetime import datetime
-from collections import deque
-import pytz
+from functools import partial
+
+from command_queue import CommandQueue
+from device_summary import DeviceSummaryCache, SUMMARY_FILE
+from event_log import BufferedEventLog
+from live_feed import LiveFeed
+from teltonika_protocol import format_packet_for_json
+from record_store import (RecordStore, RECORD_FILE, ENTRY_OVERHEAD, FILE_MAGIC, StoredFrame, iter_file_frames,
+                          iter_file_headers)
+from segments import data_size, is_compressed, list_segments, open_segment, rotate_file, segment_time
+from time_index import INDEX_SUFFIX, SparseTimeIndex
+from time_service import get_time_service
+
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+def read_tail_lines(path, count, block_size=None, with_offsets=False):
+    """
+    Načte posledních N řádků souboru - čte bloky od konce souboru, takže čas
+    nezávisí na velikosti souboru
+    Returns: (lines, reached_start) - kompletní řádky jako bytes bez konce řádku
+    (může jich být víc než N) a příznak, zda čtení došlo až na začátek souboru
+    S with_offsets jsou řádky dvojice (offset řádku v souboru, řádek)
+    """
+    if count <= 0:
+        return [], False
+    block_size = block_size or TAIL_BLOCK_SIZE
+
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        chunks = []
+        newlines = 0
+        # N kompletních řádků = N + 1 konců řádků (poslední řádek končí '\n')
+        while pos > 0 and newlines <= count:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            chunk = f.read(size)
+            chunks.append(chunk)
+            newlines += chunk.count(b'\n')
+
+    lines = b''.join(reversed(chunks)).split(b'\n')
+    if lines[-1] == b'':
+        lines.pop()
+    if with_offsets:
+        lines = list(_with_line_offsets(lines, pos))
+    else:
+        lines = [line.rstrip(b'\r') for line in lines]
+    if pos > 0:
+        # První řádek bloku může být useknutý
+        lines = lines[1:]
+    return lines, pos == 0
+
+
+def _with_line_offsets(lines, offset):
+    """Doplní k řádkům jejich offset v souboru"""
+    for line in lines:
+        yield offset, line.rstrip(b'\r')
+        offset += len(line) + 1
+
+
+# Kolik dekódovaných rámců drží cache pro dekódovaný režim API
+DECODE_CACHE_SIZE = 8192
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Řádek CSV z data.bin: "YYYY-MM-DD HH:MM:SS," + hex rámce + "\r\n"
+_EXPORT_ROW_OVERHEAD = len('2000-01-01 00:00:00,\r\n')
+
+
+class CSVExport:
+    """
+    CSV export zařízení jako virtuální soubor se známou velikostí: hlavička, řádky
+    segmentů a aktivního data.csv a pak řádky segmentů a aktivního data.bin.
+    Velikost řádku z data.bin je daná délkou rámce, takže lze spočítat Content-Length
+    a číst libovolný rozsah bytů bez sestavení celého exportu.
+    Soubory se otevřou při vytvoření snapshotu - rotace ani komprese segmentu během
+    stahování export nerozbije. Po použití zavřít (close() nebo with).
+    """
+
+    def __init__(self, logger, imei):
+        self.logger = logger
+        self.imei = imei
+        self.header = (','.join(logger.csv_headers) + '\r\n').encode('utf-8')
+        self._files = []
+        try:
+            self._snapshot()
+        except BaseException:
+            self.close()
+            raise
+
+    def _snapshot(self):
+        """Otevře datové soubory a zapamatuje si jejich velikosti"""
+        logger = self.logger
+        imei = self.imei
+        # Snapshot velikostí - data zapsaná během stahování už do exportu nepatří
+        # Části exportu: (velikost v exportu, generátor bloků)
+        self._parts = [(len(self.header), self._iter_header)]
+        signature = []
+        mtimes = [0]
+        for name in logger.csv_files(imei):
+            f, size, mtime = self._open(os.path.join(logger.devices_dir, imei, name))
+            if f is None:
+                continue
+            mtimes.append(mtime)
+            # Každý soubor začíná vlastní hlavičkou - v exportu je jen jedna
+            skip = _csv_header_length(f)
+            if size > skip:
+                self._parts.append((size - skip, partial(self._iter_csv, f, skip, size)))
+                signature.append((name, size))
+
+        files = logger.summary.get(imei)
+        for name in logger.record_store.list_record_files(imei):
+            entry = files.get(name)
+            if not entry or not entry['records']:
+                continue
+            f, size, mtime = self._open(logger.record_store.get_record_file(imei, name))
+            if f is None:
+                continue
+            mtimes.append(mtime)
+            # Aktivní soubor jen do konce posledního započítaného záznamu
+            end = entry['size'] if name == RECORD_FILE else size
+            frame_bytes = end - len(FILE_MAGIC) - entry['records'] * ENTRY_OVERHEAD
+            rows_size = entry['records'] * _EXPORT_ROW_OVERHEAD + 2 * frame_bytes
+            self._parts.append((rows_size, partial(self._iter_bin_rows, f, name, end)))
+            signature.append((name, end))
+
+        self.size = sum(part_size for part_size, _ in self._parts)
+        self.mtime = max(mtimes)
+        self.etag = f'"{self.size:x}-{zlib.crc32(repr(signature).encode("utf-8")):08x}"'
+
+    def _open(self, path):
+        """
+        Otevře soubor exportu - (soubor, velikost dat, mtime), (None, 0, 0) pokud neexistuje
+        Segment, který se právě zkomprimoval, open_segment otevře z .gz
+        """
+        try:
+            f = open_segment(path)
+        except FileNotFoundError:
+            return None, 0, 0
+        self._files.append(f)
+        if is_compressed(f.name):
+            return f, data_size(f.name), os.path.getmtime(f.name)
+        stat = os.fstat(f.fileno())
+        return f, stat.st_size, stat.st_mtime
+
+    def close(self):
+        for f in self._files:
+            f.close()
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def iter_bytes(self, start=0, end=None):
+        """Vrací byty exportu v rozsahu [start, end) po blocích (konstantní paměť)"""
+        end = self.size if end is None else min(end, self.size)
+        pos = 0
+        for part_size, part in self._parts:
+            if pos >= end:
+                return
+            if pos + part_size > start:
+                for chunk_start, chunk in part(pos, start):
+                    if chunk_start + len(chunk) <= start:
+                        continue
+                    if chunk_start >= end:
+                        break
+                    yield chunk[max(0, start - chunk_start):end - chunk_start]
+            pos += part_size
+
+    def _iter_header(self, base, start):
+        yield base, self.header
+
+    def _iter_csv(self, f, skip, size, base, start):
+        """Byty CSV souboru (bez jeho hlavičky) od požadovaného offsetu"""
+        offset = skip + max(0, start - base)
+        f.seek(offset)
+        while offset < size:
+            chunk = f.read(min(EXPORT_CHUNK_SIZE, size - offset))
+            if not chunk:
+                return
+            yield base + offset - skip, chunk
+            offset += len(chunk)
+
+    def _iter_bin_rows(self, f, file_name, end, base, start):
+        """Řádky CSV z data.bin - záznamy před požadovaným offsetem se přeskočí podle hlaviček"""
+        row_pos = base
+        first_offset = None
+        for offset, _, length in iter_file_headers(f, end):
+            row_size = _EXPORT_ROW_OVERHEAD + 2 * length
+            if row_pos + row_size > start:
+                first_offset = offset
+                break
+            row_pos += row_size
+        if first_offset is None:
+            return
+
+        rows = []
+        rows_size = 0
+        for stored_frame in iter_file_frames(f, first_offset, file_name):
+            if stored_frame.offset >= end:
+                break
+            row = b''.join((self.logger._format_epoch_ms(stored_frame.received_ms).encode('ascii'), b',',
+                            binascii.hexlify(stored_frame.frame).upper(), b'\r\n'))
+            rows.append(row)
+            rows_size += len(row)
+            if rows_size >= EXPORT_CHUNK_SIZE:
+                yield row_pos, b''.join(rows)
+                row_pos += rows_size
+                rows = []
+                rows_size = 0
+        if rows:
+            yield row_pos, b''.join(rows)
+
+
+def _csv_header_length(f):
+    """Délka řádku s hlavičkou na začátku otevřeného CSV souboru (0 pokud soubor hlavičku nemá)"""
+    f.seek(0)
+    first_line = f.readline()
+    return len(first_line) if first_line.startswith(b'timestamp') else 0
+
+
+def encode_cursor(file_name, offset, start_ms, end_ms, row_ms):
+    """
+    Sestaví neprůhledný kurzor další stránky - soubor a offset záznamu, časové okno
+    a čas záznamu (pro ověření, že aktivní soubor mezitím nebyl uzavřen rotací)
+    """
+    data = json.dumps([file_name, offset, start_ms, end_ms, row_ms], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Rozloží kurzor na (soubor, offset, start_ms, end_ms, row_ms), ValueError pro neplatný kurzor"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        file_name, offset, start_ms, end_ms, row_ms = json.loads(data)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(offset, int) or offset < 0 or not isinstance(row_ms, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return file_name, offset, start_ms, end_ms, row_ms
+
+
+def _is_record_file(file_name):
+    """data.bin nebo jeho segment (data-<čas>.bin[.gz])"""
+    return file_name == RECORD_FILE or '.bin' in file_name
+
+
+# Sdílené instance podle base_dir - TCP server i web server pak používají stejný souhrn zařízení
+_shared_loggers = {}
+_shared_loggers_lock = threading.Lock()
+
+def get_shared_logger(base_dir='/share/teltonika'):
+    """Vrátí sdílenou instanci CSVLogger pro danou složku"""
+    key = os.path.abspath(base_dir)
+    with _shared_loggers_lock:
+        logger = _shared_loggers.get(key)
+        if logger is None:
+            logger = _shared_loggers[key] = CSVLogger(base_dir)
+        return logger
 
 
 class CSVLogger:
-    def __init__(self, base_dir='/share/teltonika'):
+    def __init__(self, base_dir='/share/teltonika', raw_storage='binary'):
         self.base_dir = base_dir
         self.devices_dir = os.path.join(base_dir, 'devices')
         self.server_log = os.path.join(base_dir, 'server.log')
         self.csv_headers = ['timestamp', 'raw_data']
         
+        # Úložiště surových rámců: binary = devices/<imei>/data.bin, csv = hex v data.csv
+        # Čtení vždy spojuje obě úložiště (starší data v data.csv zůstávají dostupná)
+        self.raw_storage = raw_storage
+        self.record_store = RecordStore(base_dir)
+        self.record_store.on_rotate = self._on_rotate
+        
+        # Rotace data.csv, data.bin a server.log do segmentů (None = bez rotace, viz set_rotation)
+        self.rotation = None
+        
+        # Verze dat a server logu - mění se při každém zápisu (zneplatňuje cache web serveru),
+        # zvyšují se pod zámkem (zapisuje více storage workerů i vlákno server logu)
+        self.data_version = 0
+        self.log_version = 0
+        self._version_lock = threading.Lock()
+        
+        # Živý proud nových záznamů a řádků logu pro web UI (/api/events)
+        self.live_feed = LiveFeed()
+        
+        # Další zdroje metrik pro /api/stats (název -> funkce vracející dict), viz register_stats
+        self._stats_providers = {}
+        
+        # Příkazy pro zařízení zadané přes web API, posílá je TCP spojení zařízení
+        self.commands = CommandQueue()
+        self.commands.on_change = self._on_command_changed
+        self.register_stats('commands', self.commands.stats)
+        
+        # Server log se zapisuje po dávkách na pozadí (log_server_event jen zařadí řádek)
+        self.event_log = BufferedEventLog(self.server_log, format_line=self._format_log_line,
+                                          before_write=lambda: self._maybe_rotate_file(self.server_log),
+                                          on_write=self._on_log_written)
+        
         # Nastavení časové zóny - zkus HA timezone, pak lokální
-        self.timezone = self._get_timezone()
+        self.time_service = get_time_service()
+        self.timezone = self.time_service.timezone
         
         # Vytvoř základní strukturu
         os.makedirs(self.devices_dir, exist_ok=True)
         os.makedirs(os.path.dirname(self.server_log), exist_ok=True)
+        
+        # Souhrn zařízení (počet záznamů, poslední záznam, velikost) pro /api/devices
+        self.summary = DeviceSummaryCache(self.devices_dir, os.path.join(base_dir, SUMMARY_FILE),
+                                          self._scan_device_file, file_names=self.device_files)
+        
+        # Řídké indexy čas → offset podle (imei, soubor), vytvářené při prvním dotazu
+        self._time_indexes = {}
+        self._time_indexes_lock = threading.Lock()
+        
+        # Dekódované rámce podle (imei, soubor, offset, čas přijetí) - každý rámec se dekóduje jednou
+        self._decoded_frames = OrderedDict()
+        self._decoded_frames_lock = threading.Lock()
     
-    def _get_timezone(self):
-        """Získej časovou zónu z HA prostředí"""
-        tz_name = os.environ.get('TZ', 'Europe/Prague')
-        return pytz.timezone(tz_name)
+    def set_rotation(self, policy):
+        """Nastaví rotaci datových souborů a server logu (segments.RotationPolicy nebo None)"""
+        self.rotation = policy
+        self.record_store.rotation = policy
     
-    def _get_local_time(self):
-        """Vrátí aktuální čas v správné časové zóně"""
-        if self.timezone:
-            return datetime.now(self.timezone).strftime('%Y-%m-%d %H:%M:%S')
+    def csv_files(self, imei):
+        """Názvy CSV souborů zařízení od nejstaršího - uzavřené segmenty a aktivní data.csv"""
+        csv_file = os.path.join(self.devices_dir, imei, 'data.csv')
+        names = [os.path.basename(segment) for segment in list_segments(csv_file)]
+        if os.path.exists(csv_file):
+            names.append('data.csv')
+        return names
+    
+    def device_files(self, imei):
+        """Všechny datové soubory zařízení - nejdřív CSV, pak binární (pořadí exportu a dotazů)"""
+        return self.csv_files(imei) + self.record_store.list_record_files(imei)
+    
+    def _maybe_rotate_file(self, path):
+        """Uzavře aktivní soubor jako segment, pokud to vyžaduje nastavená rotace"""
+        if self.rotation is None:
+            return None
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if not self.rotation.should_rotate(st.st_size, st.st_mtime):
+            return None
+        return rotate_file(path, self.rotation)
+    
+    def _on_rotate(self, imei, segment):
+        """Aktivní datový soubor zařízení byl uzavřen - jeho souhrn a index začínají znovu"""
+        file_name = RECORD_FILE if _is_record_file(os.path.basename(segment)) else 'data.csv'
+        self.summary.forget(imei, file_name)
+        with self._time_indexes_lock:
+            index = self._time_indexes.pop((imei, file_name), None)
+        if index is not None:
+            index.reset()
         else:
-            return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            try:
+                os.remove(os.path.join(self.devices_dir, imei, file_name + INDEX_SUFFIX))
+            except FileNotFoundError:
+                pass
+        self._bump_data_version()
+    
+    def _bump_data_version(self):
+        """Nová verze dat - zneplatní cache web serveru"""
+        with self._version_lock:
+            self.data_version += 1
+    
+    def _get_local_time(self):
+        """Vrátí aktuální čas v správné časové zóně (text se formátuje jednou za sekundu)"""
+        return self.time_service.local_time()
+    
+    def parse_time(self, value):
+        """Převede čas z API (epoch ms nebo lokální 'YYYY-MM-DD[ HH:MM:SS]') na epoch ms"""
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+        for time_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+            try:
+                local_time = datetime.strptime(value, time_format)
+            except ValueError:
+                continue
+            return self.time_service.parse_local(local_time)
+        raise ValueError(f"Invalid time: {value}")
+    
+    def _format_epoch_ms(self, epoch_ms):
+        """Převede čas v epoch ms na lokální čas ve stejném formátu jako data.csv"""
+        return self.time_service.format_epoch_ms(epoch_ms)
     
     def log_server_event(self, message):
-        """Zaloguje událost do hlavního server logu"""
-        timestamp = self._get_local_time()
-        with open(self.server_log, 'a', encoding='utf-8') as f:
-            f.write(f"[{timestamp}] {message}\n")
+        """Zaloguje událost do hlavního server logu (zápis proběhne na pozadí, viz event_log)"""
+        self.event_log.write(message)
+    
+    def _format_log_line(self, message):
+        return f"[{self._get_local_time()}] {message}"
+    
+    def _on_log_written(self, lines):
+        """Dávka řádků je zapsaná v server.log - zneplatni cache a pošli řádky odběratelům"""
+        with self._version_lock:
+            self.log_version += 1
+        if self.live_feed.has_subscribers:
+            for line in lines:
+                self.live_feed.publish('log', {'line': line})
+    
+    def _on_command_changed(self, command):
+        """Změna stavu příkazu (zařazen, odeslán, odpověď) pro odběratele živého proudu"""
+        if self.live_feed.has_subscribers:
+            self.live_feed.publish('command', command)
+    
+    def register_stats(self, name, provider):
+        """Přidá zdroj metrik do /api/stats (např. ingest pipeline TCP serveru)"""
+        self._stats_providers[name] = provider
+    
+    def get_stats(self):
+        """Provozní metriky pro /api/stats"""
+        stats = {'event_log': self.event_log.stats()}
+        for name, provider in list(self._stats_providers.items()):
+            stats[name] = provider()
+        return stats
     
     def log_raw_data(self, client_address, imei, hex_data):
         """Zaloguje RAW hex data do server logu"""
@@ -49,13 +442,17 @@ class CSVLogger:
         message = f"RAW DATA from {client_address} (IMEI: {imei or 'unknown'}): {hex_data}"
         self.log_server_event(message)
     
-    def log_raw_record(self, imei, hex_data):
-        """Zaloguje RAW hex záznam do CSV souboru zařízení"""
+    def log_raw_record(self, imei, hex_data, timestamp=None):
+        """Zaloguje RAW hex záznam do CSV souboru zařízení (timestamp = lokální čas přijetí)"""
         device_dir = os.path.join(self.devices_dir, imei)
         os.makedirs(device_dir, exist_ok=True)
         
         csv_file = os.path.join(device_dir, 'data.csv')
         
+        segment = self._maybe_rotate_file(csv_file)
+        if segment:
+            self._on_rotate(imei, segment)
+        
         # Zkontroluj jestli soubor existuje
         file_exists = os.path.exists(csv_file)
         
@@ -65,34 +462,362 @@ class CSVLogger:
             # Přidej hlavičku pro nový soubor
             if not file_exists:
                 writer.writerow(self.csv_headers)
+            start = f.tell()
             
             # Vytvoř timestamp
-            timestamp = self._get_local_time()
+            if timestamp is None:
+                timestamp = self._get_local_time()
             
             # Vytvoř CSV řádek - jen čas a raw data
             row = [timestamp, hex_data]
             writer.writerow(row)
+            end = f.tell()
+        
+        self.summary.record_append(imei, 'data.csv', start, end, 1, timestamp)
+        self._bump_data_version()
+        if self.live_feed.has_subscribers:
+            self.live_feed.publish('record', {'imei': imei, 'timestamp': timestamp, 'raw_data': hex_data})
     
-    def read_last_records(self, imei, count=2000):
-        """Načte posledních N záznamů z CSV"""
-        csv_file = os.path.join(self.devices_dir, imei, 'data.csv')
+    def log_raw_frame(self, imei, frame, received_ms=None):
+        """Uloží surový AVL rámec podle nastaveného úložiště (binary / csv)"""
+        if received_ms is None:
+            received_ms = self.time_service.epoch_ms()
+        if self.raw_storage == 'csv':
+            self.log_raw_record(imei, binascii.hexlify(frame).decode('utf-8').upper(),
+                                self._format_epoch_ms(received_ms))
+        else:
+            start = self.record_store.append(imei, frame, received_ms)
+            self.summary.record_append(imei, RECORD_FILE, start, start + ENTRY_OVERHEAD + len(frame),
+                                       1, received_ms)
+            self._bump_data_version()
+            if self.live_feed.has_subscribers:
+                self.live_feed.publish('record', self._frame_to_row(StoredFrame(start, received_ms, frame), imei))
+    
+    def open_raw_writer(self, imei):
+        """Otevře zapisovač surových rámců na dobu spojení (jen pro binary úložiště)"""
+        if self.raw_storage == 'csv':
+            return None
+        return self.record_store.open_writer(imei)
+    
+    def close_raw_writer(self, imei, writer=None):
+        """Zavře zapisovač surových rámců při odpojení"""
+        if writer is not None:
+            self.record_store.close_writer(imei, writer)
+    
+    def _frame_to_row(self, stored_frame, imei=None):
+        """Převede rámec z binárního úložiště na řádek ve tvaru data.csv (s IMEI pro živý proud)"""
+        row = {
+            'timestamp': self._format_epoch_ms(stored_frame.received_ms),
+            'raw_data': binascii.hexlify(stored_frame.frame).decode('utf-8').upper()
+        }
+        if imei is not None:
+            row = {'imei': imei, **row}
+        return row
+    
+    def read_last_records(self, imei, count=2000, decoded=False):
+        """
+        Načte posledních N záznamů z binárního úložiště a CSV
+        S decoded=True vrací místo hex řádků dekódované rámce (viz decode_row)
+        """
+        # Od aktivního data.bin přes jeho segmenty, dokud není záznamů dost
+        rows = []
+        for file_name in reversed(self.record_store.list_record_files(imei)):
+            missing = count - len(rows)
+            if missing <= 0:
+                break
+            if file_name == RECORD_FILE:
+                frames = self.record_store.read_last_frames(imei, missing)
+            else:
+                frames = deque(self.record_store.iter_frames(imei, file_name=file_name), maxlen=missing)
+            rows[:0] = [(file_name, stored_frame.offset, self._frame_to_row(stored_frame)) for stored_frame in frames]
         
-        if not os.path.exists(csv_file):
-            return []
+        if len(rows) < count:
+            csv_rows = []
+            for file_name in reversed(self.csv_files(imei)):
+                missing = count - len(rows) - len(csv_rows)
+                if missing <= 0:
+                    break
+                csv_rows[:0] = [(file_name, offset, row)
+                                for offset, row in self._read_last_csv_rows(imei, missing, file_name)]
+            rows = csv_rows + rows
+            # Úložiště se mohlo přepínat - seřaď podle času
+            rows.sort(key=lambda item: item[2].get('timestamp') or '')
+        if decoded:
+            return [self.decode_row(imei, file_name, offset, row) for file_name, offset, row in rows]
+        return [row for _, _, row in rows]
+    
+    def decode_row(self, imei, file_name, offset, row):
+        """
+        Dekóduje rámec záznamu: {'timestamp' (přijetí), 'codec', 'records': [...]}
+        Výsledek se drží v LRU cache podle pozice v souboru, takže opakované dotazy
+        na stejná data rámce znovu neparsují
+        """
+        key = (imei, file_name, offset, row.get('timestamp'))
+        with self._decoded_frames_lock:
+            decoded = self._decoded_frames.get(key)
+            if decoded is not None:
+                self._decoded_frames.move_to_end(key)
+                return decoded
+        
+        try:
+            frame = bytes.fromhex(row.get('raw_data') or '')
+        except ValueError:
+            frame = b''
+        decoded = {'timestamp': row.get('timestamp'), **format_packet_for_json(frame)}
         
-        # Použij deque pro efektivní držení posledních N řádků
-        last_records = deque(maxlen=count)
+        with self._decoded_frames_lock:
+            self._decoded_frames[key] = decoded
+            if len(self._decoded_frames) > DECODE_CACHE_SIZE:
+                self._decoded_frames.popitem(last=False)
+        return decoded
+    
+    def query_records(self, imei, start_ms=None, end_ms=None, limit=2000, cursor=None, decoded=False):
+        """
+        Záznamy zařízení v časovém okně [start_ms, end_ms] od nejstaršího, nejvýše limit
+        Segmenty mimo okno se přeskočí podle času rotace, v aktivním souboru se začátek
+        okna najde přes řídký index, další stránka pokračuje od kurzoru - čte se jen
+        vrácená část dat (nejdřív CSV soubory, pak data.bin)
+        Returns: (záznamy, kurzor další stránky nebo None)
+        """
+        files = self._query_files(imei)
+        first_file = 0
+        cursor_offset = None
+        if cursor:
+            cursor_file, cursor_offset, start_ms, end_ms, cursor_ms = decode_cursor(cursor)
+            names = [file_name for file_name, _, _ in files]
+            if cursor_file not in names:
+                # Segment smazala retence - pokračuj podle času
+                return self.query_records(imei, cursor_ms, end_ms, limit, None, decoded)
+            first_file = names.index(cursor_file)
+        
+        records = []
+        for file_name, lower_ms, upper_ms in files[first_file:]:
+            if cursor_offset is not None:
+                offset, cursor_offset = cursor_offset, None
+                resuming = True
+            else:
+                resuming = False
+                if (start_ms is not None and upper_ms is not None and upper_ms < start_ms or
+                        end_ms is not None and lower_ms is not None and lower_ms > end_ms):
+                    continue
+                if start_ms is not None and file_name in ('data.csv', RECORD_FILE):
+                    offset = self._get_time_index(imei, file_name).seek(start_ms)
+                else:
+                    offset = 0
+            
+            # data.bin se filtruje podle epoch ms, data.csv podle lokálního času (text)
+            if _is_record_file(file_name):
+                rows = self._iter_bin_query_rows(imei, offset, file_name)
+                start_key, end_key = start_ms, end_ms
+            else:
+                rows = self._iter_csv_query_rows(imei, offset, file_name)
+                start_key = self._format_epoch_ms(start_ms) if start_ms is not None else None
+                end_key = self._format_epoch_ms(end_ms) if end_ms is not None else None
+            
+            for row_offset, row_key, row in rows:
+                if resuming:
+                    resuming = False
+                    if self._row_ms(row_key) != cursor_ms:
+                        # Aktivní soubor byl mezitím uzavřen rotací - pokračuj podle času
+                        return self.query_records(imei, cursor_ms, end_ms, limit, None, decoded)
+                if start_key is not None and row_key < start_key:
+                    continue
+                if end_key is not None and row_key > end_key:
+                    break
+                if len(records) >= limit:
+                    return records, encode_cursor(file_name, row_offset, start_ms, end_ms, self._row_ms(row_key))
+                records.append(self.decode_row(imei, file_name, row_offset, row) if decoded else row)
+            if resuming:
+                # Na offsetu kurzoru už žádný záznam není (soubor byl uzavřen rotací)
+                return self.query_records(imei, cursor_ms, end_ms, limit, None, decoded)
+        return records, None
+    
+    def _row_ms(self, row_key):
+        """Čas záznamu v epoch ms (data.bin má epoch ms, data.csv lokální čas)"""
+        return row_key if isinstance(row_key, int) else self.parse_time(row_key)
+    
+    def _query_files(self, imei):
+        """
+        Datové soubory v pořadí dotazu s časovými mezemi podle rotace - (název, od ms, do ms)
+        Segment obsahuje data zapsaná mezi rotací předchozího segmentu a svou rotací
+        """
+        files = []
+        for names in (self.csv_files(imei), self.record_store.list_record_files(imei)):
+            lower_ms = None
+            for file_name in names:
+                if file_name in ('data.csv', RECORD_FILE):
+                    files.append((file_name, lower_ms, None))
+                    continue
+                rotated = int(segment_time(file_name) * 1000)
+                # Čas v názvu je zaokrouhlený dolů na sekundy
+                files.append((file_name, lower_ms, rotated + 1000))
+                lower_ms = rotated
+        return files
+    
+    def _get_time_index(self, imei, file_name):
+        """Vrátí řídký časový index datového souboru zařízení"""
+        key = (imei, file_name)
+        with self._time_indexes_lock:
+            index = self._time_indexes.get(key)
+            if index is None:
+                path = os.path.join(self.devices_dir, imei, file_name)
+                if file_name == RECORD_FILE:
+                    index = SparseTimeIndex(path, lambda start: (
+                        (offset, offset + ENTRY_OVERHEAD + length, received_ms)
+                        for offset, received_ms, length in self.record_store.iter_headers(imei, start)))
+                else:
+                    index = SparseTimeIndex(path, lambda start: (
+                        (offset, end, line[:19].decode('ascii', errors='replace'))
+                        for offset, end, line in self._iter_csv_lines(imei, start)),
+                        time_key=self.parse_time)
+                self._time_indexes[key] = index
+        return index
+    
+    def _iter_csv_lines(self, imei, start_offset=0, file_name='data.csv'):
+        """Prochází kompletní řádky záznamů CSV souboru od offsetu - (offset, konec, řádek bez konce řádku)"""
+        csv_file = os.path.join(self.devices_dir, imei, file_name)
+        try:
+            f = open_segment(csv_file)
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(start_offset)
+            offset = start_offset
+            for line in f:
+                end = offset + len(line)
+                if not line.endswith(b'\n'):
+                    return  # Neúplný řádek na konci souboru
+                if offset > 0 or not line.startswith(b'timestamp'):
+                    yield offset, end, line.rstrip(b'\r\n')
+                offset = end
+    
+    def _iter_csv_query_rows(self, imei, start_offset, file_name='data.csv'):
+        """Řádky CSV souboru od offsetu - (offset, lokální čas, záznam)"""
+        for offset, _, line in self._iter_csv_lines(imei, start_offset, file_name):
+            row = next(csv.reader([line.decode('utf-8', errors='replace')]), None)
+            if row:
+                yield offset, row[0], dict(zip(self.csv_headers, row))
+    
+    def _iter_bin_query_rows(self, imei, start_offset, file_name=RECORD_FILE):
+        """Záznamy data.bin nebo jeho segmentu od offsetu - (offset, epoch ms, záznam)"""
+        for stored_frame in self.record_store.iter_frames(imei, start_offset, file_name):
+            yield stored_frame.offset, stored_frame.received_ms, self._frame_to_row(stored_frame)
+    
+    def open_csv_export(self, imei):
+        """Vrátí CSV export zařízení pro streamované stahování, None pokud zařízení nemá data"""
+        if not self._has_data(imei):
+            return None
+        return CSVExport(self, imei)
+    
+    def export_csv(self, imei):
+        """Vrátí všechny záznamy zařízení jako CSV text, None pokud zařízení nemá data"""
+        export = self.open_csv_export(imei)
+        if export is None:
+            return None
+        with export:
+            return b''.join(export.iter_bytes()).decode('utf-8')
+    
+    def _scan_device_file(self, imei, file_name, start_offset):
+        """
+        Spočítá záznamy datového souboru od start_offset (pro souhrn zařízení)
+        Returns: (počet záznamů, offset konce posledního záznamu, poslední záznam)
+        - poslední záznam je epoch ms pro data.bin a lokální čas pro data.csv
+        Komprimovaný segment se projde celý a jako konec se vrátí velikost souboru
+        (souhrn se porovnává s velikostí souboru na disku)
+        """
+        if _is_record_file(file_name):
+            count, end, last = self.record_store.scan_frames(imei, start_offset, file_name)
+            if is_compressed(file_name):
+                end = os.path.getsize(self.record_store.get_record_file(imei, file_name))
+            return count, end, last
+        
+        csv_file = os.path.join(self.devices_dir, imei, file_name)
+        count = 0
+        end = start_offset
+        last_line = None
+        pending = b''
+        try:
+            with open_segment(csv_file) as f:
+                f.seek(start_offset)
+                pos = start_offset
+                while True:
+                    chunk = f.read(TAIL_BLOCK_SIZE)
+                    if not chunk:
+                        break
+                    pos += len(chunk)
+                    data = pending + chunk
+                    last_newline = data.rfind(b'\n')
+                    if last_newline == -1:
+                        pending = data
+                        continue
+                    count += data.count(b'\n')
+                    last_line = data[data.rfind(b'\n', 0, last_newline) + 1:last_newline]
+                    pending = data[last_newline + 1:]
+                    end = pos - len(pending)
+        except OSError as e:
+            print(f"Error scanning CSV for {imei}: {e}")
+            return 0, start_offset, None
+        
+        if start_offset == 0 and count:
+            count -= 1  # Hlavička
+        last = None
+        if count and last_line:
+            row = next(csv.reader([last_line.decode('utf-8', errors='replace').rstrip('\r')]), None)
+            last = row[0] if row else None
+        if is_compressed(file_name):
+            end = os.path.getsize(csv_file)
+        return count, end, last
+    
+    def _get_device_summary(self, imei):
+        """Vrátí souhrn zařízení: počet záznamů, čas posledního záznamu a velikost dat"""
+        files = self.summary.get(imei)
+        if not files:
+            return None
+        
+        last_seen = []
+        for file_name, entry in files.items():
+            if entry['last'] is not None:
+                last = entry['last']
+                last_seen.append(self._format_epoch_ms(last) if _is_record_file(file_name) else last)
+        return {
+            'imei': imei,
+            'last_seen': max(last_seen) if last_seen else "Unknown",
+            'record_count': sum(entry['records'] for entry in files.values()),
+            'byte_size': sum(entry['size'] for entry in files.values())
+        }
+    
+    def _has_data(self, imei):
+        """Vrátí True, pokud zařízení má data.csv, data.bin nebo jejich segmenty"""
+        return bool(self.device_files(imei))
+    
+    def _read_last_csv_rows(self, imei, count, file_name='data.csv'):
+        """Načte posledních N záznamů z CSV souboru i s offsety řádků - [(offset, záznam)]"""
+        csv_file = os.path.join(self.devices_dir, imei, file_name)
+        
+        if count <= 0 or not os.path.exists(csv_file):
+            return []
+        if file_name != 'data.csv':
+            # Uzavřený segment je omezené velikosti (a může být komprimovaný) - čte se celý
+            return [(offset, row) for offset, _, row in
+                    deque(self._iter_csv_query_rows(imei, 0, file_name), maxlen=count)]
         
         try:
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    last_records.append(row)
+            # Hlavička z prvního řádku, data čtená od konce souboru
+            with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+                fieldnames = next(csv.reader([f.readline()]), self.csv_headers)
+            
+            lines, reached_start = read_tail_lines(csv_file, count + 1, with_offsets=True)
+            if reached_start:
+                lines = lines[1:]  # Hlavička
+            rows = []
+            for offset, line in lines[-count:]:
+                row = next(csv.reader([line.decode('utf-8')]), None)
+                if row:
+                    rows.append((offset, dict(zip(fieldnames, row))))
+            return rows
         except Exception as e:
             print(f"Error reading CSV for {imei}: {e}")
             return []
-        
-        return list(last_records)
     
     def get_all_devices(self):
         """Vrátí seznam všech IMEI zařízení"""
@@ -102,14 +827,10 @@ class CSVLogger:
                 for dirname in os.listdir(self.devices_dir):
                     device_dir = os.path.join(self.devices_dir, dirname)
                     if os.path.isdir(device_dir) and dirname.isdigit():
-                        # Zkontroluj jestli má CSV soubor
-                        csv_file = os.path.join(device_dir, 'data.csv')
-                        if os.path.exists(csv_file):
-                            devices.append({
-                                'imei': dirname,
-                                'last_seen': self._get_last_seen(dirname),
-                                'record_count': self._get_record_count(dirname)
-                            })
+                        # Souhrn z cache - jen pro zařízení s CSV souborem nebo binárním úložištěm
+                        summary = self._get_device_summary(dirname)
+                        if summary:
+                            devices.append(summary)
         except Exception as e:
             print(f"Error getting devices: {e}")
         
@@ -117,38 +838,43 @@ class CSVLogger:
     
     def _get_last_seen(self, imei):
         """Získej čas posledního záznamu"""
-        try:
-            records = self.read_last_records(imei, 1)
-            if records:
-                return records[-1]['timestamp']
-        except:
-            pass
-        return "Unknown"
+        summary = self._get_device_summary(imei)
+        return summary['last_seen'] if summary else "Unknown"
     
     def _get_record_count(self, imei):
         """Spočítej celkový počet záznamů"""
-        csv_file = os.path.join(self.devices_dir, imei, 'data.csv')
-        try:
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                # Počítej řádky kromě hlavičky
-                return sum(1 for line in f) - 1
-        except:
-            return 0
+        summary = self._get_device_summary(imei)
+        return summary['record_count'] if summary else 0
     
     def get_server_log_tail(self, lines=2000):
-        """Načte posledních N řádků server logu"""
-        if not os.path.exists(self.server_log):
-            return "No server log available"
+        """Načte posledních N řádků server logu včetně řádků čekajících na zápis (bez čekání na flush)"""
+        def read_active():
+            if not os.path.exists(self.server_log):
+                return None
+            return read_tail_lines(self.server_log, lines)
         
         try:
-            with open(self.server_log, 'r', encoding='utf-8') as f:
-                all_lines = f.readlines()
-                # Posledních N řádků
-                recent_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-                return ''.join(recent_lines)
+            # Posledních N řádků - čte se jen konec souboru, případně i uzavřené segmenty
+            tail, pending = self.event_log.read_with_pending(read_active)
+            if tail is None and not pending:
+                return "No server log available"
+            recent_lines, reached_start = tail or ([], True)
+            recent_lines = (recent_lines + [line.encode('utf-8') for line in pending])[-lines:]
+            if reached_start:
+                for segment in reversed(list_segments(self.server_log)):
+                    if len(recent_lines) >= lines:
+                        break
+                    with open_segment(segment) as f:
+                        segment_lines = deque(f, maxlen=lines - len(recent_lines))
+                    recent_lines[:0] = [line.rstrip(b'\r\n') for line in segment_lines]
+            return ''.join(line.decode('utf-8', errors='replace') + '\n' for line in recent_lines)
         except Exception as e:
             return f"Error reading server log: {e}"
     
+    def is_known_device(self, imei):
+        """Zda se zařízení už někdy připojilo (má info.json ve složce zařízení)"""
+        return os.path.isfile(os.path.join(self.devices_dir, imei, 'info.json'))
+    
     def create_device_info(self, imei):
         """Vytvoří info.json pro zařízení"""
         device_dir = os.path.join(self.devices_dir, imei)
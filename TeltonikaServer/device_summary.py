@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Perzistentní souhrn dat zařízení (počet záznamů, poslední záznam, velikost) pro /api/devices"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Tuple, Union
+
+SUMMARY_FILE = 'device_summary.json'
+SAVE_INTERVAL = 10.0
+
+# scanner(imei, file_name, start_offset) -> (počet záznamů, offset konce posledního záznamu, poslední záznam)
+Scanner = Callable[[str, str, int], Tuple[int, int, Any]]
+# Datové soubory zařízení - pevný seznam názvů, nebo funkce imei -> názvy (i uzavřené segmenty)
+FileNames = Union[Iterable[str], Callable[[str], Iterable[str]]]
+
+
+class DeviceSummaryCache:
+    """
+    Souhrn datových souborů každého zařízení, aktualizovaný při každém zápisu
+    Pro každý soubor drží velikost, kterou souhrn pokrývá - pokud soubor mezitím
+    narostl (jiný zapisovač, restart), dopočítá se jen nová část. Při startu se
+    souhrn ověří podle velikosti a mtime souboru.
+    """
+
+    def __init__(self, devices_dir: str, path: str, scanner: Scanner,
+                 file_names: FileNames = ('data.csv', 'data.bin'), save_interval: float = SAVE_INTERVAL):
+        self.devices_dir = devices_dir
+        self.path = path
+        self.scanner = scanner
+        self.file_names = file_names
+        self.save_interval = save_interval
+
+        # {imei: {file_name: {'size', 'mtime_ns', 'records', 'last'}}}
+        self._summaries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Souhrny načtené z disku, které ještě nebyly porovnány s mtime souboru
+        self._unverified = set()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+        self._load()
+
+    def _load(self):
+        """Načte uložený souhrn"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._summaries = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error loading device summary: {e}")
+            self._summaries = {}
+            return
+        self._unverified = {(imei, name) for imei, files in self._summaries.items() for name in files}
+
+    def get(self, imei: str) -> Dict[str, Dict[str, Any]]:
+        """Vrátí souhrn souborů zařízení, nejdřív ho srovná s aktuální velikostí souborů"""
+        names = list(self.file_names(imei) if callable(self.file_names) else self.file_names)
+        with self._lock:
+            # Soubory, které zmizely ze seznamu (smazané segmenty), se ze souhrnu odeberou
+            files = self._summaries.get(imei)
+            for name in [name for name in files or () if name not in names]:
+                del files[name]
+                self._dirty = True
+            for name in names:
+                self._refresh(imei, name)
+            files = {name: dict(entry) for name, entry in self._summaries.get(imei, {}).items()}
+        self.maybe_save()
+        return files
+
+    def _refresh(self, imei: str, name: str):
+        """Dopočítá souhrn souboru, pokud neodpovídá jeho velikosti (volá se se zámkem)"""
+        files = self._summaries.get(imei)
+        entry = files.get(name) if files else None
+        try:
+            st = os.stat(os.path.join(self.devices_dir, imei, name))
+        except FileNotFoundError:
+            if entry is not None:
+                del files[name]
+                self._dirty = True
+            return
+
+        if entry is not None and (imei, name) in self._unverified:
+            self._unverified.discard((imei, name))
+            # Stejná velikost, ale jiný mtime = soubor byl přepsán
+            if st.st_size == entry['size'] and entry['mtime_ns'] and st.st_mtime_ns != entry['mtime_ns']:
+                entry = None
+        if entry is not None and st.st_size < entry['size']:
+            entry = None
+        if entry is not None and st.st_size == entry['size']:
+            return
+
+        start = entry['size'] if entry is not None else 0
+        records, end, last = self.scanner(imei, name, start)
+        if entry is None:
+            entry = self._summaries.setdefault(imei, {})[name] = {
+                'size': 0, 'mtime_ns': 0, 'records': 0, 'last': None}
+        entry['records'] += records
+        entry['size'] = end
+        if last is not None:
+            entry['last'] = last
+        entry['mtime_ns'] = st.st_mtime_ns if end == st.st_size else 0
+        self._dirty = True
+
+    def record_append(self, imei: str, name: str, start: int, end: int, records: int = 1, last: Any = None):
+        """
+        Započítá právě zapsaná data (bytes start-end)
+        Pokud souhrn nekončí na offsetu start, nechá dopočítání na příštím get()
+        """
+        with self._lock:
+            files = self._summaries.get(imei)
+            entry = files.get(name) if files else None
+            if entry is None or entry['size'] != start:
+                return
+            entry['records'] += records
+            entry['size'] = end
+            if last is not None:
+                entry['last'] = last
+            entry['mtime_ns'] = 0  # Doplní se při uložení
+            self._dirty = True
+        self.maybe_save()
+
+    def forget(self, imei: str, name: str):
+        """Zahodí souhrn souboru (aktivní soubor byl uzavřen jako segment a začíná znovu)"""
+        with self._lock:
+            files = self._summaries.get(imei)
+            if files and files.pop(name, None) is not None:
+                self._dirty = True
+
+    def maybe_save(self):
+        """Uloží souhrn, pokud se změnil a od posledního uložení uplynul SAVE_INTERVAL"""
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """Uloží souhrn na disk (přes dočasný soubor)"""
+        with self._lock:
+            for imei, files in self._summaries.items():
+                for name, entry in files.items():
+                    if not entry['mtime_ns']:
+                        try:
+                            st = os.stat(os.path.join(self.devices_dir, imei, name))
+                        except OSError:
+                            continue
+                        if st.st_size == entry['size']:
+                            entry['mtime_ns'] = st.st_mtime_ns
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+            try:
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._summaries, f)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                print(f"Error saving device summary: {e}")
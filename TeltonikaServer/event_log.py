@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Bufferovaný zápis server logu - řádky se zapisují po dávkách na pozadí"""
+
+import atexit
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# Dávka se zapíše po EVENT_LOG_BATCH_LINES řádcích, nebo nejpozději
+# EVENT_LOG_FLUSH_INTERVAL sekund po zařazení nejstaršího řádku
+EVENT_LOG_BATCH_LINES = 256
+EVENT_LOG_FLUSH_INTERVAL = 0.5
+
+
+class _Flush:
+    """Značka ve frontě - zapisovač zapíše vše před ní a ohlásí dokončení"""
+    __slots__ = ('done', 'stop')
+
+    def __init__(self, stop: bool = False):
+        self.done = threading.Event()
+        self.stop = stop
+
+
+class BufferedEventLog:
+    """
+    Fronta řádků logu s jedním zapisovacím threadem
+    Volající jen sestaví řádek a zařadí ho do fronty - otevření souboru a zápis
+    proběhne jednou za dávku. Řádky se zapisují v pořadí volání write() ze všech
+    threadů. before_write() se volá před zápisem dávky (rotace souboru),
+    on_write(řádky) po zápisu (verze logu, živý proud).
+    """
+
+    def __init__(self, path: str, format_line: Callable[[str], str] = str,
+                 before_write: Optional[Callable[[], None]] = None,
+                 on_write: Optional[Callable[[List[str]], None]] = None,
+                 batch_lines: int = EVENT_LOG_BATCH_LINES, flush_interval: float = EVENT_LOG_FLUSH_INTERVAL):
+        self.path = path
+        self.format_line = format_line
+        self.before_write = before_write
+        self.on_write = on_write
+        self.batch_lines = batch_lines
+        self.flush_interval = flush_interval
+
+        self._queue = queue.SimpleQueue()
+        # Sestavení řádku (čas) a zařazení do fronty je atomické - pořadí řádků odpovídá časům
+        self._lock = threading.Lock()
+        # Zařazené, ještě nezapsané řádky (pro čtení logu bez čekání na flush) - mění se pod _lock
+        self._pending = deque()
+        # Zápis dávky do souboru vs. čtení souboru s nezapsanými řádky (read_with_pending)
+        self._file_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+        # Metriky: latence = doba od zařazení nejstaršího řádku dávky po dokončení zápisu
+        self._stats_lock = threading.Lock()
+        self._lines_written = 0
+        self._batches = 0
+        self._errors = 0
+        self._last_latency = 0.0
+        self._max_latency = 0.0
+        self._total_latency = 0.0
+
+    def write(self, message: str) -> str:
+        """Zařadí řádek do fronty (neblokuje na disku) a vrátí ho"""
+        with self._lock:
+            line = self.format_line(message)
+            self._pending.append(line)
+            if not self._closed:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='event-log', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+                self._queue.put((line, time.monotonic()))
+                return line
+            thread = self._thread
+
+        # Po ukončení zapisovače (konec procesu) se zapisuje přímo - až po zbytku fronty,
+        # mimo _lock (zámky se berou vždy v pořadí _file_lock -> _lock)
+        if thread is not None:
+            thread.join()
+        self._write_batch([line], time.monotonic())
+        return line
+
+    def read_with_pending(self, read: Callable[[], T]) -> Tuple[T, List[str]]:
+        """
+        Zavolá read() (čtení souboru logu) a vrátí (výsledek, řádky zatím čekající ve frontě)
+        Dávka se během čtení nezapisuje, takže žádný řádek nechybí ani není dvakrát.
+        Čeká nejvýš na dokončení právě probíhajícího zápisu, ne na flush.
+        """
+        with self._file_lock:
+            result = read()
+            with self._lock:
+                pending = list(self._pending)
+        return result, pending
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Počká, až se zapíšou všechny dosud zařazené řádky"""
+        with self._lock:
+            if self._thread is None or self._closed:
+                return True
+            marker = _Flush()
+            self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Zapíše zbylé řádky a ukončí zapisovací thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is None:
+                return
+            marker = _Flush(stop=True)
+            self._queue.put(marker)
+        marker.done.wait(timeout)
+        thread.join(timeout)
+
+    def stats(self) -> dict:
+        """Metriky zapisovače pro /api/stats"""
+        with self._stats_lock:
+            return {
+                'pending_lines': self._queue.qsize(),
+                'lines_written': self._lines_written,
+                'batches': self._batches,
+                'errors': self._errors,
+                'last_flush_latency_ms': round(self._last_latency * 1000, 3),
+                'max_flush_latency_ms': round(self._max_latency * 1000, 3),
+                'avg_flush_latency_ms': round(self._total_latency * 1000 / self._batches, 3) if self._batches else 0.0,
+            }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            markers = []
+            first_queued = None
+            while True:
+                if isinstance(item, _Flush):
+                    markers.append(item)
+                    break
+                line, queued = item
+                batch.append(line)
+                if first_queued is None:
+                    first_queued = queued
+                if len(batch) >= self.batch_lines:
+                    break
+                remaining = first_queued + self.flush_interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write_batch(batch, first_queued)
+            for marker in markers:
+                marker.done.set()
+            if any(marker.stop for marker in markers):
+                return
+
+    def _write_batch(self, batch: List[str], first_queued: float):
+        """Zapíše dávku jedním otevřením souboru"""
+        try:
+            with self._file_lock:
+                try:
+                    if self.before_write is not None:
+                        self.before_write()
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(''.join(line + '\n' for line in batch))
+                finally:
+                    # Po ukončení zapisuje více threadů - odeber právě tyto řádky (obvykle jsou na začátku)
+                    with self._lock:
+                        for line in batch:
+                            self._pending.remove(line)
+        except Exception as e:
+            print(f"Error writing server log {self.path}: {e}")
+            with self._stats_lock:
+                self._errors += 1
+            return
+
+        latency = time.monotonic() - first_queued
+        with self._stats_lock:
+            self._lines_written += len(batch)
+            self._batches += 1
+            self._last_latency = latency
+            self._max_latency = max(self._max_latency, latency)
+            self._total_latency += latency
+
+        if self.on_write is not None:
+            try:
+                self.on_write(batch)
+            except Exception as e:
+                print(f"Error in server log callback: {e}")
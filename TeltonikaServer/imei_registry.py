@@ -3,15 +3,36 @@
 IMEI Registry - sleduje a ukládá informace o všech Teltonika zařízeních
 """
 
+import atexit
+import copy
 import json
 import os
+import threading
 from datetime import datetime
 from typing import Dict, Optional, List
 
+# Write-behind: registr se ukládá nejpozději po DEFAULT_FLUSH_INTERVAL sekundách
+# nebo po DEFAULT_FLUSH_CHANGES změnách (flush_interval=0 = ukládat při každé změně)
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_FLUSH_CHANGES = 100
+
 class IMEIRegistry:
-    def __init__(self, registry_path: str):
+    def __init__(self, registry_path: str, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 flush_changes: int = DEFAULT_FLUSH_CHANGES):
         self.registry_path = registry_path
+        self.flush_interval = flush_interval
+        self.flush_changes = flush_changes
         self.registry = self._load_registry()
+        
+        # Zámek pro registr, počet neuložených změn a vlákno pro odložené ukládání
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._pending_changes = 0
+        self._flush_event = threading.Event()
+        self._flush_thread = None
+        
+        # Neuložené změny zapiš i při ukončení procesu
+        atexit.register(self.flush)
     
     def _load_registry(self) -> Dict:
         """Načte IMEI registr ze souboru"""
@@ -24,15 +45,47 @@ class IMEIRegistry:
         return {}
     
     def _save_registry(self):
-        """Uloží IMEI registr do souboru"""
-        try:
-            # Zajisti, že složka existuje
-            os.makedirs(os.path.dirname(self.registry_path), exist_ok=True)
-            
-            with open(self.registry_path, 'w', encoding='utf-8') as f:
-                json.dump(self.registry, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Chyba při ukládání IMEI registru: {e}")
+        """Uloží IMEI registr do souboru (atomicky přes dočasný soubor)"""
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self.registry, indent=2, ensure_ascii=False)
+                self._pending_changes = 0
+            try:
+                # Zajisti, že složka existuje
+                os.makedirs(os.path.dirname(self.registry_path), exist_ok=True)
+                
+                tmp_path = self.registry_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.registry_path)
+            except Exception as e:
+                print(f"Chyba při ukládání IMEI registru: {e}")
+    
+    def _mark_dirty(self):
+        """Zaznamená změnu registru a naplánuje odložené uložení (volá se se zámkem)"""
+        self._pending_changes += 1
+        if self.flush_interval <= 0:
+            return  # Ukládá volající po uvolnění zámku
+        
+        if self._flush_thread is None:
+            self._flush_thread = threading.Thread(target=self._flush_loop, name='imei-registry-flush', daemon=True)
+            self._flush_thread.start()
+        if self._pending_changes >= self.flush_changes:
+            self._flush_event.set()
+    
+    def _flush_loop(self):
+        """Vlákno odloženého ukládání - ukládá po intervalu nebo po flush_changes změnách"""
+        while True:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+    
+    def flush(self):
+        """Uloží registr, pokud obsahuje neuložené změny"""
+        if self._pending_changes:
+            self._save_registry()
     
     def register_imei_connection(self, imei: str, ip_address: str) -> bool:
         """
@@ -40,6 +93,17 @@ class IMEIRegistry:
         Returns: True pokud je IMEI nové, False pokud už existuje
         """
         now = datetime.now().isoformat()
+        with self._lock:
+            is_new_imei = self._register_connection(imei, ip_address, now)
+            self._mark_dirty()
+        if self.flush_interval <= 0:
+            self.flush()
+        if is_new_imei:
+            print(f"📱 Nové IMEI zařízení registrováno: {imei}")
+        return is_new_imei
+    
+    def _register_connection(self, imei: str, ip_address: str, now: str) -> bool:
+        """Aktualizuje záznam IMEI v paměti (volá se se zámkem)"""
         is_new_imei = imei not in self.registry
         
         if is_new_imei:
@@ -56,7 +120,6 @@ class IMEIRegistry:
                     "firmware": "unknown"
                 }
             }
-            print(f"📱 Nové IMEI zařízení registrováno: {imei}")
         else:
             # Existující IMEI - aktualizuj
             entry = self.registry[imei]
@@ -70,26 +133,35 @@ class IMEIRegistry:
                 # Omez seznam na posledních 10 IP adres
                 entry["ip_addresses"] = entry["ip_addresses"][-10:]
         
-        self._save_registry()
         return is_new_imei
     
     def register_avl_records(self, imei: str, record_count: int):
         """Zaregistruje počet přijatých AVL záznamů"""
-        if imei in self.registry:
-            self.registry[imei]["total_records"] += record_count
-            self.registry[imei]["last_seen"] = datetime.now().isoformat()
-            self._save_registry()
+        with self._lock:
+            if imei in self.registry:
+                self.registry[imei]["total_records"] += record_count
+                self.registry[imei]["last_seen"] = datetime.now().isoformat()
+                self._mark_dirty()
+        if self.flush_interval <= 0:
+            self.flush()
     
     def get_imei_info(self, imei: str) -> Optional[Dict]:
         """Vrátí informace o IMEI zařízení"""
-        return self.registry.get(imei)
+        with self._lock:
+            info = self.registry.get(imei)
+            return copy.deepcopy(info)
     
     def get_all_imeis(self) -> List[str]:
         """Vrátí seznam všech známých IMEI"""
-        return list(self.registry.keys())
+        with self._lock:
+            return list(self.registry.keys())
     
     def get_registry_stats(self) -> Dict:
         """Vrátí statistiky registru"""
+        with self._lock:
+            return self._get_registry_stats()
+    
+    def _get_registry_stats(self) -> Dict:
         if not self.registry:
             return {
                 "total_devices": 0,
@@ -118,6 +190,10 @@ class IMEIRegistry:
     
     def format_registry_summary(self) -> str:
         """Vrátí textový přehled registru"""
+        with self._lock:
+            return self._format_registry_summary()
+    
+    def _format_registry_summary(self) -> str:
         if not self.registry:
             return "Žádná IMEI zařízení zatím nebyla registrována."
         
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Omezené fronty mezi příjmem ze socketu a zápisem / dekódováním rámců"""
+
+import asyncio
+import atexit
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Callable
+
+DEFAULT_PARSE_WORKERS = 2
+DEFAULT_STORAGE_WORKERS = 2
+# Kapacita fronty jednoho workeru (rámců) - plná fronta zastaví čtení ze socketu
+DEFAULT_QUEUE_SIZE = 1000
+
+
+class PipelineStage:
+    """
+    Jedna fáze pipeline - N worker threadů, každý s vlastní omezenou frontou
+    Úlohy se stejným klíčem (IMEI) jdou vždy do stejné fronty, takže se pro jedno
+    zařízení provedou v pořadí zařazení. Plná fronta zařazení zablokuje - spojení
+    přestane číst a zpomalí zařízení přes TCP (backpressure).
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.name = name
+        self.queue_size = queue_size
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(max(1, workers))]
+        self._closed = False
+        self._lock = threading.Lock()
+
+        # Metriky: blocked = zařazení, která čekala na místo ve frontě,
+        # latence = doba od zařazení úlohy po její dokončení
+        self._submitted = 0
+        self._completed = 0
+        self._errors = 0
+        self._blocked = 0
+        self._blocked_time = 0.0
+        self._max_depth = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+        self._threads = [threading.Thread(target=self._run, args=(q,), name=f'ingest-{name}-{i}', daemon=True)
+                         for i, q in enumerate(self._queues)]
+        for thread in self._threads:
+            thread.start()
+
+    def _queue_for(self, key: str) -> queue.Queue:
+        return self._queues[zlib.crc32(key.encode('utf-8')) % len(self._queues)]
+
+    def submit(self, key: str, func: Callable[..., Any], *args) -> bool:
+        """Zařadí úlohu func(*args) - při plné frontě čeká na místo"""
+        if self._closed:
+            # Po ukončení pipeline (konec procesu) se úloha provede hned
+            func(*args)
+            return True
+        target = self._queue_for(key)
+        item = (func, args, time.monotonic())
+        try:
+            target.put_nowait(item)
+        except queue.Full:
+            self._put_blocking(target, item)
+        self._count_submitted(target)
+        return True
+
+    async def submit_async(self, key: str, func: Callable[..., Any], *args) -> bool:
+        """submit() pro asyncio spojení - na místo ve frontě se čeká mimo event loop"""
+        if self._closed:
+            func(*args)
+            return True
+        target = self._queue_for(key)
+        item = (func, args, time.monotonic())
+        try:
+            target.put_nowait(item)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, self._put_blocking, target, item)
+        self._count_submitted(target)
+        return True
+
+    def _put_blocking(self, target: queue.Queue, item):
+        started = time.monotonic()
+        target.put(item)
+        with self._lock:
+            self._blocked += 1
+            self._blocked_time += time.monotonic() - started
+
+    def _count_submitted(self, target: queue.Queue):
+        depth = target.qsize()
+        with self._lock:
+            self._submitted += 1
+            if depth > self._max_depth:
+                self._max_depth = depth
+
+    def _run(self, source: queue.Queue):
+        while True:
+            item = source.get()
+            if item is None:
+                return
+            func, args, queued = item
+            try:
+                func(*args)
+                failed = False
+            except Exception as e:
+                print(f"Error in ingest {self.name} worker: {e}")
+                failed = True
+            latency = time.monotonic() - queued
+            with self._lock:
+                self._completed += 1
+                self._errors += failed
+                self._total_latency += latency
+                if latency > self._max_latency:
+                    self._max_latency = latency
+
+    def close(self, timeout: float = 10.0):
+        """Dokončí zařazené úlohy a ukončí workery"""
+        if self._closed:
+            return
+        self._closed = True
+        for q in self._queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self) -> dict:
+        """Metriky fáze pro /api/stats"""
+        depth = sum(q.qsize() for q in self._queues)
+        with self._lock:
+            return {
+                'workers': len(self._queues),
+                'queue_capacity': self.queue_size * len(self._queues),
+                'queue_depth': depth,
+                'max_queue_depth': self._max_depth,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'errors': self._errors,
+                'blocked_submits': self._blocked,
+                'blocked_ms': round(self._blocked_time * 1000, 3),
+                'avg_latency_ms': round(self._total_latency * 1000 / self._completed, 3) if self._completed else 0.0,
+                'max_latency_ms': round(self._max_latency * 1000, 3),
+            }
+
+
+class IngestPipeline:
+    """
+    Zpracování přijatých rámců mimo spojení: storage = zápis surových rámců na disk,
+    parse = dekódování a logování. Spojení rámec jen zkontroluje (CRC), zařadí
+    a potvrdí - pomalý disk (/share přes NFS/SMB) tak nezdrží TCP session.
+    """
+
+    def __init__(self, parse_workers: int = DEFAULT_PARSE_WORKERS, storage_workers: int = DEFAULT_STORAGE_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.storage = PipelineStage('storage', storage_workers, queue_size)
+        self.parse = PipelineStage('parse', parse_workers, queue_size)
+        atexit.register(self.close)
+
+    def close(self, timeout: float = 10.0):
+        """Při ukončení zapíše a zpracuje vše, co je ve frontách"""
+        self.storage.close(timeout)
+        self.parse.close(timeout)
+
+    def stats(self) -> dict:
+        return {'storage': self.storage.stats(), 'parse': self.parse.stats()}
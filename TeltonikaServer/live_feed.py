@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Živý proud nových záznamů a řádků server logu pro web UI (Server-Sent Events)"""
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, List, NamedTuple, Optional
+
+# Kolik posledních událostí se drží pro navázání přerušeného spojení (Last-Event-ID)
+LIVE_FEED_SIZE = 1000
+
+
+class LiveEvent(NamedTuple):
+    """Jedna událost - pořadové číslo, typ ('record' / 'log') a data pro JSON"""
+    event_id: int
+    event_type: str
+    data: Any
+
+
+class LiveFeed:
+    """
+    Kruhový buffer posledních událostí, na které čekají připojení odběratelé
+    Zapisovač jen přidá událost a probudí čekající - bez front pro jednotlivé
+    odběratele. Odběratel si pamatuje číslo poslední přijaté události.
+    """
+
+    def __init__(self, size: int = LIVE_FEED_SIZE):
+        self._events = deque(maxlen=size)
+        self._last_id = 0
+        self._subscribers = 0
+        self._condition = threading.Condition()
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    @property
+    def has_subscribers(self) -> bool:
+        """Bez odběratelů se události nemusí vůbec sestavovat"""
+        return self._subscribers > 0
+
+    @contextmanager
+    def subscribe(self):
+        """Zaregistruje odběratele po dobu otevřeného spojení"""
+        with self._condition:
+            self._subscribers += 1
+        try:
+            yield self
+        finally:
+            with self._condition:
+                self._subscribers -= 1
+
+    def publish(self, event_type: str, data: Any) -> int:
+        """Přidá událost a probudí čekající odběratele"""
+        with self._condition:
+            self._last_id += 1
+            self._events.append(LiveEvent(self._last_id, event_type, data))
+            self._condition.notify_all()
+            return self._last_id
+
+    def wait_events(self, after_id: int, timeout: Optional[float] = None) -> Optional[List[LiveEvent]]:
+        """
+        Počká na události novější než after_id (nejvýše timeout sekund)
+        Returns: seznam událostí (prázdný po timeoutu), None pokud odběratel
+        nestíhal a část událostí už z bufferu vypadla
+        """
+        with self._condition:
+            if after_id > self._last_id:
+                return None  # Číslo z doby před restartem serveru
+            if self._last_id <= after_id:
+                self._condition.wait_for(lambda: self._last_id > after_id, timeout)
+            if self._last_id <= after_id:
+                return []
+            if not self._events or self._events[0].event_id > after_id + 1:
+                return None
+            # Události jsou seřazené podle čísla - nové jsou na konci
+            skip = after_id + 1 - self._events[0].event_id
+            return [self._events[i] for i in range(skip, len(self._events))]
@@ -5,20 +5,19 @@ Spouští jak TCP server pro přijím dat, tak webový server pro zobrazování
 """
 
 import argparse
+import signal
 import threading
 import json
 import os
-import pytz
-from datetime import datetime, timezone, timedelta
 
-from tcp_server import start_tcp_server, ensure_data_dir
+from tcp_server import start_tcp_server, start_async_tcp_server, ensure_data_dir, shutdown_server
 from web_server import start_web_server
+from segments import RotationPolicy
+from time_service import local_time
 
 def get_local_time():
     """Vrátí aktuální čas z Home Assistant timezone"""
-    tz_name = os.environ.get('TZ', 'Europe/Prague')
-    tz = pytz.timezone(tz_name)
-    return datetime.now(tz).strftime('%Y-%m-%d %H:%M:%S')
+    return local_time()
 
 def log_print(message):
     """Print s časovou značkou pro HA addon log"""
@@ -37,6 +36,10 @@ def load_ha_config():
             log_print(f"Warning: Error reading HA config: {e}")
     return {}
 
+def handle_sigterm(signum, frame):
+    """Zastavení add-onu (SIGTERM) ukončí web server stejně jako Ctrl+C"""
+    raise KeyboardInterrupt
+
 def main():
     parser = argparse.ArgumentParser(description='Teltonika Server for HA Addon')
     parser.add_argument('--tcp-port', type=int, default=3030, help='TCP port to listen on')
@@ -51,6 +54,25 @@ def main():
     web_port = ha_config.get('web_port', args.web_port)
     allowed_imeis = ha_config.get('allowed_imeis', [])
     log_to_config = ha_config.get('log_to_config', False)
+    tcp_mode = ha_config.get('tcp_mode', 'asyncio')
+    tcp_backlog = ha_config.get('tcp_backlog', 1024)
+    max_connections = ha_config.get('max_connections', 10000)
+    raw_storage = ha_config.get('raw_storage', 'binary')
+    web_workers = ha_config.get('web_workers', 8)
+    rotate_size_mb = ha_config.get('rotate_size_mb', 10)
+    rotate_daily = ha_config.get('rotate_daily', True)
+    retention_days = ha_config.get('retention_days', 0)
+    parse_workers = ha_config.get('parse_workers', 2)
+    storage_workers = ha_config.get('storage_workers', 2)
+    ingest_queue_size = ha_config.get('ingest_queue_size', 1000)
+    udp_port = ha_config.get('udp_port', 0)
+    allow_commands = ha_config.get('allow_commands', False)
+    
+    # Rotace data.csv, data.bin a server.log (0 MB a bez denní rotace = vypnuto)
+    rotation = None
+    if rotate_size_mb or rotate_daily:
+        rotation = RotationPolicy(max_bytes=rotate_size_mb * 1024 * 1024, daily=rotate_daily,
+                                  retention_days=retention_days)
     
     # Pokud je seznam prázdný, žádné filtrování
     if not allowed_imeis:
@@ -64,13 +86,19 @@ def main():
     ensure_data_dir()
     
     # Spusť TCP server v samostatném threadu
-    tcp_thread = threading.Thread(target=start_tcp_server, args=('0.0.0.0', tcp_port, allowed_imeis, log_to_config))
+    # asyncio = všechna spojení v jednom event loopu, threaded = thread per spojení
+    tcp_target = start_tcp_server if tcp_mode == 'threaded' else start_async_tcp_server
+    tcp_thread = threading.Thread(target=tcp_target, args=('0.0.0.0', tcp_port, allowed_imeis, log_to_config,
+                                                           tcp_backlog, max_connections, raw_storage, rotation,
+                                                           (parse_workers, storage_workers, ingest_queue_size),
+                                                           udp_port))
     tcp_thread.daemon = True
     tcp_thread.start()
     
-    log_print("TCP server started successfully")
+    log_print(f"TCP server started successfully (mode: {tcp_mode})")
     
-    # Spusť web server v hlavním threadu
+    # Spusť web server v hlavním threadu - po jeho ukončení se dopíšou rámce z front
+    signal.signal(signal.SIGTERM, handle_sigterm)
     log_print("Starting web server...")
     try:
         # Použij stejný CONFIG_DIR jako TCP server - musí být synchronizováno!
@@ -78,9 +106,13 @@ def main():
         config_dir = '/share/teltonika' if os.path.exists('/data') or os.environ.get('HA_ADDON') else './config'
         log_print(f"Using config directory: {config_dir}")
         log_print(f"Config dir exists: {os.path.exists(config_dir)}")
-        start_web_server(host='0.0.0.0', port=web_port, base_dir=config_dir)
+        start_web_server(host='0.0.0.0', port=web_port, base_dir=config_dir, workers=web_workers,
+                         allow_commands=allow_commands)
     except KeyboardInterrupt:
         log_print("Shutting down all servers...")
+    finally:
+        shutdown_server()
+        log_print("Pending frames stored, server log closed")
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""Binární append-only úložiště surových AVL rámců pro každé zařízení"""
+
+import os
+import struct
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from segments import RotationPolicy, data_size, list_segments, open_segment, rotate_file
+from time_service import epoch_ms
+
+RECORD_FILE = 'data.bin'
+FILE_MAGIC = b'TLTAVL01'
+
+# Každý záznam: hlavička (značka, čas přijetí v epoch ms, délka rámce) + rámec + (délka, značka)
+# Délka na konci umožňuje číst soubor odzadu (posledních N záznamů bez čtení celého souboru),
+# značka odhalí poškozený nebo neúplný záznam
+ENTRY_MARKER = 0xA55A
+_ENTRY_HEADER = struct.Struct('>HQI')
+_ENTRY_TRAILER = struct.Struct('>IH')
+ENTRY_OVERHEAD = _ENTRY_HEADER.size + _ENTRY_TRAILER.size  # 20 bytes
+
+
+class StoredFrame(NamedTuple):
+    """Jeden uložený rámec - offset záznamu v souboru, čas přijetí (epoch ms) a surová data"""
+    offset: int
+    received_ms: int
+    frame: bytes
+
+
+def iter_file_frames(f, start_offset: int = 0, path: str = '') -> Iterator[StoredFrame]:
+    """
+    Prochází rámce z otevřeného data.bin nebo segmentu (open_segment) od start_offset
+    Neúplný záznam na konci souboru (přerušený zápis) se ignoruje
+    """
+    f.seek(0)
+    if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+        return
+    offset = max(start_offset, len(FILE_MAGIC))
+    f.seek(offset)
+    while True:
+        header = f.read(_ENTRY_HEADER.size)
+        if len(header) < _ENTRY_HEADER.size:
+            return
+        marker, received_ms, length = _ENTRY_HEADER.unpack(header)
+        if marker != ENTRY_MARKER:
+            print(f"Corrupted record in {path} at offset {offset}")
+            return
+        frame = f.read(length)
+        trailer = f.read(_ENTRY_TRAILER.size)
+        if len(frame) < length or len(trailer) < _ENTRY_TRAILER.size:
+            return
+        if _ENTRY_TRAILER.unpack(trailer) != (length, ENTRY_MARKER):
+            print(f"Corrupted record in {path} at offset {offset}")
+            return
+        yield StoredFrame(offset, received_ms, frame)
+        offset += ENTRY_OVERHEAD + length
+
+
+def iter_file_headers(f, size: int, start_offset: int = 0) -> Iterator[Tuple[int, int, int]]:
+    """
+    Prochází hlavičky kompletních záznamů otevřeného souboru do offsetu size (bez čtení rámců)
+    Yields: (offset záznamu, čas přijetí v epoch ms, délka rámce)
+    """
+    f.seek(0)
+    if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+        return
+    offset = max(start_offset, len(FILE_MAGIC))
+    while offset + ENTRY_OVERHEAD <= size:
+        f.seek(offset)
+        marker, received_ms, length = _ENTRY_HEADER.unpack(f.read(_ENTRY_HEADER.size))
+        if marker != ENTRY_MARKER or offset + ENTRY_OVERHEAD + length > size:
+            return
+        yield offset, received_ms, length
+        offset += ENTRY_OVERHEAD + length
+
+
+class RecordWriter:
+    """
+    Otevřený zapisovač data.bin jednoho zařízení (drží se po dobu spojení)
+    Soubor je otevřen bez bufferu v append režimu - každý rámec = jeden write()
+    """
+    __slots__ = ('path', '_file', '_size', 'last_write')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, 'ab', buffering=0)
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._size = self._file.write(FILE_MAGIC)
+            self.last_write = time.time()
+        else:
+            self.last_write = os.fstat(self._file.fileno()).st_mtime
+
+    @property
+    def data_size(self) -> int:
+        """Velikost uložených záznamů (bez hlavičky souboru)"""
+        return self._size - len(FILE_MAGIC)
+
+    def rotate(self, policy: RotationPolicy) -> Optional[str]:
+        """Uzavře soubor jako segment a pokračuje do nového data.bin"""
+        self._file.close()
+        segment = rotate_file(self.path, policy)
+        self._open()
+        return segment
+
+    def append(self, frame: bytes, received_ms: Optional[int] = None) -> int:
+        """
+        Zapíše jeden rámec (bytes nebo memoryview) jedním voláním write()
+        Returns: offset záznamu v souboru
+        """
+        if received_ms is None:
+            received_ms = epoch_ms()
+        length = len(frame)
+        offset = self._size
+        self._size += self._file.write(b''.join((_ENTRY_HEADER.pack(ENTRY_MARKER, received_ms, length), frame,
+                                                 _ENTRY_TRAILER.pack(length, ENTRY_MARKER))))
+        self.last_write = received_ms / 1000.0
+        return offset
+
+    def close(self):
+        self._file.close()
+
+
+class RecordStore:
+    def __init__(self, base_dir='/share/teltonika'):
+        self.base_dir = base_dir
+        self.devices_dir = os.path.join(base_dir, 'devices')
+
+        # Zapisovače otevřené pro aktivní spojení podle IMEI
+        self._writers: Dict[str, RecordWriter] = {}
+        self._lock = threading.Lock()
+
+        # Rotace data.bin do segmentů (None = bez rotace) a callback po rotaci (imei, cesta segmentu)
+        self.rotation: Optional[RotationPolicy] = None
+        self.on_rotate: Optional[Callable[[str, str], None]] = None
+
+        os.makedirs(self.devices_dir, exist_ok=True)
+
+    def get_record_file(self, imei: str, file_name: str = RECORD_FILE) -> str:
+        """Vrátí cestu k data.bin (nebo jeho segmentu) pro dané IMEI"""
+        return os.path.join(self.devices_dir, imei, file_name)
+
+    def list_record_files(self, imei: str) -> List[str]:
+        """Názvy uzavřených segmentů od nejstaršího a nakonec aktivní data.bin (pokud existují)"""
+        path = self.get_record_file(imei)
+        names = [os.path.basename(segment) for segment in list_segments(path)]
+        if os.path.exists(path):
+            names.append(RECORD_FILE)
+        return names
+
+    def has_records(self, imei: str) -> bool:
+        """Vrátí True, pokud zařízení má binární úložiště"""
+        return os.path.exists(self.get_record_file(imei))
+
+    def open_writer(self, imei: str) -> RecordWriter:
+        """Otevře zapisovač pro nové spojení daného IMEI"""
+        os.makedirs(os.path.join(self.devices_dir, imei), exist_ok=True)
+        writer = RecordWriter(self.get_record_file(imei))
+        with self._lock:
+            self._writers[imei] = writer
+        return writer
+
+    def close_writer(self, imei: str, writer: Optional[RecordWriter] = None):
+        """Zavře zapisovač při odpojení"""
+        with self._lock:
+            current = self._writers.get(imei)
+            if writer is None:
+                writer = current
+            # Nové spojení téhož IMEI mohlo zapisovač mezitím nahradit
+            if current is writer:
+                del self._writers[imei]
+        if writer is not None:
+            writer.close()
+
+    def append(self, imei: str, frame: bytes, received_ms: Optional[int] = None) -> int:
+        """
+        Uloží rámec - přes otevřený zapisovač spojení, jinak soubor otevře jen pro tento zápis
+        Returns: offset záznamu v souboru
+        """
+        writer = self._writers.get(imei)
+        if writer is not None:
+            self._maybe_rotate(imei, writer)
+            return writer.append(frame, received_ms)
+
+        writer = self.open_writer(imei)
+        try:
+            self._maybe_rotate(imei, writer)
+            return writer.append(frame, received_ms)
+        finally:
+            self.close_writer(imei, writer)
+
+    def _maybe_rotate(self, imei: str, writer: RecordWriter):
+        """Uzavře data.bin jako segment podle nastavené rotace (před zápisem dalšího rámce)"""
+        if self.rotation is None or not self.rotation.should_rotate(writer.data_size, writer.last_write):
+            return
+        segment = writer.rotate(self.rotation)
+        if segment and self.on_rotate is not None:
+            self.on_rotate(imei, segment)
+
+    def iter_frames(self, imei: str, start_offset: int = 0, file_name: str = RECORD_FILE) -> Iterator[StoredFrame]:
+        """
+        Prochází uložené rámce od nejstaršího (aktivního data.bin nebo segmentu)
+        Neúplný záznam na konci souboru (přerušený zápis) se ignoruje
+        """
+        path = self.get_record_file(imei, file_name)
+        try:
+            f = open_segment(path)
+        except FileNotFoundError:
+            return
+
+        with f:
+            yield from iter_file_frames(f, start_offset, path)
+
+    def read_last_frames(self, imei: str, count: int) -> List[StoredFrame]:
+        """Načte posledních N rámců (od nejstaršího) čtením souboru odzadu"""
+        if count <= 0:
+            return []
+        path = self.get_record_file(imei)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return []
+
+        frames = []
+        with f:
+            if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                return []
+            pos = f.seek(0, os.SEEK_END)
+            while pos > len(FILE_MAGIC) and len(frames) < count:
+                f.seek(pos - _ENTRY_TRAILER.size)
+                length, marker = _ENTRY_TRAILER.unpack(f.read(_ENTRY_TRAILER.size))
+                start = pos - ENTRY_OVERHEAD - length
+                if marker != ENTRY_MARKER or start < len(FILE_MAGIC):
+                    break
+                f.seek(start)
+                entry = f.read(ENTRY_OVERHEAD + length)
+                header_marker, received_ms, header_length = _ENTRY_HEADER.unpack_from(entry)
+                if header_marker != ENTRY_MARKER or header_length != length:
+                    break
+                frames.append(StoredFrame(start, received_ms, entry[_ENTRY_HEADER.size:-_ENTRY_TRAILER.size]))
+                pos = start
+            else:
+                frames.reverse()
+                return frames
+
+        # Konec souboru neodpovídá formátu (přerušený zápis) - projdi soubor odpředu
+        return list(deque(self.iter_frames(imei), maxlen=count))
+
+    def iter_headers(self, imei: str, start_offset: int = 0, end_offset: Optional[int] = None,
+                     file_name: str = RECORD_FILE) -> Iterator[Tuple[int, int, int]]:
+        """
+        Prochází hlavičky kompletních záznamů od start_offset (bez čtení rámců)
+        Yields: (offset záznamu, čas přijetí v epoch ms, délka rámce)
+        """
+        path = self.get_record_file(imei, file_name)
+        try:
+            f = open_segment(path)
+        except FileNotFoundError:
+            return
+
+        with f:
+            size = data_size(path)
+            if end_offset is not None:
+                size = min(size, end_offset)
+            yield from iter_file_headers(f, size, start_offset)
+
+    def scan_frames(self, imei: str, start_offset: int = 0,
+                    file_name: str = RECORD_FILE) -> Tuple[int, int, Optional[int]]:
+        """
+        Projde hlavičky záznamů od start_offset (bez čtení rámců)
+        Returns: (počet záznamů, offset konce posledního kompletního záznamu, čas přijetí posledního záznamu)
+        """
+        count = 0
+        end = start_offset
+        last_received_ms = None
+        for offset, received_ms, length in self.iter_headers(imei, start_offset, file_name=file_name):
+            count += 1
+            end = offset + ENTRY_OVERHEAD + length
+            last_received_ms = received_ms
+        if not count:
+            # Prázdný soubor (jen hlavička) nebo žádný soubor
+            try:
+                size = os.path.getsize(self.get_record_file(imei, file_name))
+            except OSError:
+                return 0, 0, None
+            end = max(start_offset, min(size, len(FILE_MAGIC)))
+        return count, end, last_received_ms
+
+    def count_frames(self, imei: str) -> int:
+        """Spočítá uložené rámce (čte jen hlavičky záznamů)"""
+        return self.scan_frames(imei)[0]
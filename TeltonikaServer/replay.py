@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Teltonika Server - přehrání uložené historie
+Znovu dekóduje surové rámce všech zařízení (data.csv, data.bin a jejich segmenty)
+paralelně v procesech a zapíše dekódované rámce jako JSON Lines
+"""
+
+import argparse
+import binascii
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from record_store import RecordStore, RECORD_FILE
+from segments import COMPRESSED_SUFFIX, is_compressed, list_segments, open_segment
+from teltonika_protocol import format_packet_for_json
+from time_service import get_time_service
+
+CSV_FILE = 'data.csv'
+# Výstup se zapisuje po dávkách řádků
+WRITE_BATCH_LINES = 1000
+
+
+def default_base_dir():
+    """Stejná složka jako u main.py / TCP serveru"""
+    return '/share/teltonika' if os.path.exists('/data') or os.environ.get('HA_ADDON') else './config'
+
+
+def device_files(devices_dir, imei):
+    """Datové soubory zařízení od nejstaršího - CSV a binární, segmenty před aktivním souborem"""
+    files = []
+    for active in (CSV_FILE, RECORD_FILE):
+        path = os.path.join(devices_dir, imei, active)
+        files.extend(os.path.basename(segment) for segment in list_segments(path))
+        if os.path.exists(path):
+            files.append(active)
+    return files
+
+
+def list_work(devices_dir, imeis=None):
+    """
+    Úlohy (imei, soubor, velikost) - jeden datový soubor = jedna úloha pro worker
+    Běžící server může segment mezitím zkomprimovat (použije se .gz) nebo smazat retencí (přeskočí se)
+    """
+    work = []
+    for imei in sorted(os.listdir(devices_dir)):
+        if imeis and imei not in imeis:
+            continue
+        if not os.path.isdir(os.path.join(devices_dir, imei)):
+            continue
+        for file_name in device_files(devices_dir, imei):
+            found = _existing_file(os.path.join(devices_dir, imei), file_name)
+            if found is not None:
+                work.append((imei, *found))
+    return work
+
+
+def _existing_file(device_dir, file_name):
+    """(název, velikost) souboru nebo jeho zkomprimované verze, None pokud už neexistuje"""
+    names = [file_name] if is_compressed(file_name) else [file_name, file_name + COMPRESSED_SUFFIX]
+    for name in names:
+        try:
+            return name, os.path.getsize(os.path.join(device_dir, name))
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def output_name(file_name):
+    """data.csv -> data.csv.jsonl, segment data-...bin.gz -> data-...bin.jsonl"""
+    if file_name.endswith(COMPRESSED_SUFFIX):
+        file_name = file_name[:-len(COMPRESSED_SUFFIX)]
+    return file_name + '.jsonl'
+
+
+def _iter_csv_frames(path):
+    """(čas přijetí, rámec) z data.csv nebo jeho segmentu"""
+    with open_segment(path) as f:
+        for line in f:
+            if not line.endswith(b'\n') or line.startswith(b'timestamp'):
+                continue
+            timestamp, _, raw_data = line.rstrip(b'\r\n').partition(b',')
+            try:
+                frame = binascii.unhexlify(raw_data.strip(b'"'))
+            except (binascii.Error, ValueError):
+                frame = b''
+            yield timestamp.decode('ascii', errors='replace'), frame
+
+
+def _iter_bin_frames(base_dir, imei, file_name):
+    """(čas přijetí, rámec) z data.bin nebo jeho segmentu"""
+    time_service = get_time_service()
+    for stored_frame in RecordStore(base_dir).iter_frames(imei, 0, file_name):
+        yield time_service.format_epoch_ms(stored_frame.received_ms), stored_frame.frame
+
+
+def replay_file(base_dir, imei, file_name, output_dir, compress=False):
+    """
+    Worker: dekóduje všechny rámce jednoho souboru a zapíše je do output_dir/<imei>/
+    Returns: statistika souboru (rámce, záznamy, chybné rámce, přečtené byty)
+    """
+    started = time.monotonic()
+    path = os.path.join(base_dir, 'devices', imei, file_name)
+    if '.csv' in file_name:
+        frames = _iter_csv_frames(path)
+    else:
+        frames = _iter_bin_frames(base_dir, imei, file_name)
+
+    target_dir = os.path.join(output_dir, imei)
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, output_name(file_name) + (COMPRESSED_SUFFIX if compress else ''))
+    temp_path = target + '.tmp'
+
+    frame_count = record_count = errors = 0
+    lines = []
+    # Zápis do dočasného souboru - přerušený běh nezanechá poloviční výstup
+    with (gzip.open(temp_path, 'wt', encoding='utf-8') if compress else
+          open(temp_path, 'w', encoding='utf-8')) as out:
+        for timestamp, frame in frames:
+            decoded = format_packet_for_json(frame)
+            frame_count += 1
+            record_count += len(decoded['records'])
+            errors += 'error' in decoded
+            lines.append(json.dumps({'timestamp': timestamp, **decoded}, ensure_ascii=False))
+            if len(lines) >= WRITE_BATCH_LINES:
+                out.write('\n'.join(lines) + '\n')
+                lines = []
+        if lines:
+            out.write('\n'.join(lines) + '\n')
+    os.replace(temp_path, target)
+
+    found = _existing_file(os.path.dirname(path), file_name)
+    return {'imei': imei, 'file': file_name, 'frames': frame_count, 'records': record_count, 'errors': errors,
+            'bytes': found[1] if found else 0, 'seconds': time.monotonic() - started}
+
+
+def replay(base_dir, output_dir, workers=None, imeis=None, compress=False, report=print):
+    """
+    Přehraje historii všech (nebo vybraných) zařízení - soubory se rozdělí mezi procesy,
+    největší jdou první, aby na konci nečekal jeden worker na velký soubor
+    Returns: souhrnná statistika
+    """
+    devices_dir = os.path.join(base_dir, 'devices')
+    work = sorted(list_work(devices_dir, imeis), key=lambda item: item[2], reverse=True)
+    total_bytes = sum(size for _, _, size in work)
+    workers = workers or os.cpu_count() or 1
+    report(f"Replaying {len(work)} files of {len({imei for imei, _, _ in work})} devices "
+           f"({total_bytes / 1048576:.1f} MB) with {workers} workers into {output_dir}")
+
+    totals = {'files': 0, 'failed': 0, 'frames': 0, 'records': 0, 'errors': 0, 'bytes': 0}
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(replay_file, base_dir, imei, file_name, output_dir, compress): (imei, file_name)
+                   for imei, file_name, _ in work}
+        for future in as_completed(futures):
+            imei, file_name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                report(f"Error replaying {imei}/{file_name}: {e}")
+                totals['failed'] += 1
+                continue
+            for key in ('frames', 'records', 'errors', 'bytes'):
+                totals[key] += result[key]
+            totals['files'] += 1
+            elapsed = max(time.monotonic() - started, 1e-6)
+            report(f"[{totals['files']}/{len(work)}] {imei}/{file_name}: {result['frames']} frames, "
+                   f"{result['records']} records in {result['seconds']:.2f} s | total "
+                   f"{totals['bytes'] / total_bytes * 100 if total_bytes else 100:.0f} %, "
+                   f"{totals['records'] / elapsed:.0f} records/s, {totals['bytes'] / 1048576 / elapsed:.1f} MB/s")
+
+    totals['seconds'] = time.monotonic() - started
+    rate = totals['records'] / max(totals['seconds'], 1e-6)
+    report(f"Done: {totals['frames']} frames, {totals['records']} records, {totals['errors']} undecodable frames, "
+           f"{totals['failed']} failed files in {totals['seconds']:.1f} s ({rate:.0f} records/s)")
+    return totals
+
+
+def main():
+    base_dir = default_base_dir()
+    parser = argparse.ArgumentParser(description='Re-decode stored raw Teltonika data into JSON Lines')
+    parser.add_argument('--base-dir', default=base_dir, help=f'Data directory of the server (default {base_dir})')
+    parser.add_argument('--output-dir', help='Where to write decoded files (default <base-dir>/decoded)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default all cores)')
+    parser.add_argument('--imei', action='append', help='Replay only this device (repeatable)')
+    parser.add_argument('--gzip', action='store_true', help='Compress the decoded files')
+    args = parser.parse_args()
+
+    if not os.path.isdir(os.path.join(args.base_dir, 'devices')):
+        print(f"No devices directory in {args.base_dir}")
+        return 1
+    output_dir = args.output_dir or os.path.join(args.base_dir, 'decoded')
+    totals = replay(args.base_dir, output_dir, args.workers, args.imei, args.gzip)
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
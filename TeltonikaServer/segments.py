@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Rotace datových souborů a server logu do uzavřených segmentů s kompresí a retencí"""
+
+import gzip
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import List, Optional
+
+# Výchozí rotace - po 10 MB nebo na začátku nového dne, segmenty se drží navždy
+DEFAULT_ROTATE_SIZE = 10 * 1024 * 1024
+DEFAULT_RETENTION_DAYS = 0
+
+COMPRESSED_SUFFIX = '.gz'
+# Čas rotace v UTC - segment obsahuje data zapsaná před tímto okamžikem
+SEGMENT_TIME_FORMAT = '%Y%m%dT%H%M%SZ'
+
+# Komprese uzavřených segmentů běží mimo zapisující thread
+_compressor = None
+_compressor_lock = threading.Lock()
+_pending_compressions = set()
+
+
+class RotationPolicy:
+    """
+    Kdy uzavřít aktivní soubor: po dosažení max_bytes a/nebo při prvním zápisu
+    v novém dni (daily). Segmenty starší než retention_days se mažou (0 = nikdy).
+    """
+    __slots__ = ('max_bytes', 'daily', 'retention_days', 'compress')
+
+    def __init__(self, max_bytes: int = DEFAULT_ROTATE_SIZE, daily: bool = True,
+                 retention_days: int = DEFAULT_RETENTION_DAYS, compress: bool = True):
+        self.max_bytes = max_bytes
+        self.daily = daily
+        self.retention_days = retention_days
+        self.compress = compress
+
+    def should_rotate(self, size: int, last_write: float, now: Optional[float] = None) -> bool:
+        """size = velikost dat v souboru, last_write = čas posledního zápisu (mtime)"""
+        if size <= 0:
+            return False
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        if self.daily:
+            now = time.time() if now is None else now
+            return time.localtime(last_write)[:3] != time.localtime(now)[:3]
+        return False
+
+
+def _segment_pattern(file_name: str):
+    stem, ext = os.path.splitext(file_name)
+    return re.compile(re.escape(stem) + r'-(\d{8}T\d{6}Z)(?:-(\d+))?' + re.escape(ext) +
+                      '(' + re.escape(COMPRESSED_SUFFIX) + ')?$')
+
+
+def list_segments(path: str) -> List[str]:
+    """
+    Vrátí uzavřené segmenty souboru od nejstaršího (data.csv -> data-<čas>.csv[.gz])
+    Během komprese může existovat nekomprimovaná i komprimovaná verze - použije se
+    nekomprimovaná, komprimovaná je hotová až po jejím smazání
+    """
+    directory, file_name = os.path.split(path)
+    pattern = _segment_pattern(file_name)
+    segments = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            key = (match.group(1), int(match.group(2) or 0))
+            if key not in segments or not match.group(3):
+                segments[key] = name
+    return [os.path.join(directory, segments[key]) for key in sorted(segments)]
+
+
+def segment_time(segment_path: str) -> float:
+    """Čas rotace segmentu (epoch s) - horní mez časů záznamů v segmentu"""
+    match = re.search(r'-(\d{8}T\d{6}Z)', os.path.basename(segment_path))
+    return datetime.strptime(match.group(1), SEGMENT_TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(COMPRESSED_SUFFIX)
+
+
+def open_segment(path: str):
+    """
+    Otevře soubor nebo segment pro čtení (binárně, .gz transparentně)
+    Nekomprimovaný segment, který mezitím dokončená komprese smazala, se otevře z .gz
+    (offsety v rozbalených datech jsou stejné)
+    """
+    if is_compressed(path):
+        return gzip.open(path, 'rb')
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        if not os.path.exists(path + COMPRESSED_SUFFIX):
+            raise
+    return gzip.open(path + COMPRESSED_SUFFIX, 'rb')
+
+
+def data_size(path: str) -> int:
+    """Velikost nekomprimovaných dat (u .gz z patičky ISIZE, segmenty jsou menší než 4 GB)"""
+    if not is_compressed(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            if not os.path.exists(path + COMPRESSED_SUFFIX):
+                raise
+        path += COMPRESSED_SUFFIX
+    with open(path, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return struct.unpack('<I', f.read(4))[0]
+
+
+def rotate_file(path: str, policy: RotationPolicy) -> Optional[str]:
+    """
+    Uzavře aktivní soubor - přejmenuje ho na segment, který se na pozadí zkomprimuje,
+    a smaže segmenty starší než retence. Volá se se zámkem zapisovače souboru.
+    Returns: cesta k segmentu (None pokud soubor neexistuje)
+    """
+    directory, file_name = os.path.split(path)
+    stem, ext = os.path.splitext(file_name)
+    stamp = datetime.now(timezone.utc).strftime(SEGMENT_TIME_FORMAT)
+    segment = os.path.join(directory, f'{stem}-{stamp}{ext}')
+    counter = 0
+    while os.path.exists(segment) or os.path.exists(segment + COMPRESSED_SUFFIX):
+        counter += 1
+        segment = os.path.join(directory, f'{stem}-{stamp}-{counter}{ext}')
+    try:
+        os.replace(path, segment)
+    except FileNotFoundError:
+        return None
+
+    if policy.compress:
+        _submit_compression(segment)
+    if policy.retention_days:
+        apply_retention(path, policy.retention_days)
+    return segment
+
+
+def _submit_compression(segment: str):
+    global _compressor
+    with _compressor_lock:
+        if _compressor is None:
+            _compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='segment-gzip')
+        future = _compressor.submit(compress_segment, segment)
+        _pending_compressions.add(future)
+    future.add_done_callback(_pending_compressions.discard)
+
+
+def compress_segment(segment: str) -> str:
+    """
+    Zkomprimuje uzavřený segment (přes dočasný soubor) a smaže původní - čtenáři,
+    kteří ho mají otevřený, čtou dál (POSIX), nově otevírané čtení přejde na .gz
+    (open_segment, data_size)
+    """
+    target = segment + COMPRESSED_SUFFIX
+    tmp_path = target + '.tmp'
+    try:
+        with open(segment, 'rb') as source, gzip.open(tmp_path, 'wb', compresslevel=6) as compressed:
+            shutil.copyfileobj(source, compressed, 1024 * 1024)
+        os.replace(tmp_path, target)
+        os.remove(segment)
+        return target
+    except FileNotFoundError:
+        # Segment mezitím smazala retence
+        return segment
+    except Exception as e:
+        print(f"Error compressing segment {segment}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return segment
+
+
+def wait_for_compression(timeout: Optional[float] = None):
+    """Počká na dokončení rozběhnutých kompresí (testy, ukončení serveru)"""
+    with _compressor_lock:
+        pending = list(_pending_compressions)
+    wait(pending, timeout)
+
+
+def apply_retention(path: str, retention_days: int, now: Optional[float] = None) -> List[str]:
+    """Smaže segmenty souboru starší než retention_days"""
+    now = time.time() if now is None else now
+    limit = now - retention_days * 86400
+    removed = []
+    for segment in list_segments(path):
+        if segment_time(segment) >= limit:
+            break
+        for candidate in (segment, segment + COMPRESSED_SUFFIX) if not is_compressed(segment) else (segment,):
+            try:
+                os.remove(candidate)
+                removed.append(candidate)
+            except FileNotFoundError:
+                pass
+    return removed
@@ -1,22 +1,21 @@
+import asyncio
 import socket
 import threading
 import os
-import glob
-import binascii
 import struct
-import pytz
-from datetime import datetime, timezone, timedelta
+from functools import partial
 
-from teltonika_protocol import parse_imei, parse_avl_packet, parse_avl_packet_with_length, format_record_for_log
+from teltonika_protocol import parse_imei, parse_avl_packet_with_length, is_command_frame, build_command_frame, GPRSMessage, GPRS_RESPONSE, GPRS_NACK
 from imei_registry import IMEIRegistry
-from csv_logger import CSVLogger
+from csv_logger import get_shared_logger
 from buffer_manager import BufferManager
+from segments import list_segments
+from time_service import local_time, epoch_ms
+from ingest_pipeline import IngestPipeline, DEFAULT_PARSE_WORKERS, DEFAULT_STORAGE_WORKERS, DEFAULT_QUEUE_SIZE
 
 def get_local_time():
     """Vrátí aktuální čas z Home Assistant timezone"""
-    tz_name = os.environ.get('TZ', 'Europe/Prague')
-    tz = pytz.timezone(tz_name)
-    return datetime.now(tz).strftime('%Y-%m-%d %H:%M:%S')
+    return local_time()
 
 def log_print(message):
     """Print s časovou značkou pro HA addon log"""
@@ -36,6 +35,27 @@ imei_registry = None
 csv_logger = None
 buffer_manager = None
 
+# Parametry příjmu spojení
+DEFAULT_BACKLOG = 1024
+DEFAULT_MAX_CONNECTIONS = 10000
+listen_backlog = DEFAULT_BACKLOG
+max_connections = DEFAULT_MAX_CONNECTIONS
+active_connections = 0
+connections_lock = threading.Lock()
+
+# Úložiště surových rámců (binary = data.bin, csv = hex v data.csv)
+DEFAULT_RAW_STORAGE = 'binary'
+raw_storage = DEFAULT_RAW_STORAGE
+
+# Rotace data.csv, data.bin a server.log do segmentů (segments.RotationPolicy, None = bez rotace)
+rotation_policy = None
+
+# Ingest pipeline - zápis a dekódování rámců ve worker threadech mimo spojení
+parse_workers = DEFAULT_PARSE_WORKERS
+storage_workers = DEFAULT_STORAGE_WORKERS
+ingest_queue_size = DEFAULT_QUEUE_SIZE
+ingest_pipeline = None
+
 def ensure_data_dir():
     """Vytvoří data složku pokud neexistuje"""
     try:
@@ -65,7 +85,9 @@ def get_csv_logger():
     """Vrátí CSV logger instanci"""
     global csv_logger
     if csv_logger is None:
-        csv_logger = CSVLogger(CONFIG_DIR)
+        csv_logger = get_shared_logger(CONFIG_DIR)
+        csv_logger.raw_storage = raw_storage
+        csv_logger.set_rotation(rotation_policy)
     return csv_logger
 
 def get_buffer_manager():
@@ -75,23 +97,236 @@ def get_buffer_manager():
         buffer_manager = BufferManager(CONFIG_DIR)
     return buffer_manager
 
+def get_ingest_pipeline():
+    """Vrátí ingest pipeline (metriky front jsou v /api/stats)"""
+    global ingest_pipeline
+    if ingest_pipeline is None:
+        ingest_pipeline = IngestPipeline(parse_workers, storage_workers, ingest_queue_size)
+        get_csv_logger().register_stats('ingest', ingest_pipeline.stats)
+    return ingest_pipeline
+
+def shutdown_server():
+    """Ukončení procesu (SIGTERM): dopíše a potvrdí rámce z front, uloží registr a zavře server log"""
+    if ingest_pipeline is not None:
+        ingest_pipeline.close()
+    if imei_registry is not None:
+        imei_registry.flush()
+    if csv_logger is not None:
+        csv_logger.event_log.close()
+
 def get_log_file():
     """Vrátí cestu k aktuálnímu log souboru"""
     # Nyní používáme pouze server.log v hlavní složce
     return os.path.join(CONFIG_DIR, 'server.log')
 
 def get_all_log_files():
-    """Vrátí seznam všech log souborů seřazených podle data"""
+    """Vrátí seznam všech log souborů seřazených podle data (uzavřené segmenty a server.log)"""
     server_log = os.path.join(CONFIG_DIR, 'server.log')
+    log_files = list_segments(server_log)
     if os.path.exists(server_log):
-        return [server_log]
-    return []
+        log_files.append(server_log)
+    return log_files
+
+def process_imei_handshake(data, client_address, allowed_imeis=None):
+    """
+    Zpracuje IMEI handshake packet
+    Returns: (client_imei, response) - client_imei je None pokud bylo spojení odmítnuto
+    """
+    csv_logger = get_csv_logger()
+    imei = parse_imei(data)
+    if not imei:
+        csv_logger.log_server_event(f"Invalid IMEI handshake from {client_address}")
+        return None, b"\x00"  # Reject
+
+    # Zkontroluj, zda je IMEI povoleno
+    registry = get_imei_registry()
+    if not registry.is_imei_allowed(imei, allowed_imeis or []):
+        return None, b"\x00"  # Reject
+
+    # Zaregistruj IMEI v registru
+    client_ip = client_address[0]
+    is_new_device = registry.register_imei_connection(imei, client_ip)
+
+    # Zaloguj IMEI
+    status = "NEW DEVICE" if is_new_device else "KNOWN DEVICE"
+    csv_logger.log_server_event(f"IMEI {imei} connected from {client_address} ({status})")
+
+    # Vytvoř device info pokud je nový
+    if is_new_device:
+        csv_logger.create_device_info(imei)
+
+    # Odpověz na IMEI handshake - 0x01 = accept
+    return imei, b"\x01"
+
+class DeviceSession:
+    """
+    Zařízení jednoho spojení - zapisovač surových rámců otevírá a zavírá storage worker,
+    send posílá odpověď zařízení (volá ho storage worker po zápisu rámců)
+    """
+    __slots__ = ('imei', 'raw_writer', 'send', 'write_failed')
+
+    def __init__(self, imei, send=None):
+        self.imei = imei
+        self.raw_writer = None
+        self.send = send
+        self.write_failed = False
+
+def open_device_session(session):
+    """Storage worker: otevře zapisovač surových rámců (před prvním rámcem spojení)"""
+    session.raw_writer = get_csv_logger().open_raw_writer(session.imei)
+
+def close_device_session(session):
+    """Storage worker: zavře zapisovač (po posledním rámci spojení)"""
+    get_csv_logger().close_raw_writer(session.imei, session.raw_writer)
+
+def store_avl_frame(session, frame, received_ms):
+    """Storage worker: uloží surový rámec - ukládáme celé rámce, ne jednotlivé TCP segmenty"""
+    # Rámec, který není na disku, se nepotvrdí - zařízení ho zopakuje
+    session.write_failed = True
+    get_csv_logger().log_raw_frame(session.imei, frame, received_ms)
+    session.write_failed = False
+
+def acknowledge_frame(session, ack, command=b""):
+    """
+    Storage worker: potvrdí rámec až po jeho zápisu (úlohy jednoho IMEI běží v pořadí,
+    takže store_avl_frame rámce už doběhl). Při chybě zápisu se ACK nepošle.
+    """
+    if ack and session.write_failed:
+        get_csv_logger().log_server_event(f"Could not store AVL frame from IMEI {session.imei}, not acknowledged")
+        ack = b""
+    if not ack and not command:
+        return
+    try:
+        session.send(ack + command)
+    except (OSError, RuntimeError) as e:
+        # Spojení (nebo event loop) už je zavřené
+        get_csv_logger().log_server_event(f"Could not send ACK to IMEI {session.imei}: {e}")
+
+def process_avl_data(session, data, stream_buffer):
+    """
+    Rozdělí AVL data od autentizovaného zařízení na kompletní rámce a zkontroluje je
+    Každý rámec s platným CRC se uloží, rámec se shodným počtem záznamů se navíc
+    dekóduje a potvrdí počtem jeho záznamů (uint32 big-endian). ACK pošle storage worker
+    až po zápisu rámce (úloha acknowledge_frame hned za store_avl_frame).
+    Za ACK (nebo po odpovědi na příkaz) se připojí další čekající příkaz pro zařízení.
+    Returns: úlohy pro ingest pipeline [(fáze, funkce, argumenty)]
+    """
+    pipeline = get_ingest_pipeline()
+    stream_buffer.feed(data)
+    received_ms = epoch_ms()
+    discarded = stream_buffer.discarded
+
+    jobs = []
+    acknowledged = False
+    answered = False
+    for frame in stream_buffer.pop_frames():
+        # Rámec čeká ve frontě - nesmí odkazovat do bufferu spojení
+        frame = bytes(frame)
+        jobs.append((pipeline.storage, store_avl_frame, (session, frame, received_ms)))
+        record_count = check_avl_frame(session.imei, frame)
+        if record_count is not None:
+            jobs.append((pipeline.parse, process_avl_frame, (session.imei, frame, record_count)))
+            # Odpověď na příkaz (Codec12/13/14) se nepotvrzuje
+            if is_command_frame(frame):
+                answered = complete_device_command(session.imei, frame) or answered
+            else:
+                jobs.append((pipeline.storage, acknowledge_frame, (session, struct.pack('>I', record_count))))
+                acknowledged = True
+    if stream_buffer.discarded != discarded:
+        get_csv_logger().log_server_event(f"Discarded {stream_buffer.discarded - discarded} bytes of corrupted data "
+                                          f"(no frame with valid CRC) from IMEI {session.imei}, not acknowledged")
+    if acknowledged or answered:
+        command = next_command_frame(session.imei)
+        if command:
+            jobs.append((pipeline.storage, acknowledge_frame, (session, b"", command)))
+    return jobs
+
+def complete_device_command(client_imei, frame):
+    """
+    Přiřadí odpověď zařízení (Codec12/13/14) odeslanému příkazu - běží ve spojení,
+    aby další příkaz mohl odejít hned (rámec odpovědi je krátký)
+    Returns: True pokud odpověď patřila odeslanému příkazu
+    """
+    records = parse_avl_packet_with_length(frame)[0]
+    commands = get_csv_logger().commands
+    answered = False
+    for message in records or ():
+        if message.message_type not in (GPRS_RESPONSE, GPRS_NACK):
+            continue
+        if commands.complete(client_imei, message.text, rejected=message.message_type == GPRS_NACK):
+            answered = True
+    return answered
+
+def next_command_frame(client_imei):
+    """Codec12 rámec dalšího příkazu pro zařízení, b'' pokud nic nečeká nebo se čeká na odpověď"""
+    csv_logger = get_csv_logger()
+    if not csv_logger.commands.has_pending(client_imei):
+        return b""
+    command = csv_logger.commands.next_command(client_imei)
+    if command is None:
+        return b""
+    csv_logger.log_server_event(f"Sending command #{command.command_id} to IMEI {client_imei}: {command.command}")
+    return build_command_frame(command.command)
+
+def check_avl_frame(client_imei, frame):
+    """
+    Zkontroluje počet záznamů rámce (levné, běží ve spojení kvůli ACK) - CRC už
+    ověřil StreamBuffer.pop_frames
+    Returns: počet záznamů k potvrzení, None pokud rámec neprošel kontrolou
+    """
+    csv_logger = get_csv_logger()
+
+    # Počet záznamů je v hlavičce i na konci datové části - musí se shodovat
+    record_count = frame[9]
+    if frame[-5] != record_count:
+        csv_logger.log_server_event(f"Record count mismatch in AVL frame from IMEI {client_imei} ({record_count} != {frame[-5]}), not acknowledged")
+        return None
+    return record_count
+
+def process_avl_frame(client_imei, frame, record_count):
+    """Parse worker: dekóduje zkontrolovaný rámec, zaloguje výsledek a započítá záznamy"""
+    csv_logger = get_csv_logger()
+
+    records, parsed_count, codec_type, packet_length = parse_avl_packet_with_length(frame)
+    if records and isinstance(records[0], GPRSMessage):
+        for message in records:
+            csv_logger.log_server_event(f"Command response ({codec_type}, type 0x{message.message_type:02X}) "
+                                        f"from IMEI {client_imei}: {message.text}")
+        return
+    if records is None:
+        csv_logger.log_server_event(f"Could not decode AVL frame ({codec_type}) from IMEI {client_imei}, raw data stored")
+    elif parsed_count != record_count:
+        csv_logger.log_server_event(f"Decoded {parsed_count}/{record_count} AVL records ({codec_type}) from IMEI {client_imei}")
+    else:
+        csv_logger.log_server_event(f"Received {record_count} AVL records ({codec_type}) from IMEI {client_imei}")
+
+    get_imei_registry().register_avl_records(client_imei, record_count)
+
+def _acquire_connection_slot(client_address):
+    """Zabere slot pro nové spojení, vrátí False pokud je dosažen limit"""
+    global active_connections
+    with connections_lock:
+        if max_connections and active_connections >= max_connections:
+            get_csv_logger().log_server_event(
+                f"Connection limit {max_connections} reached, rejecting {client_address}")
+            return False
+        active_connections += 1
+        return True
+
+def _release_connection_slot():
+    """Uvolní slot spojení"""
+    global active_connections
+    with connections_lock:
+        active_connections -= 1
 
 def handle_client(client_socket, client_address, allowed_imeis=None):
     """Zpracuje komunikaci s jednotlivým klientem podle Teltonika AVL protokolu"""
     client_imei = None
+    session = None
+    stream_buffer = None
     csv_logger = get_csv_logger()
     buffer_mgr = get_buffer_manager()
+    pipeline = get_ingest_pipeline()
     
     csv_logger.log_server_event(f"New connection from {client_address}")
     
@@ -101,96 +336,188 @@ def handle_client(client_socket, client_address, allowed_imeis=None):
                 data = client_socket.recv(4096)  # Větší buffer
                 if not data:
                     break
-                
-                # Log raw data
-                hex_data = binascii.hexlify(data).decode('utf-8').upper()
-                
-                # Pokud máme IMEI, uložit raw data
-                if client_imei:
-                    csv_logger.log_raw_record(client_imei, hex_data)
 
                 # Pokud ještě nemáme IMEI, pokus se ho parsovat
                 if client_imei is None:
-                    imei = parse_imei(data)
-                    if imei:
-                        client_imei = imei
-                        client_ip = client_address[0]
-                        
-                        # Zkontroluj, zda je IMEI povoleno
-                        registry = get_imei_registry()
-                        if not registry.is_imei_allowed(client_imei, allowed_imeis or []):
-                            client_socket.sendall(b"\x00")  # Reject
-                            break
-                        
-                        # Zaregistruj IMEI v registru
-                        is_new_device = registry.register_imei_connection(client_imei, client_ip)
-                        
-                        # Odpověz na IMEI handshake - 0x01 = accept
-                        client_socket.sendall(b"\x01")
-                        
-                        # Zaloguj IMEI
-                        status = "NEW DEVICE" if is_new_device else "KNOWN DEVICE"
-                        csv_logger.log_server_event(f"IMEI {client_imei} connected from {client_address} ({status})")
-                        
-                        # Vytvoř device info pokud je nový
-                        if is_new_device:
-                            csv_logger.create_device_info(client_imei)
-                        
-                        continue
-                    else:
-                        csv_logger.log_server_event(f"Invalid IMEI handshake from {client_address}")
-                        client_socket.sendall(b"\x00")  # Reject
+                    client_imei, response = process_imei_handshake(data, client_address, allowed_imeis)
+                    client_socket.sendall(response)
+                    if client_imei is None:
                         break
+                    stream_buffer = buffer_mgr.open_buffer(client_imei)
+                    session = DeviceSession(client_imei, client_socket.sendall)
+                    pipeline.storage.submit(client_imei, open_device_session, session)
+                    continue
 
-                # Pokud máme IMEI, zpracuj data jednodušeji 
-                if client_imei:
-                    # Přidej data do bufferu (zachováváme buffer logiku)
-                    buffer_mgr.append_data(client_imei, data)
-                    
-                    # Jednoduchá odpověď - ACK pro přijaté údaje
-                    client_socket.sendall(b"\x00\x00\x00\x01")  # ACK pro 1 packet
-                else:
-                    # Nemáme ještě IMEI - čekáme na handshake
-                    pass
+                # Pokud máme IMEI, zpracuj AVL data - ACK pošle storage worker po zápisu rámce
+                # (plná fronta tu zablokuje čtení ze socketu)
+                for stage, func, args in process_avl_data(session, data, stream_buffer):
+                    stage.submit(client_imei, func, *args)
                     
             except Exception as e:
                 csv_logger.log_server_event(f"Error processing data from {client_address}: {e}")
                 break
         
-        # Cleanup při ukončení spojení
+        # Cleanup při ukončení spojení - zapisovač se zavře až po zapsání rámců ve frontě
         if client_imei:
+            buffer_mgr.close_buffer(client_imei, stream_buffer)
+            pipeline.storage.submit(client_imei, close_device_session, session)
+            csv_logger.commands.disconnect(client_imei)
             csv_logger.log_server_event(f"IMEI {client_imei} disconnected from {client_address}")
 
-def start_tcp_server(host='0.0.0.0', port=3030, allowed_imeis=None, config_logging=False):
-    """Spustí TCP server pro příjem dat od Teltonika zařízení"""
-    global log_to_config
-    log_to_config = config_logging
-    
-    # Inicializuj CSV logger a buffer manager (vytvoří potřebné složky)
+async def handle_client_async(reader, writer, allowed_imeis=None):
+    """Asyncio varianta handle_client - jedno spojení = jedna coroutine místo threadu"""
+    client_address = writer.get_extra_info('peername')
+    client_imei = None
+    session = None
+    stream_buffer = None
     csv_logger = get_csv_logger()
     buffer_mgr = get_buffer_manager()
-    csv_logger.log_server_event("TCP server starting up...")
-    
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server.bind((host, port))
-    server.listen(5)
-    
+    pipeline = get_ingest_pipeline()
+    loop = asyncio.get_running_loop()
+
+    if not _acquire_connection_slot(client_address):
+        writer.close()
+        return
+
+    csv_logger.log_server_event(f"New connection from {client_address}")
+
+    try:
+        while True:
+            try:
+                data = await reader.read(4096)
+                if not data:
+                    break
+
+                # Pokud ještě nemáme IMEI, pokus se ho parsovat
+                if client_imei is None:
+                    client_imei, response = process_imei_handshake(data, client_address, allowed_imeis)
+                    writer.write(response)
+                    await writer.drain()
+                    if client_imei is None:
+                        break
+                    stream_buffer = buffer_mgr.open_buffer(client_imei)
+                    # Storage worker posílá ACK přes event loop (writer není thread-safe)
+                    session = DeviceSession(client_imei, partial(loop.call_soon_threadsafe, writer.write))
+                    await pipeline.storage.submit_async(client_imei, open_device_session, session)
+                    continue
+
+                # Pokud máme IMEI, zpracuj AVL data - ACK pošle storage worker po zápisu rámce
+                # (při plné frontě čeká jen tato coroutine, event loop běží dál)
+                for stage, func, args in process_avl_data(session, data, stream_buffer):
+                    await stage.submit_async(client_imei, func, *args)
+
+            except (ConnectionError, asyncio.IncompleteReadError):
+                break
+            except Exception as e:
+                csv_logger.log_server_event(f"Error processing data from {client_address}: {e}")
+                break
+    finally:
+        _release_connection_slot()
+        writer.close()
+        # Cleanup při ukončení spojení - zapisovač se zavře až po zapsání rámců ve frontě
+        if client_imei:
+            buffer_mgr.close_buffer(client_imei, stream_buffer)
+            await pipeline.storage.submit_async(client_imei, close_device_session, session)
+            csv_logger.commands.disconnect(client_imei)
+            csv_logger.log_server_event(f"IMEI {client_imei} disconnected from {client_address}")
+
+def _threaded_client(client_socket, client_address, allowed_imeis):
+    """Obalí handle_client počítáním aktivních spojení"""
+    try:
+        handle_client(client_socket, client_address, allowed_imeis)
+    finally:
+        _release_connection_slot()
+
+def _raise_fd_limit(required):
+    """Zvýší soft limit otevřených souborů, aby stačil na požadovaný počet spojení"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = required + 256  # Rezerva pro log soubory, web server apod.
+        if soft != resource.RLIM_INFINITY and soft < wanted:
+            new_soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+            log_print(f"Raised open file limit from {soft} to {new_soft}")
+    except Exception as e:
+        log_print(f"Could not raise open file limit: {e}")
+
+def _log_server_start(host, port, allowed_imeis, mode):
+    """Zaloguje start serveru"""
+    csv_logger = get_csv_logger()
     log_location = CONFIG_DIR
     if allowed_imeis:
-        log_print(f"TCP server listening on {host}:{port} with IMEI filter: {allowed_imeis}")
+        log_print(f"TCP server ({mode}) listening on {host}:{port} with IMEI filter: {allowed_imeis}")
         csv_logger.log_server_event(f"Server started with IMEI filter: {allowed_imeis}")
     else:
-        log_print(f"TCP server listening on {host}:{port} (all IMEIs allowed)")
+        log_print(f"TCP server ({mode}) listening on {host}:{port} (all IMEIs allowed)")
         csv_logger.log_server_event("Server started - all IMEIs allowed")
     
     log_print(f"Data saved to: {log_location}")
     csv_logger.log_server_event(f"Data directory: {log_location}")
+    log_print(f"Listen backlog: {listen_backlog}, connection limit: {max_connections or 'unlimited'}")
+    log_print(f"Raw frame storage: {raw_storage}")
+    log_print(f"Ingest workers: {parse_workers} parse, {storage_workers} storage, queue {ingest_queue_size} frames per worker")
+    if rotation_policy:
+        log_print(f"File rotation: {rotation_policy.max_bytes // (1024 * 1024)} MB"
+                  f"{', daily' if rotation_policy.daily else ''}, retention {rotation_policy.retention_days or 'unlimited'} days")
+
+def _configure_server(config_logging, backlog, connection_limit, storage, rotation=None, ingest=None):
+    """Nastaví globální parametry serveru a inicializuje sdílené komponenty"""
+    global log_to_config, listen_backlog, max_connections, raw_storage, rotation_policy
+    global parse_workers, storage_workers, ingest_queue_size
+    log_to_config = config_logging
+    listen_backlog = backlog
+    max_connections = connection_limit
+    raw_storage = storage
+    rotation_policy = rotation
+    if ingest:
+        parse_workers, storage_workers, ingest_queue_size = ingest
+    
+    # Inicializuj CSV logger a buffer manager (vytvoří potřebné složky)
+    csv_logger = get_csv_logger()
+    csv_logger.raw_storage = raw_storage
+    csv_logger.set_rotation(rotation_policy)
+    get_buffer_manager()
+    csv_logger.log_server_event("TCP server starting up...")
+    get_ingest_pipeline()
+    
+    if max_connections:
+        _raise_fd_limit(max_connections)
+
+def _start_udp_listener(host, udp_port, allowed_imeis):
+    """UDP listener ve vlastním threadu - sdílí logger, registr a ingest pipeline s TCP serverem"""
+    if not udp_port:
+        return
+    from udp_server import start_udp_server
+    udp_thread = threading.Thread(target=start_udp_server, args=(host, udp_port, allowed_imeis),
+                                  name='udp-listener', daemon=True)
+    udp_thread.start()
+
+def start_tcp_server(host='0.0.0.0', port=3030, allowed_imeis=None, config_logging=False,
+                     backlog=DEFAULT_BACKLOG, connection_limit=DEFAULT_MAX_CONNECTIONS,
+                     storage=DEFAULT_RAW_STORAGE, rotation=None, ingest=None, udp_port=0):
+    """
+    Spustí TCP server pro příjem dat od Teltonika zařízení (thread per spojení)
+    ingest = (parse workers, storage workers, kapacita fronty workeru), None = výchozí
+    udp_port = port UDP listeneru, 0 = bez UDP
+    """
+    _configure_server(config_logging, backlog, connection_limit, storage, rotation, ingest)
+    _start_udp_listener(host, udp_port, allowed_imeis)
+    
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(listen_backlog)
+    
+    _log_server_start(host, port, allowed_imeis, 'threaded')
 
     try:
         while True:
             client_socket, client_address = server.accept()
-            client_thread = threading.Thread(target=handle_client, args=(client_socket, client_address, allowed_imeis))
+            if not _acquire_connection_slot(client_address):
+                client_socket.close()
+                continue
+            client_thread = threading.Thread(target=_threaded_client, args=(client_socket, client_address, allowed_imeis))
             client_thread.daemon = True
             client_thread.start()
     except KeyboardInterrupt:
@@ -198,6 +525,26 @@ def start_tcp_server(host='0.0.0.0', port=3030, allowed_imeis=None, config_loggi
     finally:
         server.close()
 
+def start_async_tcp_server(host='0.0.0.0', port=3030, allowed_imeis=None, config_logging=False,
+                           backlog=DEFAULT_BACKLOG, connection_limit=DEFAULT_MAX_CONNECTIONS,
+                           storage=DEFAULT_RAW_STORAGE, rotation=None, ingest=None, udp_port=0):
+    """Spustí TCP server nad jedním asyncio event loopem (počet threadů neroste se spojeními)"""
+    _configure_server(config_logging, backlog, connection_limit, storage, rotation, ingest)
+    _start_udp_listener(host, udp_port, allowed_imeis)
+
+    async def serve():
+        server = await asyncio.start_server(
+            lambda reader, writer: handle_client_async(reader, writer, allowed_imeis),
+            host, port, backlog=listen_backlog, reuse_address=True)
+        _log_server_start(host, port, allowed_imeis, 'asyncio')
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        log_print("TCP server shutting down...")
+
 if __name__ == "__main__":
     ensure_data_dir()
     start_tcp_server()
\ No newline at end of file
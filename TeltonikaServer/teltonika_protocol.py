@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 """
 Teltonika AVL Protocol Implementation
-Supports Codec8 and Codec8 Extended protocols
+Supports Codec8, Codec8 Extended and Codec16 data and Codec12/13/14 GPRS commands
 """
 
 import struct
-import binascii
-from datetime import datetime
-from typing import Tuple, Optional, Dict, List, Any
+import time
+from datetime import datetime, timezone
+from typing import Tuple, Optional, Dict, List, Any, Callable, Iterator, NamedTuple
+
+# Maximální délka datové části AVL rámce (Codec ID .. počet záznamů)
+MAX_AVL_DATA_LENGTH = 10000
 
 def parse_imei(data: bytes) -> Optional[str]:
     """
@@ -31,21 +34,47 @@ def parse_imei(data: bytes) -> Optional[str]:
     except Exception:
         return None
 
+def _make_crc16_ibm_table() -> Tuple[int, ...]:
+    """Předpočítá 256 položek tabulky pro CRC-16/IBM (reflektovaný polynomial 0xA001)"""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+_CRC16_IBM_TABLE = _make_crc16_ibm_table()
+
+def _calculate_crc16_table(data: bytes) -> int:
+    """CRC-16/IBM po bytech přes tabulku - čistý Python fallback"""
+    crc = 0
+    table = _CRC16_IBM_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+# C implementace z crcmod, pokud je k dispozici ('crc-16' = CRC-16/IBM, init 0)
+# binascii.crc_hqx použít nelze - počítá CRC-CCITT (0x1021)
+try:
+    from crcmod.predefined import mkPredefinedCrcFun
+    _calculate_crc16_c = mkPredefinedCrcFun('crc-16')
+except ImportError:
+    _calculate_crc16_c = None
+
+CRC16_IMPLEMENTATION = 'crcmod' if _calculate_crc16_c else 'table'
+
 def calculate_crc16(data: bytes) -> int:
     """
     Vypočítá CRC16 pro AVL packet podle Teltonika specifikace
-    Polynomial: 0x1021 (CRC-CCITT)
+    CRC-16/IBM: polynomial 0x8005, reflektovaný 0xA001, počáteční hodnota 0
     """
-    crc = 0
-    for byte in data:
-        crc ^= byte << 8
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = (crc << 1) ^ 0x1021
-            else:
-                crc <<= 1
-            crc &= 0xFFFF
-    return crc
+    if _calculate_crc16_c is not None:
+        return _calculate_crc16_c(data)
+    return _calculate_crc16_table(data)
 
 def validate_avl_packet_crc(data: bytes) -> bool:
     """
@@ -58,18 +87,18 @@ def validate_avl_packet_crc(data: bytes) -> bool:
             return False
             
         # Data length z offsetu 4-8
-        data_length = struct.unpack('>I', data[4:8])[0]
+        data_length = struct.unpack_from('>I', data, 4)[0]
         
         # Kontrola zda máme dostatek dat
         expected_total = 8 + data_length + 4  # preamble + length + data + crc
         if len(data) < expected_total:
             return False
             
-        # Data část (bez preamble, length a CRC)
-        data_part = data[8:8+data_length]
+        # Data část (bez preamble, length a CRC) - bez kopírování
+        data_part = memoryview(data)[8:8+data_length]
         
         # CRC z konce packetu (4 bytes)
-        packet_crc = struct.unpack('>I', data[8+data_length:8+data_length+4])[0]
+        packet_crc = struct.unpack_from('>I', data, 8 + data_length)[0]
         
         # Vypočítej CRC pro data část
         calculated_crc = calculate_crc16(data_part)
@@ -80,288 +109,586 @@ def validate_avl_packet_crc(data: bytes) -> bool:
         print(f"CRC validation error: {e}")
         return False
 
-def parse_avl_record(data: bytes, offset: int, codec_id: int = 0x08) -> Tuple[Dict[str, Any], int]:
+# Předkompilované struktury pro dekódování AVL záznamů
+_RECORD_HEADER = struct.Struct('>QBiiHHBH')   # timestamp, priority, lon, lat, alt, angle, sats, speed
+_RECORD_HEADER_SIZE = _RECORD_HEADER.size     # 24 bytes
+_UINT16 = struct.Struct('>H')
+_UINT8_PAIR = struct.Struct('>BB')
+_UINT16_PAIR = struct.Struct('>HH')
+_CODEC16_IO_HEADER = struct.Struct('>HBB')    # event IO ID, generation type, počet I/O elementů
+
+# (struktura elementu, velikost elementu, popis) pro 1-, 2-, 4- a 8-byte I/O elementy
+# Codec8: 1-byte IO ID, 1-byte počty
+_CODEC8_IO_ELEMENTS = tuple((element, element.size, label) for element, label in (
+    (struct.Struct('>BB'), '1-byte'), (struct.Struct('>BH'), '2-byte'),
+    (struct.Struct('>BI'), '4-byte'), (struct.Struct('>BQ'), '8-byte')))
+# Codec8E: 2-byte IO ID, 2-byte počty
+_CODEC8E_IO_ELEMENTS = tuple((element, element.size, label) for element, label in (
+    (struct.Struct('>HB'), '1-byte'), (struct.Struct('>HH'), '2-byte'),
+    (struct.Struct('>HI'), '4-byte'), (struct.Struct('>HQ'), '8-byte')))
+# Codec16: 2-byte IO ID, 1-byte počty
+_CODEC16_IO_ELEMENTS = _CODEC8E_IO_ELEMENTS
+
+# Předkompilované struktury celého bloku 1/2/4/8-byte I/O elementů podle počtů v sekcích
+# Klíč: (velikost 1-byte elementu = šířka IO ID + 1, velikost počtu, (n1, n2, n4, n8)),
+# hodnota: Struct vracející střídavě ID a hodnotu
+_IO_LAYOUT_CACHE: Dict[Tuple[int, int, Tuple[int, ...]], struct.Struct] = {}
+_IO_LAYOUT_CACHE_LIMIT = 512
+
+def _get_io_layout(count_size: int, counts: Tuple[int, int, int, int], elements) -> struct.Struct:
+    """
+    Vrátí (a případně zkompiluje) Struct pro celý blok 1/2/4/8-byte I/O elementů
+    Struct.unpack bloku vrací plochou n-tici (id1, hodnota1, id2, hodnota2, ...)
+    """
+    key = (elements[0][1], count_size, counts)
+    layout = _IO_LAYOUT_CACHE.get(key)
+    if layout is None:
+        # Počty sekcí se přeskočí pad byty, zbydou jen dvojice ID + hodnota
+        pad = f'{count_size}x'
+        layout = struct.Struct('>' + ''.join(pad + element.format[1:] * count
+                                              for (element, _, _), count in zip(elements, counts)))
+        if len(_IO_LAYOUT_CACHE) >= _IO_LAYOUT_CACHE_LIMIT:
+            _IO_LAYOUT_CACHE.clear()
+        _IO_LAYOUT_CACHE[key] = layout
+    return layout
+
+def _parse_io_fixed_codec8(data, offset: int):
+    """
+    Rychlé určení rozložení 1/2/4/8-byte I/O elementů Codec8
+    Returns: (layout, new_offset), nebo None pokud data nejsou kompletní
+    """
+    end = len(data)
+    pos = offset
+    if pos + 1 > end:
+        return None
+    n1 = data[pos]
+    pos += 1 + 2 * n1
+    if pos + 1 > end:
+        return None
+    n2 = data[pos]
+    pos += 1 + 3 * n2
+    if pos + 1 > end:
+        return None
+    n4 = data[pos]
+    pos += 1 + 5 * n4
+    if pos + 1 > end:
+        return None
+    n8 = data[pos]
+    pos += 1 + 9 * n8
+    if pos > end:
+        return None
+    return _get_io_layout(1, (n1, n2, n4, n8), _CODEC8_IO_ELEMENTS), pos
+
+def _parse_io_fixed_codec8e(data, offset: int):
+    """
+    Rychlé určení rozložení 1/2/4/8-byte I/O elementů Codec8E
+    Returns: (layout, new_offset, parsed_count), nebo None pokud data nejsou kompletní
+    nebo obsahují podezřele vysoké počty
+    """
+    end = len(data)
+    pos = offset
+    if pos + 2 > end:
+        return None
+    n1 = (data[pos] << 8) | data[pos + 1]
+    pos += 2 + 3 * n1
+    if pos + 2 > end:
+        return None
+    n2 = (data[pos] << 8) | data[pos + 1]
+    pos += 2 + 4 * n2
+    if pos + 2 > end:
+        return None
+    n4 = (data[pos] << 8) | data[pos + 1]
+    pos += 2 + 6 * n4
+    if pos + 2 > end:
+        return None
+    n8 = (data[pos] << 8) | data[pos + 1]
+    pos += 2 + 10 * n8
+    if pos > end or n1 > 100 or n2 > 100 or n4 > 100 or n8 > 100:
+        return None
+    return _get_io_layout(2, (n1, n2, n4, n8), _CODEC8E_IO_ELEMENTS), pos, n1 + n2 + n4 + n8
+
+def _parse_io_fixed_codec16(data, offset: int):
+    """
+    Rychlé určení rozložení 1/2/4/8-byte I/O elementů Codec16 (2-byte IO ID, 1-byte počty)
+    Returns: (layout, new_offset), nebo None pokud data nejsou kompletní
+    """
+    end = len(data)
+    pos = offset
+    if pos + 1 > end:
+        return None
+    n1 = data[pos]
+    pos += 1 + 3 * n1
+    if pos + 1 > end:
+        return None
+    n2 = data[pos]
+    pos += 1 + 4 * n2
+    if pos + 1 > end:
+        return None
+    n4 = data[pos]
+    pos += 1 + 6 * n4
+    if pos + 1 > end:
+        return None
+    n8 = data[pos]
+    pos += 1 + 10 * n8
+    if pos > end:
+        return None
+    return _get_io_layout(1, (n1, n2, n4, n8), _CODEC16_IO_ELEMENTS), pos
+
+def _parse_io_partial(data, offset: int, elements) -> Tuple[Tuple[Any, ...], int]:
+    """
+    Pomalá cesta pro neúplný I/O blok s 1-byte počty (Codec8, Codec16)
+    Neúplné elementy na konci dat se přeskočí
+    Returns: (io_flat, new_offset)
+    """
+    io_flat = []
+    data_len = len(data)
+    for element, size, _ in elements:
+        if offset >= data_len:
+            break
+        count = data[offset]
+        offset += 1
+        if count:
+            end = offset + count * size
+            if end > data_len:
+                end = offset + (data_len - offset) // size * size
+            for pair in element.iter_unpack(data[offset:end]):
+                io_flat.extend(pair)
+            offset = end
+    return tuple(io_flat), offset
+
+# Platný rozsah Teltonika timestampů: roky 2000-2100 (946684800000 - 4102444800000 ms)
+_MIN_TIMESTAMP_MS = 946684800000
+_MAX_TIMESTAMP_MS = 4102444800000
+
+def _fallback_timestamp_ms(timestamp_ms: int) -> int:
+    """Neplatný timestamp nahradí současným časem (v ms)"""
+    ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{ts}] Invalid timestamp {timestamp_ms}, using current time", flush=True)
+    return int(time.time() * 1000)
+
+class AVLRecord:
+    """
+    Kompaktní AVL záznam - souřadnice jako celá čísla (stupně * 10^7), čas v ms.
+    I/O blok se drží jako surové byty se sdíleným Struct rozložením a dekóduje se
+    až při přístupu (io_flat = (id1, hodnota1, id2, hodnota2, ...)).
+    Původní tvar slovníku (timestamp, gps, io_data, ...) se skládá až při přístupu,
+    takže record['gps']['latitude'] i format_record_for_log fungují beze změny.
+    """
+    __slots__ = ('timestamp_ms', 'priority', 'longitude_e7', 'latitude_e7', 'altitude', 'angle',
+                 'satellites', 'speed', 'io_event', 'io_count', 'generation_type', '_io', '_io_layout')
+
+    def __init__(self, timestamp_ms, priority, longitude_e7, latitude_e7, altitude, angle,
+                 satellites, speed, io_event=None, io_count=None, io_flat=(), io_layout=None,
+                 generation_type=None):
+        self.timestamp_ms = timestamp_ms
+        self.priority = priority
+        self.longitude_e7 = longitude_e7
+        self.latitude_e7 = latitude_e7
+        self.altitude = altitude
+        self.angle = angle
+        self.satellites = satellites
+        self.speed = speed
+        self.io_event = io_event
+        self.io_count = io_count
+        # Codec16: důvod vygenerování záznamu (0 = On Exit ... 6 = Eventual), jinak None
+        self.generation_type = generation_type
+        # S io_layout je io_flat surový I/O blok (bytes), jinak už dekódovaná n-tice
+        self._io = io_flat
+        self._io_layout = io_layout
+
+    @property
+    def io_flat(self) -> Tuple[Any, ...]:
+        if self._io_layout is None:
+            return self._io
+        return self._io_layout.unpack(self._io)
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp_ms / 1000.0)
+
+    @property
+    def longitude(self) -> float:
+        return self.longitude_e7 / 10000000.0
+
+    @property
+    def latitude(self) -> float:
+        return self.latitude_e7 / 10000000.0
+
+    @property
+    def gps(self) -> Dict[str, Any]:
+        return {
+            'longitude': self.longitude_e7 / 10000000.0,  # Degrees * 10^7, signed
+            'latitude': self.latitude_e7 / 10000000.0,    # Degrees * 10^7, signed
+            'altitude': self.altitude,                    # Meters
+            'angle': self.angle,                          # Degrees
+            'satellites': self.satellites,                # Count
+            'speed': self.speed                           # km/h
+        }
+
+    @property
+    def io_data(self) -> Dict[int, Any]:
+        pairs = iter(self.io_flat)
+        return dict(zip(pairs, pairs))
+
+    def keys(self) -> List[str]:
+        # Záznam zkrácený v I/O části nemá io_* klíče (stejně jako dřívější slovník)
+        keys = ['timestamp', 'priority', 'gps']
+        if self.io_event is not None:
+            keys.append('io_event')
+            if self.generation_type is not None:
+                keys.append('generation_type')
+            if self.io_count is not None:
+                keys += ['io_count', 'io_data']
+        return keys
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Převede záznam na původní tvar slovníku"""
+        return {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, AVLRecord):
+            return NotImplemented
+        return (all(getattr(self, name) == getattr(other, name) for name in self.__slots__[:-2])
+                and self.io_flat == other.io_flat)
+
+    def __repr__(self) -> str:
+        return (f"AVLRecord(timestamp_ms={self.timestamp_ms}, lat={self.latitude:.7f}, "
+                f"lon={self.longitude:.7f}, speed={self.speed}, io_count={self.io_count})")
+
+def _parse_record_header(data, offset: int) -> Tuple[Optional[Tuple[int, ...]], int]:
+    """
+    Parsuje timestamp, prioritu a GPS data (24 bytes) společné pro Codec8 i Codec8E
+    Returns: (timestamp_ms, priority, lon, lat, alt, angle, sats, speed), new_offset
+    """
+    if offset + _RECORD_HEADER_SIZE > len(data):
+        # Timestamp a priorita musí být k dispozici vždy
+        if offset + 9 > len(data):
+            raise struct.error(f"AVL record truncated at offset {offset}: need 9 bytes for timestamp and priority, "
+                               f"have {len(data) - offset}")
+        offset += 9
+        print(f"Not enough data for GPS at offset {offset}, need 15 bytes, have {len(data) - offset}")
+        return None, offset
+
+    header = _RECORD_HEADER.unpack_from(data, offset)
+    timestamp_ms = header[0]
+    if not _MIN_TIMESTAMP_MS <= timestamp_ms <= _MAX_TIMESTAMP_MS:
+        header = (_fallback_timestamp_ms(timestamp_ms),) + header[1:]
+    return header, offset + _RECORD_HEADER_SIZE
+
+def parse_avl_record(data: bytes, offset: int, codec_id: int = 0x08) -> Tuple[AVLRecord, int]:
     """
     Parsuje jednotlivý AVL record pro Codec8 nebo Codec8E
-    Returns: (record_dict, new_offset)
+    data může být bytes nebo memoryview (např. rámec z StreamBuffer), čte se přes
+    unpack_from bez vytváření mezilehlých kopií
+    Returns: (record, new_offset) - record je AVLRecord, record.to_dict() vrátí slovník
     """
-    if codec_id == 0x8E:
-        return parse_avl_record_codec8e(data, offset)
-    else:
-        return parse_avl_record_codec8(data, offset)
+    return _RECORD_PARSERS.get(codec_id, parse_avl_record_codec8)(data, offset)
 
-def parse_avl_record_codec8(data: bytes, offset: int) -> Tuple[Dict[str, Any], int]:
+def parse_avl_record_codec8(data: bytes, offset: int) -> Tuple[AVLRecord, int]:
     """
     Parsuje jednotlivý AVL record pro Codec8 (0x08)
-    Returns: (record_dict, new_offset)
+    Returns: (record, new_offset)
     """
-    record = {}
-    
-    # Timestamp (8 bytes) - Unix timestamp v ms
-    timestamp_ms = struct.unpack('>Q', data[offset:offset+8])[0]
-    try:
-        # Teltonika timestamp je Unix timestamp v milisekundách od 1.1.1970
-        # Validace rozsahu: roky 2000-2100 (946684800000 - 4102444800000 ms)
-        if 946684800000 <= timestamp_ms <= 4102444800000:
-            record['timestamp'] = datetime.fromtimestamp(timestamp_ms / 1000.0)
-        else:
-            # Neplatný timestamp - použij současný čas
-            from datetime import datetime as dt
-            ts = dt.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"[{ts}] Invalid timestamp {timestamp_ms}, using current time", flush=True)
-            record['timestamp'] = datetime.now()
-    except (ValueError, OSError) as e:
-        from datetime import datetime as dt
-        ts = dt.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"[{ts}] Error parsing timestamp {timestamp_ms}: {e}, using current time", flush=True)
-        record['timestamp'] = datetime.now()
-    offset += 8
-    
-    # Priority (1 byte)
-    record['priority'] = struct.unpack('>B', data[offset:offset+1])[0]
-    offset += 1
-    
-    # GPS Data (15 bytes)
-    if offset + 15 > len(data):
-        print(f"Not enough data for GPS at offset {offset}, need 15 bytes, have {len(data) - offset}")
+    header, offset = _parse_record_header(data, offset)
+    if header is None:
         return None, offset
-    gps_data = struct.unpack('>iiHHBH', data[offset:offset+15])  # Changed last part to BH instead of Hbb
-    record['gps'] = {
-        'longitude': gps_data[0] / 10000000.0,  # Degrees * 10^7
-        'latitude': gps_data[1] / 10000000.0,   # Degrees * 10^7
-        'altitude': gps_data[2],                # Meters
-        'angle': gps_data[3],                   # Degrees
-        'satellites': gps_data[4],              # Count
-        'speed': gps_data[5]                    # km/h
-    }
-    offset += 15
-    
-    # I/O Data
-    io_event_id = struct.unpack('>B', data[offset:offset+1])[0]
-    record['io_event'] = io_event_id
-    offset += 1
     
-    # Total I/O elements
-    io_elements = struct.unpack('>B', data[offset:offset+1])[0]
-    record['io_count'] = io_elements
-    offset += 1
-    
-    record['io_data'] = {}
+    # I/O Data - event ID (1 byte) a celkový počet I/O elementů (1 byte)
+    io_event, io_count = _UINT8_PAIR.unpack_from(data, offset)
+    offset += 2
     
-    # 1-byte I/O elements
-    if offset < len(data):
-        count_1b = struct.unpack('>B', data[offset:offset+1])[0]
-        offset += 1
-        for _ in range(count_1b):
-            if offset + 2 <= len(data):
-                io_id = struct.unpack('>B', data[offset:offset+1])[0]
-                io_value = struct.unpack('>B', data[offset+1:offset+2])[0]
-                record['io_data'][io_id] = io_value
-                offset += 2
+    # 1-, 2-, 4- a 8-byte I/O elementy - rychlá cesta pro kompletní data
+    fixed_io = _parse_io_fixed_codec8(data, offset)
+    if fixed_io is not None:
+        io_layout, end = fixed_io
+        return AVLRecord(*header, io_event, io_count, bytes(data[offset:end]), io_layout), end
     
-    # 2-byte I/O elements
-    if offset < len(data):
-        count_2b = struct.unpack('>B', data[offset:offset+1])[0]
-        offset += 1
-        for _ in range(count_2b):
-            if offset + 3 <= len(data):
-                io_id = struct.unpack('>B', data[offset:offset+1])[0]
-                io_value = struct.unpack('>H', data[offset+1:offset+3])[0]
-                record['io_data'][io_id] = io_value
-                offset += 3
+    io_flat, offset = _parse_io_partial(data, offset, _CODEC8_IO_ELEMENTS)
+    return AVLRecord(*header, io_event, io_count, io_flat), offset
+
+def parse_avl_record_codec16(data: bytes, offset: int) -> Tuple[AVLRecord, int]:
+    """
+    Parsuje jednotlivý AVL record pro Codec16 (0x10) - 2-byte IO ID, 1-byte počty
+    a generation type za event IO ID
+    Returns: (record, new_offset)
+    """
+    header, offset = _parse_record_header(data, offset)
+    if header is None:
+        return None, offset
     
-    # 4-byte I/O elements
-    if offset < len(data):
-        count_4b = struct.unpack('>B', data[offset:offset+1])[0]
-        offset += 1
-        for _ in range(count_4b):
-            if offset + 5 <= len(data):
-                io_id = struct.unpack('>B', data[offset:offset+1])[0]
-                io_value = struct.unpack('>I', data[offset+1:offset+5])[0]
-                record['io_data'][io_id] = io_value
-                offset += 5
+    if offset + _CODEC16_IO_HEADER.size > len(data):
+        print(f"Not enough data for Codec16 IO header at offset {offset}")
+        return AVLRecord(*header), offset
+    io_event, generation_type, io_count = _CODEC16_IO_HEADER.unpack_from(data, offset)
+    offset += _CODEC16_IO_HEADER.size
     
-    # 8-byte I/O elements  
-    if offset < len(data):
-        count_8b = struct.unpack('>B', data[offset:offset+1])[0]
-        offset += 1
-        for _ in range(count_8b):
-            if offset + 9 <= len(data):
-                io_id = struct.unpack('>B', data[offset:offset+1])[0]
-                io_value = struct.unpack('>Q', data[offset+1:offset+9])[0]
-                record['io_data'][io_id] = io_value
-                offset += 9
+    fixed_io = _parse_io_fixed_codec16(data, offset)
+    if fixed_io is not None:
+        io_layout, end = fixed_io
+        return AVLRecord(*header, io_event, io_count, bytes(data[offset:end]), io_layout,
+                         generation_type), end
     
-    return record, offset
+    io_flat, offset = _parse_io_partial(data, offset, _CODEC16_IO_ELEMENTS)
+    return AVLRecord(*header, io_event, io_count, io_flat, None, generation_type), offset
 
-def parse_avl_record_codec8e(data: bytes, offset: int) -> Tuple[Dict[str, Any], int]:
+def parse_avl_record_codec8e(data: bytes, offset: int) -> Tuple[AVLRecord, int]:
     """
     Parsuje jednotlivý AVL record pro Codec8 Extended (0x8E)
-    Returns: (record_dict, new_offset)
+    Returns: (record, new_offset)
     """
-    record = {}
-    
-    # Timestamp (8 bytes) - Unix timestamp v ms
-    timestamp_ms = struct.unpack('>Q', data[offset:offset+8])[0]
-    try:
-        # Teltonika timestamp je Unix timestamp v milisekundách od 1.1.1970
-        # Validace rozsahu: roky 2000-2100 (946684800000 - 4102444800000 ms)
-        if 946684800000 <= timestamp_ms <= 4102444800000:
-            record['timestamp'] = datetime.fromtimestamp(timestamp_ms / 1000.0)
-        else:
-            # Neplatný timestamp - použij současný čas
-            from datetime import datetime as dt
-            ts = dt.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"[{ts}] Invalid timestamp {timestamp_ms}, using current time", flush=True)
-            record['timestamp'] = datetime.now()
-    except (ValueError, OSError) as e:
-        from datetime import datetime as dt
-        ts = dt.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"[{ts}] Error parsing timestamp {timestamp_ms}: {e}, using current time", flush=True)
-        record['timestamp'] = datetime.now()
-    offset += 8
-    
-    # Priority (1 byte)
-    record['priority'] = struct.unpack('>B', data[offset:offset+1])[0]
-    offset += 1
-    
-    # GPS Data (15 bytes)
-    if offset + 15 > len(data):
-        print(f"Not enough data for GPS at offset {offset}, need 15 bytes, have {len(data) - offset}")
+    header, offset = _parse_record_header(data, offset)
+    if header is None:
         return None, offset
-    # GPS parsing pro signed coordinates
-    longitude_raw = struct.unpack('>I', data[offset:offset+4])[0]  # Unsigned first
-    latitude_raw = struct.unpack('>I', data[offset+4:offset+8])[0]  # Unsigned first
-    
-    # Convert to signed if needed (check sign bit)
-    if longitude_raw & (1 << 31):
-        longitude_raw = longitude_raw - 2**32
-    if latitude_raw & (1 << 31):
-        latitude_raw = latitude_raw - 2**32
-        
-    gps_remaining = struct.unpack('>HHBH', data[offset+8:offset+15])
-    
-    record['gps'] = {
-        'longitude': longitude_raw / 10000000.0,  # Degrees * 10^7, signed
-        'latitude': latitude_raw / 10000000.0,    # Degrees * 10^7, signed
-        'altitude': gps_remaining[0],             # Meters
-        'angle': gps_remaining[1],                # Degrees
-        'satellites': gps_remaining[2],           # Count
-        'speed': gps_remaining[3]                 # km/h
-    }
-    offset += 15
+    data_len = len(data)
     
     # I/O Data pro Codec8E - odlišná struktura!
     # IO Event ID (2 bytes místo 1!)
-    if offset + 2 > len(data):
+    if offset + 2 > data_len:
         print(f"Not enough data for IO Event ID at offset {offset}")
-        return record, offset
-    io_event_id = struct.unpack('>H', data[offset:offset+2])[0]
-    record['io_event'] = io_event_id
+        return AVLRecord(*header), offset
+    io_event = _UINT16.unpack_from(data, offset)[0]
     offset += 2
     
     # Total I/O elements (2 bytes místo 1!)
-    if offset + 2 > len(data):
+    if offset + 2 > data_len:
         print(f"Not enough data for IO elements count at offset {offset}")
-        return record, offset
-    io_elements = struct.unpack('>H', data[offset:offset+2])[0]
-    record['io_count'] = io_elements
+        return AVLRecord(*header, io_event), offset
     offset += 2
     
-    record['io_data'] = {}
-    
-    # Pro Codec8E má odlišnou strukturu IO - používá 2-byte IO IDs!
-    parsed_io_count = 0
-    
-    # 1-byte I/O elements
-    if offset + 2 <= len(data):
-        count_1b = struct.unpack('>H', data[offset:offset+2])[0]  # 2 bytes pro Codec8E
-        offset += 2
-        if count_1b > 100:
-            print(f"Warning: Suspiciously high 1-byte IO count: {count_1b}")
-            count_1b = min(count_1b, 20)
-            
-        for _ in range(count_1b):
-            if offset + 3 <= len(data):  # 2-byte ID + 1-byte value
-                io_id = struct.unpack('>H', data[offset:offset+2])[0]  # 2-byte ID
-                io_value = struct.unpack('>B', data[offset+2:offset+3])[0]
-                record['io_data'][io_id] = io_value
-                offset += 3
-                parsed_io_count += 1
-    
-    # 2-byte I/O elements
-    if offset + 2 <= len(data):
-        count_2b = struct.unpack('>H', data[offset:offset+2])[0]  # 2 bytes pro Codec8E
-        offset += 2
-        if count_2b > 100:
-            print(f"Warning: Suspiciously high 2-byte IO count: {count_2b}")
-            count_2b = min(count_2b, 20)
-            
-        for _ in range(count_2b):
-            if offset + 4 <= len(data):  # 2-byte ID + 2-byte value
-                io_id = struct.unpack('>H', data[offset:offset+2])[0]  # 2-byte ID
-                io_value = struct.unpack('>H', data[offset+2:offset+4])[0]
-                record['io_data'][io_id] = io_value
-                offset += 4
-                parsed_io_count += 1
-    
-    # 4-byte I/O elements
-    if offset + 2 <= len(data):
-        count_4b = struct.unpack('>H', data[offset:offset+2])[0]  # 2 bytes pro Codec8E
-        offset += 2
-        if count_4b > 100:
-            print(f"Warning: Suspiciously high 4-byte IO count: {count_4b}")
-            count_4b = min(count_4b, 20)
-            
-        for _ in range(count_4b):
-            if offset + 6 <= len(data):  # 2-byte ID + 4-byte value
-                io_id = struct.unpack('>H', data[offset:offset+2])[0]  # 2-byte ID
-                io_value = struct.unpack('>I', data[offset+2:offset+6])[0]
-                record['io_data'][io_id] = io_value
-                offset += 6
-                parsed_io_count += 1
-    
-    # 8-byte I/O elements  
-    if offset + 2 <= len(data):
-        count_8b = struct.unpack('>H', data[offset:offset+2])[0]  # 2 bytes pro Codec8E
-        offset += 2
-        if count_8b > 100:
-            print(f"Warning: Suspiciously high 8-byte IO count: {count_8b}")
-            count_8b = min(count_8b, 20)
-            
-        for _ in range(count_8b):
-            if offset + 10 <= len(data):  # 2-byte ID + 8-byte value
-                io_id = struct.unpack('>H', data[offset:offset+2])[0]  # 2-byte ID
-                io_value = struct.unpack('>Q', data[offset+2:offset+10])[0]
-                record['io_data'][io_id] = io_value
-                offset += 10
-                parsed_io_count += 1
+    # Pro Codec8E má odlišnou strukturu IO - používá 2-byte IO IDs a 2-byte počty!
+    # 1-, 2-, 4- a 8-byte I/O elementy - rychlá cesta pro kompletní data
+    fixed_io = _parse_io_fixed_codec8e(data, offset)
+    io_layout = None
+    if fixed_io is not None:
+        io_layout, end, parsed_io_count = fixed_io
+        io_flat = bytes(data[offset:end])
+        offset = end
+    else:
+        io_flat = []
+        parsed_io_count = 0
+        for element, size, label in _CODEC8E_IO_ELEMENTS:
+            if offset + 2 > data_len:
+                break
+            count = (data[offset] << 8) | data[offset + 1]
+            offset += 2
+            if count:
+                if count > 100:
+                    print(f"Warning: Suspiciously high {label} IO count: {count}")
+                    count = 20
+                end = offset + count * size
+                if end > data_len:
+                    # Neúplné elementy na konci dat se přeskočí
+                    count = (data_len - offset) // size
+                    end = offset + count * size
+                for pair in element.iter_unpack(data[offset:end]):
+                    io_flat.extend(pair)
+                offset = end
+                parsed_io_count += count
     
     # X-byte I/O elements (variable length - only for Codec8E)
-    if offset + 2 <= len(data):
-        count_xb = struct.unpack('>H', data[offset:offset+2])[0]  # 2 bytes pro count
+    if offset + 2 <= data_len:
+        count_xb = _UINT16.unpack_from(data, offset)[0]  # 2 bytes pro count
         offset += 2
         if count_xb > 100:
             print(f"Warning: Suspiciously high X-byte IO count: {count_xb}")
             count_xb = min(count_xb, 10)
-            
+        
+        if count_xb:
+            # X-byte hodnoty se připojí k dekódovaným elementům
+            io_flat = list(io_layout.unpack(io_flat) if io_layout else io_flat)
+            io_layout = None
         for _ in range(count_xb):
-            if offset + 4 <= len(data):
-                io_id = struct.unpack('>H', data[offset:offset+2])[0]  # 2-byte ID
-                value_length = struct.unpack('>H', data[offset+2:offset+4])[0]  # 2-byte length
+            if offset + 4 <= data_len:
+                io_id, value_length = _UINT16_PAIR.unpack_from(data, offset)  # 2-byte ID, 2-byte length
                 offset += 4
                 
-                if offset + value_length <= len(data):
+                if offset + value_length <= data_len:
                     # Pro variable length jen uložíme jako hex string
-                    io_value = data[offset:offset+value_length].hex()
-                    record['io_data'][io_id] = io_value
+                    io_flat.append(io_id)
+                    io_flat.append(data[offset:offset+value_length].hex())
                     offset += value_length
                     parsed_io_count += 1
     
-    # Update actual IO count
-    record['io_count'] = parsed_io_count
-    
-    return record, offset
+    # io_count = skutečný počet naparsovaných elementů
+    if io_layout is None:
+        io_flat = tuple(io_flat)
+    return AVLRecord(*header, io_event, parsed_io_count, io_flat, io_layout), offset
+
+GPRS_COMMAND = 0x05
+GPRS_RESPONSE = 0x06
+GPRS_NACK = 0x11    # Codec14: příkaz s cizím IMEI zařízení odmítlo
+# Za počtem zpráv: typ zprávy (1 byte) a délka obsahu (4 bytes)
+_GPRS_HEADER = struct.Struct('>BI')
+_GPRS_PAYLOAD_OFFSET = 10 + _GPRS_HEADER.size
+
+class GPRSMessage(NamedTuple):
+    """Zpráva příkazového kanálu - příkaz serveru nebo odpověď zařízení (text v ASCII)"""
+    message_type: int
+    text: str
+    timestamp_ms: Optional[int] = None   # Codec13: čas odeslání odpovědi zařízením
+    imei: Optional[str] = None           # Codec14: IMEI, pro které je příkaz určen
+
+class Codec(NamedTuple):
+    """
+    Položka tabulky kodeků - parse_body(data, record_count, data_length) dekóduje
+    tělo rámce za počtem záznamů a vrací seznam AVLRecord / GPRSMessage (None = chyba)
+    """
+    codec_id: int
+    name: str
+    parse_body: Callable[[Any, int, int], Optional[list]]
+    command: bool = False   # příkazový kanál - rámec se nepotvrzuje počtem záznamů
+
+def _records_parser(parse_record):
+    """Dekodér těla rámce s AVL záznamy - parser záznamu je svázaný předem (bez větvení podle kodeku)"""
+    def parse_records(data, record_count: int, data_length: int) -> List[AVLRecord]:
+        records = []
+        offset = 10  # After header
+        
+        for i in range(record_count):
+            if offset + 34 > len(data):  # Minimum record size
+                break
+                
+            try:
+                record, new_offset = parse_record(data, offset)
+                if record:
+                    records.append(record)
+                    offset = new_offset
+                else:
+                    break
+            except Exception as e:
+                from datetime import datetime as dt
+                ts = dt.now().strftime('%Y-%m-%d %H:%M:%S')
+                print(f"[{ts}] Error parsing record {i}: {e}", flush=True)
+                break
+        return records
+    return parse_records
+
+def _gprs_payload(data, data_length: int):
+    """Typ zprávy a obsah (memoryview bez kopie) příkazového rámce, None pokud délky nesedí"""
+    if len(data) < _GPRS_PAYLOAD_OFFSET:
+        return None
+    message_type, size = _GPRS_HEADER.unpack_from(data, 10)
+    # codec(1) + počet(1) + typ(1) + délka(4) + obsah + počet(1)
+    if size + 8 != data_length:
+        return None
+    return message_type, memoryview(data)[_GPRS_PAYLOAD_OFFSET:_GPRS_PAYLOAD_OFFSET + size]
+
+def _parse_codec12_body(data, record_count: int, data_length: int) -> Optional[List[GPRSMessage]]:
+    """Codec12: příkaz nebo odpověď jako ASCII text"""
+    message = _gprs_payload(data, data_length)
+    if message is None:
+        return None
+    message_type, payload = message
+    return [GPRSMessage(message_type, bytes(payload).decode('ascii', errors='replace'))]
+
+def _parse_codec13_body(data, record_count: int, data_length: int) -> Optional[List[GPRSMessage]]:
+    """Codec13: odpověď zařízení s časem odeslání (4 bytes, sekundy) před textem"""
+    message = _gprs_payload(data, data_length)
+    if message is None or len(message[1]) < 4:
+        return None
+    message_type, payload = message
+    timestamp_ms = int.from_bytes(payload[:4], 'big') * 1000
+    return [GPRSMessage(message_type, bytes(payload[4:]).decode('ascii', errors='replace'), timestamp_ms)]
+
+def _parse_codec14_body(data, record_count: int, data_length: int) -> Optional[List[GPRSMessage]]:
+    """Codec14: příkaz / odpověď s IMEI zařízení (8 bytes BCD) před textem, nACK jen s IMEI"""
+    message = _gprs_payload(data, data_length)
+    if message is None or len(message[1]) < 8:
+        return None
+    message_type, payload = message
+    imei = payload[:8].hex().lstrip('0')
+    return [GPRSMessage(message_type, bytes(payload[8:]).decode('ascii', errors='replace'), None, imei)]
+
+# Tabulka kodeků podle Codec ID - parse_avl_packet_with_length jen vyhledá položku
+_CODECS: Dict[int, Codec] = {}
+# Dekodéry jednotlivých AVL záznamů pro parse_avl_record
+_RECORD_PARSERS: Dict[int, Callable[[Any, int], Tuple[AVLRecord, int]]] = {
+    0x08: parse_avl_record_codec8,
+    0x8E: parse_avl_record_codec8e,
+    0x10: parse_avl_record_codec16,
+}
+
+def register_codec(codec: Codec):
+    """Přidá (nebo nahradí) kodek v tabulce"""
+    _CODECS[codec.codec_id] = codec
+
+def get_codec(codec_id: int) -> Optional[Codec]:
+    """Vrátí kodek podle Codec ID, None pro nepodporovaný kodek"""
+    return _CODECS.get(codec_id)
+
+def is_command_frame(data) -> bool:
+    """Rámec příkazového kanálu (Codec12/13/14) - nepotvrzuje se počtem záznamů"""
+    codec = _CODECS.get(data[8]) if len(data) > 8 else None
+    return codec is not None and codec.command
+
+register_codec(Codec(0x08, 'codec8', _records_parser(parse_avl_record_codec8)))
+register_codec(Codec(0x8E, 'codec8_extended', _records_parser(parse_avl_record_codec8e)))
+register_codec(Codec(0x10, 'codec16', _records_parser(parse_avl_record_codec16)))
+register_codec(Codec(0x0C, 'codec12', _parse_codec12_body, command=True))
+register_codec(Codec(0x0D, 'codec13', _parse_codec13_body, command=True))
+register_codec(Codec(0x0E, 'codec14', _parse_codec14_body, command=True))
+
+def build_command_frame(command: str, imei: Optional[str] = None) -> bytes:
+    """
+    Sestaví příkaz pro zařízení - Codec12, s IMEI Codec14 (zařízení příkaz
+    s cizím IMEI odmítne nACK odpovědí)
+    """
+    payload = command.encode('ascii')
+    if imei is None:
+        codec_id = 0x0C
+    else:
+        codec_id = 0x0E
+        payload = bytes.fromhex(imei.rjust(16, '0')) + payload
+    return wrap_avl_data(struct.pack('>BBBI', codec_id, 1, GPRS_COMMAND, len(payload)) + payload + b'\x01')
+
+def wrap_avl_data(avl_data) -> bytes:
+    """Datová část (Codec ID .. počet záznamů) do rámce s preambulí, délkou a CRC"""
+    return b''.join((b'\x00\x00\x00\x00', struct.pack('>I', len(avl_data)), avl_data,
+                     struct.pack('>I', calculate_crc16(avl_data))))
+
+# UDP kanál: délka(2) + packet ID(2) + nepoužitý byte(1) + AVL packet ID(1) + délka IMEI(2),
+# pak IMEI a datová část bez preambule a CRC (integritu řeší UDP checksum)
+_UDP_HEADER = struct.Struct('>HHBBH')
+_UDP_ACK = struct.Struct('>HHBBB')
+
+class UDPHeader(NamedTuple):
+    """Hlavička UDP datagramu - data_offset ukazuje na Codec ID"""
+    packet_id: int
+    avl_packet_id: int
+    imei: str
+    data_offset: int
+
+def parse_udp_header(data) -> Optional[UDPHeader]:
+    """Parsuje hlavičku UDP datagramu, None pokud datagram nemá očekávaný tvar"""
+    if len(data) < _UDP_HEADER.size:
+        return None
+    length, packet_id, _, avl_packet_id, imei_length = _UDP_HEADER.unpack_from(data)
+    data_offset = _UDP_HEADER.size + imei_length
+    # Délka nezahrnuje samotné pole délky, datová část má aspoň Codec ID a dva počty
+    if length + 2 != len(data) or not imei_length or data_offset + 3 > len(data):
+        return None
+    imei = bytes(data[_UDP_HEADER.size:data_offset])
+    if not imei.isdigit():
+        return None
+    return UDPHeader(packet_id, avl_packet_id, imei.decode('ascii'), data_offset)
+
+def build_udp_ack(packet_id: int, avl_packet_id: int, accepted: int) -> bytes:
+    """Potvrzení UDP datagramu - stejné packet ID a AVL packet ID, počet přijatých záznamů"""
+    return _UDP_ACK.pack(5, packet_id, 0x01, avl_packet_id, accepted)
 
 def parse_avl_packet_with_length(data: bytes) -> Tuple[Optional[List[Dict[str, Any]]], int, str, int]:
     """
@@ -381,7 +708,7 @@ def parse_avl_packet_with_length(data: bytes) -> Tuple[Optional[List[Dict[str, A
         data_length = struct.unpack('>I', data[4:8])[0]
         
         # Validace délky
-        if data_length < 10 or data_length > 10000:
+        if data_length < 10 or data_length > MAX_AVL_DATA_LENGTH:
             return None, 0, "unknown", 0
             
         # Celková délka packetu: preamble(4) + length(4) + data + CRC(4)
@@ -392,106 +719,142 @@ def parse_avl_packet_with_length(data: bytes) -> Tuple[Optional[List[Dict[str, A
             print(f"Incomplete packet: need {total_packet_length} bytes, have {len(data)}")
             return None, 0, "unknown", 0
         
-        # Codec ID (1 byte)
+        # Codec ID (1 byte) a počet záznamů / zpráv (1 byte)
         codec_id = data[8]
-        codec_type = "codec8" if codec_id == 0x08 else "codec8_extended" if codec_id == 0x8E else f"unknown_{codec_id}"
-        
-        # Number of records (1 byte)
         record_count = data[9]
         
-        if codec_id not in [0x08, 0x8E] or record_count == 0:
+        codec = _CODECS.get(codec_id)
+        if codec is None:
+            return None, 0, f"unknown_{codec_id}", 0
+        codec_type = codec.name
+        if record_count == 0:
             return None, 0, codec_type, 0
-            
-        # Parse records
-        records = []
-        offset = 10  # After header
-        
-        for i in range(record_count):
-            if offset + 34 > len(data):  # Minimum record size
-                break
-                
-            try:
-                record, new_offset = parse_avl_record(data, offset, codec_id)
-                if record:
-                    records.append(record)
-                    offset = new_offset
-                else:
-                    break
-            except Exception as e:
-                from datetime import datetime as dt
-                ts = dt.now().strftime('%Y-%m-%d %H:%M:%S')
-                print(f"[{ts}] Error parsing record {i}: {e}", flush=True)
-                break
         
+        records = codec.parse_body(data, record_count, data_length)
+        if records is None:
+            return None, 0, codec_type, 0
         return records, len(records), codec_type, total_packet_length
         
     except Exception as e:
         print(f"Error in parse_avl_packet_with_length: {e}")
         return None, 0, "error", 0
 
+# Streamové čtení rámců - preambule, délka dat, data (Codec ID .. počet), CRC
+AVL_PREAMBLE = b'\x00\x00\x00\x00'
+STREAM_CHUNK_SIZE = 64 * 1024
+_UINT32 = struct.Struct('>I')
+
+def _next_frame(buf, pos: int, end: int, check_crc: bool, complete: bool = False) -> Tuple[int, int]:
+    """
+    Najde další kompletní rámec v buf[pos:end] (bytes, bytearray, mmap)
+    Returns: (začátek, konec) rámce, nebo (pozice pro pokračování, -1) pokud chybí data
+    Poškozená data se přeskočí hledáním další preambule (buf.find), ne po bytech v Pythonu.
+    S complete=True už další data nepřijdou - rámec přesahující konec je také poškozený.
+    """
+    while end - pos >= 8:
+        found = buf.find(AVL_PREAMBLE, pos, end)
+        if found == -1:
+            # Poslední 3 byty mohou být začátkem preambule
+            return max(pos, end - 3), -1
+        pos = found
+        if end - pos < 8:
+            break
+        data_length = _UINT32.unpack_from(buf, pos + 4)[0]
+        if data_length < 3 or data_length > MAX_AVL_DATA_LENGTH:
+            pos += 1
+            continue
+        stop = pos + 12 + data_length
+        if stop > end:
+            if not complete:
+                break
+            pos += 1
+            continue
+        if check_crc and calculate_crc16(buf[pos + 8:stop - 4]) != _UINT32.unpack_from(buf, stop - 4)[0]:
+            pos += 1
+            continue
+        return pos, stop
+    return pos, -1
+
+def _iter_chunks(source, chunk_size: int):
+    """Bloky dat ze socketu (recv), souboru (read) nebo iterátoru bloků"""
+    if hasattr(source, 'recv'):
+        read = source.recv
+    elif hasattr(source, 'read'):
+        read = source.read
+    else:
+        yield from source
+        return
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+def iter_avl_frames(source, chunk_size: int = STREAM_CHUNK_SIZE, check_crc: bool = True) -> Iterator[bytes]:
+    """
+    Postupně vrací kompletní rámce (bytes) z bufferu / mmap, souboru, socketu nebo iterátoru bloků
+    Paměť je omezená na jeden blok a rozpracovaný rámec, takže lze projít i několik GB archivu.
+    S check_crc se rámec s chybným CRC bere jako poškozená data a hledá se další preambule.
+    """
+    if hasattr(source, 'find'):
+        # Celá data jsou k dispozici - hledá se přímo v nich, bez kopie do okna
+        pos = 0
+        end = len(source)
+        while True:
+            start, stop = _next_frame(source, pos, end, check_crc, complete=True)
+            if stop < 0:
+                return
+            yield bytes(source[start:stop])
+            pos = stop
+
+    buf = bytearray()
+    pos = 0
+    chunks = _iter_chunks(source, chunk_size)
+    complete = False
+    while not complete:
+        chunk = next(chunks, None)
+        if chunk is None:
+            # Konec proudu - zbytek se projde ještě jednou, neúplný rámec může být šum před platnými rámci
+            complete = True
+        else:
+            if pos:
+                del buf[:pos]
+                pos = 0
+            buf += chunk
+        while True:
+            start, stop = _next_frame(buf, pos, len(buf), check_crc, complete)
+            if stop < 0:
+                pos = start
+                break
+            yield bytes(buf[start:stop])
+            pos = stop
+
+def iter_avl_packets(source, chunk_size: int = STREAM_CHUNK_SIZE,
+                     check_crc: bool = True) -> Iterator[Tuple[bytes, Optional[List[Any]], str]]:
+    """Jako iter_avl_frames, rámce se dekódují až při čtení: (rámec, záznamy nebo None, kodek)"""
+    for frame in iter_avl_frames(source, chunk_size, check_crc):
+        records, _, codec_type, _ = parse_avl_packet_with_length(frame)
+        yield frame, records, codec_type
+
+def iter_avl_records(source, chunk_size: int = STREAM_CHUNK_SIZE, check_crc: bool = True) -> Iterator[AVLRecord]:
+    """Jednotlivé AVL záznamy ze všech rámců proudu (zprávy příkazového kanálu se vynechají)"""
+    for frame, records, _ in iter_avl_packets(source, chunk_size, check_crc):
+        if records and not is_command_frame(frame):
+            yield from records
+
 def parse_avl_packet(data: bytes) -> Tuple[Optional[List[Dict[str, Any]]], int, str]:
     """
-    Parsuje celý AVL packet s robustním hledáním struktury
+    Parsuje první AVL packet v datech - před ním může být libovolný šum
+    Přednost má rámec s platným CRC, jinak první rámec, jehož délka odpovídá datům
     Returns: (records_list, record_count, codec_type)
     """
-    try:
-        if len(data) < 16:
-            return None, 0, "unknown"
-        
-        # Zkus najít správnou AVL strukturu na různých pozicích
-        for start_offset in [0, 4, 8, 16]:
-            if start_offset + 16 > len(data):
-                continue
-                
-            try:
-                # Zkus parsovat jako standardní AVL packet
-                preamble = struct.unpack('>I', data[start_offset:start_offset+4])[0]
-                data_length = struct.unpack('>I', data[start_offset+4:start_offset+8])[0]
-                codec_id = struct.unpack('>B', data[start_offset+8:start_offset+9])[0]
-                record_count = struct.unpack('>B', data[start_offset+9:start_offset+10])[0]
-                
-                # Validace
-                if (codec_id in [0x08, 0x8E] and 
-                    record_count > 0 and record_count < 100 and
-                    data_length > 0 and data_length < 100000):
-                    
-                    codec_type = "codec8" if codec_id == 0x08 else "codec8_extended"
-                    print(f"Found valid AVL structure at offset {start_offset}: codec={codec_id:02X}, count={record_count}")
-                    
-                    if record_count == 0:
-                        return [], 0, codec_type
-                    
-                    # Parse records starting after header
-                    records = []
-                    offset = start_offset + 10
-                    
-                    for i in range(record_count):
-                        if offset + 34 > len(data):
-                            break
-                            
-                        try:
-                            record, new_offset = parse_avl_record(data, offset, codec_id)
-                            if record:
-                                records.append(record)
-                                offset = new_offset
-                            else:
-                                break
-                        except Exception as e:
-                            print(f"Error parsing record {i} at offset {offset}: {e}")
-                            break
-                    
-                    return records, len(records), codec_type
-                    
-            except Exception as e:
-                continue
-        
-        # Pokud nenajdeme validní strukturu, vrátíme chybu
-        print(f"No valid AVL structure found in {len(data)} bytes")
+    start, stop = _next_frame(data, 0, len(data), True, complete=True)
+    if stop < 0:
+        start, stop = _next_frame(data, 0, len(data), False, complete=True)
+    if stop < 0:
         return None, 0, "unknown"
-        
-    except Exception as e:
-        print(f"Chyba při parsování AVL packet: {e}")
-        return None, 0, "error"
+    records, record_count, codec_type, _ = parse_avl_packet_with_length(data[start:stop])
+    return records, record_count, codec_type
 
 def format_record_for_log(record: Dict[str, Any], imei: str = "") -> str:
     """Zformátuje AVL record pro log soubor"""
@@ -514,6 +877,35 @@ def format_record_for_log(record: Dict[str, Any], imei: str = "") -> str:
     
     return log_entry
 
+def format_record_for_json(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Převede AVL record na slovník pro JSON API (čas jako epoch ms a ISO 8601 UTC)"""
+    timestamp_ms = record.timestamp_ms if isinstance(record, AVLRecord) else int(record['timestamp'].timestamp() * 1000)
+    result = {
+        'timestamp_ms': timestamp_ms,
+        'timestamp': datetime.fromtimestamp(timestamp_ms / 1000.0, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+        'priority': record['priority'],
+        'gps': record['gps'],
+    }
+    if 'io_event' in record:
+        result['io_event'] = record['io_event']
+    if 'generation_type' in record:
+        result['generation_type'] = record['generation_type']
+    if 'io_data' in record:
+        result['io_data'] = {str(io_id): value for io_id, value in record['io_data'].items()}
+    return result
+
+def format_packet_for_json(data: bytes) -> Dict[str, Any]:
+    """
+    Dekóduje AVL rámec pro JSON API - {'codec', 'records'} nebo i 'error' pro nečitelný rámec
+    Rámec příkazového kanálu má místo záznamů 'messages' (typ, text, čas / IMEI)
+    """
+    records, record_count, codec_type, _ = parse_avl_packet_with_length(data)
+    if records is None:
+        return {'codec': codec_type, 'records': [], 'error': 'Invalid AVL packet'}
+    if records and isinstance(records[0], GPRSMessage):
+        return {'codec': codec_type, 'records': [], 'messages': [message._asdict() for message in records]}
+    return {'codec': codec_type, 'records': [format_record_for_json(record) for record in records]}
+
 def get_io_description(io_id: int) -> str:
     """Vrátí popis I/O elementu podle ID"""
     descriptions = {
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Test asyncio TCP serveru - handshake, ACK rámce a limit současných spojení"""
+
+import asyncio
+import os
+import socket
+import struct
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tcp_server
+from test_fragmentation import fragment1_hex, fragment2_hex
+from test_support import isolated_server, recv_exact
+
+IMEI = '352093081452251'
+
+def start_async_server():
+    """Spustí handle_client_async na náhodném portu ve vlastním event loopu - vrací (loop, server, port)"""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    holder = {}
+
+    async def serve():
+        server = await asyncio.start_server(lambda reader, writer: tcp_server.handle_client_async(reader, writer, None),
+                                            '127.0.0.1', 0)
+        holder['server'] = server
+        started.set()
+
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(serve(), loop)
+    assert started.wait(5), "Asyncio server did not start"
+    server = holder['server']
+    return loop, server, server.sockets[0].getsockname()[1]
+
+def test_async_server():
+    print("=== TEST ASYNCIO SERVER ===")
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    # Limit jednoho spojení
+    with isolated_server(connection_limit=1):
+        loop, server, port = start_async_server()
+        clients = []
+        try:
+            client = socket.create_connection(('127.0.0.1', port), timeout=5)
+            clients.append(client)
+            client.sendall(struct.pack('>H', len(IMEI)) + IMEI.encode('ascii'))
+            assert recv_exact(client, 1) == b'\x01'
+            client.sendall(frame)
+            assert struct.unpack('>I', recv_exact(client, 4))[0] == frame[9] == 11
+
+            # Druhé spojení nad limit server hned zavře
+            rejected = socket.create_connection(('127.0.0.1', port), timeout=5)
+            clients.append(rejected)
+            assert rejected.recv(1) == b''
+
+            # První spojení funguje dál, po jeho ukončení se slot uvolní
+            client.sendall(frame)
+            assert struct.unpack('>I', recv_exact(client, 4))[0] == 11
+            client.close()
+            for _ in range(50):
+                if tcp_server.active_connections == 0:
+                    break
+                threading.Event().wait(0.05)
+            assert tcp_server.active_connections == 0
+
+            again = socket.create_connection(('127.0.0.1', port), timeout=5)
+            clients.append(again)
+            again.sendall(struct.pack('>H', len(IMEI)) + IMEI.encode('ascii'))
+            assert recv_exact(again, 1) == b'\x01'
+            again.close()
+
+            server.close()
+            asyncio.run_coroutine_threadsafe(server.wait_closed(), loop).result(5)
+        finally:
+            for sock in clients:
+                sock.close()
+            loop.call_soon_threadsafe(loop.stop)
+
+        tcp_server.ingest_pipeline.close()
+        assert len(tcp_server.get_csv_logger().read_last_records(IMEI, 100)) == 2
+        print("✅ Asyncio server test passed")
+
+if __name__ == "__main__":
+    test_async_server()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Test a benchmark dekodéru AVL záznamů na vzorových paketech z test/simple_packets.json"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from buffer_manager import StreamBuffer
+from teltonika_protocol import parse_avl_packet_with_length, format_record_for_log
+from test_fragmentation import fragment1_hex, fragment2_hex
+
+SAMPLES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test', 'simple_packets.json')
+
+def load_sample_frames():
+    """Složí TCP segmenty ze simple_packets.json do kompletních AVL rámců"""
+    with open(SAMPLES_FILE, 'r') as f:
+        packets = json.load(f)
+
+    stream_buffer = StreamBuffer()
+    frames = []
+    for packet in packets:
+        data = bytes.fromhex(packet['data'])
+        if len(data) == 2 + int.from_bytes(data[:2], 'big'):
+            continue  # IMEI handshake
+        stream_buffer.feed(data)
+        frames.extend(bytes(frame) for frame in stream_buffer.pop_frames())
+
+    frames.append(bytes.fromhex(fragment1_hex + fragment2_hex))
+    return frames
+
+def test_avl_decoder():
+    print("=== TEST AVL DEKODÉRU ===")
+    frames = load_sample_frames()
+    print(f"Vzorových rámců: {len(frames)}")
+    assert len(frames) >= 2
+
+    for frame in frames:
+        records, record_count, codec_type, packet_length = parse_avl_packet_with_length(frame)
+        print(f"  {codec_type}: {record_count} záznamů, {packet_length} bytes")
+        assert record_count == frame[9]
+        assert packet_length == len(frame)
+
+        # Stejný výsledek pro memoryview (rámce ze StreamBuffer)
+        view_records = parse_avl_packet_with_length(memoryview(frame))[0]
+        assert view_records == records
+
+    record = parse_avl_packet_with_length(frames[-1])[0][0]
+    print(f"První záznam: {record['gps']['latitude']:.6f}, {record['gps']['longitude']:.6f}, IO: {len(record['io_data'])}")
+    assert round(record['gps']['latitude'], 6) == 50.09217
+    assert round(record['gps']['longitude'], 6) == 14.51296
+    assert record['io_count'] == len(record['io_data']) == 20
+
+    # Kompaktní záznam - celočíselné souřadnice, čas v ms, slovník až na požádání
+    assert not hasattr(record, '__dict__')
+    assert record.latitude_e7 == 500921700
+    assert record.timestamp_ms % 1000 == record['timestamp'].microsecond // 1000
+    as_dict = record.to_dict()
+    assert set(as_dict) == set(record.keys())
+    assert as_dict['io_data'] == record['io_data']
+    assert format_record_for_log(record) == format_record_for_log(as_dict)
+    print("✅ Dekodér OK")
+
+def benchmark_avl_decoder(seconds=2.0):
+    """Vypíše počet dekódovaných záznamů za sekundu"""
+    frames = load_sample_frames()
+    record_total = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for frame in frames:
+            record_total += parse_avl_packet_with_length(frame)[1]
+    elapsed = time.perf_counter() - start
+    print(f"=== BENCHMARK: {record_total / elapsed:.0f} records/s ===")
+
+if __name__ == "__main__":
+    test_avl_decoder()
+    benchmark_avl_decoder()
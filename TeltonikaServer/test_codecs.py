@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Test tabulky kodeků - Codec16 a příkazový kanál Codec12/13/14"""
+
+import os
+import struct
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import teltonika_protocol
+from teltonika_protocol import (Codec, GPRSMessage, GPRS_COMMAND, GPRS_RESPONSE, build_command_frame,
+                                calculate_crc16, format_packet_for_json, is_command_frame,
+                                parse_avl_packet_with_length, parse_avl_record_codec16, register_codec,
+                                validate_avl_packet_crc)
+
+# Příklady rámců z dokumentace Teltonika
+CODEC16_HEX = ('000000000000005F10020000016BDBC7833000000000000000000000000000000000000B05040200010000030002000B00270042563A'
+               '00000000016BDBC7871800000000000000000000000000000000000B05040200010000030002000B00260042563A00000200005FB3')
+CODEC12_GETINFO_HEX = '000000000000000F0C010500000007676574696E666F0100004312'
+CODEC14_GETVER_HEX = '00000000000000160E01050000000E0352093081452251676574766572010000D2C1'
+IMEI = '352093081452251'
+
+def make_command_frame(codec_id, message_type, payload):
+    """Sestaví rámec příkazového kanálu se správným CRC"""
+    body = struct.pack('>BBBI', codec_id, 1, message_type, len(payload)) + payload + b'\x01'
+    return b'\x00\x00\x00\x00' + struct.pack('>I', len(body)) + body + struct.pack('>I', calculate_crc16(body))
+
+def test_codec16():
+    print("=== TEST CODEC16 ===")
+    frame = bytes.fromhex(CODEC16_HEX)
+    records, count, codec_type, length = parse_avl_packet_with_length(memoryview(frame))
+    assert (count, codec_type, length) == (2, 'codec16', len(frame))
+    first = records[0]
+    assert first.timestamp_ms == 0x16BDBC78330
+    assert (first.io_event, first.generation_type, first.io_count) == (11, 5, 4)
+    assert first['io_data'] == {1: 0, 3: 0, 11: 0x27, 66: 0x563A}
+    assert records[1]['io_data'][11] == 0x26
+    assert 'generation_type' in first.keys()
+    assert format_packet_for_json(frame)['records'][0]['generation_type'] == 5
+
+    # Neúplný I/O blok - pomalá cesta přeskočí useknuté elementy
+    truncated = frame[:10 + 24 + 4 + 1 + 3 + 2]
+    record, offset = parse_avl_record_codec16(truncated, 10)
+    assert record.io_data == {1: 0} and offset <= len(truncated)
+
+    # Codec8 a Codec16 se stejnými počty mají různá rozložení I/O
+    codec8_layout = teltonika_protocol._get_io_layout(1, (2, 2, 0, 0), teltonika_protocol._CODEC8_IO_ELEMENTS)
+    assert codec8_layout is not first._io_layout
+    print("✅ Codec16 test passed")
+
+def test_command_codecs():
+    print("=== TEST CODEC12/13/14 ===")
+    getinfo = build_command_frame('getinfo')
+    assert getinfo.hex().upper() == CODEC12_GETINFO_HEX
+    getver = build_command_frame('getver', IMEI)
+    assert getver.hex().upper() == CODEC14_GETVER_HEX
+    assert is_command_frame(getinfo) and not is_command_frame(bytes.fromhex(CODEC16_HEX))
+
+    records, count, codec_type, _ = parse_avl_packet_with_length(getinfo)
+    assert (records, count, codec_type) == ([GPRSMessage(GPRS_COMMAND, 'getinfo')], 1, 'codec12')
+    records, _, codec_type, _ = parse_avl_packet_with_length(getver)
+    assert codec_type == 'codec14' and records == [GPRSMessage(GPRS_COMMAND, 'getver', None, IMEI)]
+
+    response = make_command_frame(0x0C, GPRS_RESPONSE, b'RTC:2019/7/22 7:53 Init:2019/7/22 7:22')
+    assert validate_avl_packet_crc(response) and response[9] == response[-5]
+    decoded = format_packet_for_json(response)
+    assert decoded['codec'] == 'codec12' and decoded['records'] == []
+    assert decoded['messages'] == [{'message_type': GPRS_RESPONSE, 'text': 'RTC:2019/7/22 7:53 Init:2019/7/22 7:22',
+                                    'timestamp_ms': None, 'imei': None}]
+
+    codec13 = make_command_frame(0x0D, GPRS_RESPONSE, struct.pack('>I', 1563780000) + b'Ver:03.25.14')
+    records, _, codec_type, _ = parse_avl_packet_with_length(codec13)
+    assert codec_type == 'codec13' and records == [GPRSMessage(GPRS_RESPONSE, 'Ver:03.25.14', 1563780000000)]
+
+    # Nesouhlasná délka obsahu
+    broken = bytearray(getinfo)
+    broken[14] += 1
+    assert parse_avl_packet_with_length(bytes(broken))[0] is None
+    print("✅ Codec12/13/14 test passed")
+
+def test_codec_registry():
+    print("=== TEST CODEC REGISTRY ===")
+    frame = make_command_frame(0x7F, GPRS_COMMAND, b'xxxx')
+    assert parse_avl_packet_with_length(frame)[2] == 'unknown_127'
+
+    calls = []
+    register_codec(Codec(0x7F, 'custom', lambda data, count, length: calls.append(length) or ['ok']))
+    try:
+        assert parse_avl_packet_with_length(frame)[:3] == (['ok'], 1, 'custom') and calls == [12]
+    finally:
+        del teltonika_protocol._CODECS[0x7F]
+    print("✅ Codec registry test passed")
+
+if __name__ == "__main__":
+    test_codec16()
+    test_command_codecs()
+    test_codec_registry()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Test fronty příkazů - odeslání Codec12 za ACK a přiřazení odpovědi zařízení"""
+
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tcp_server
+from command_queue import CommandQueue, MAX_COMMAND_LENGTH, ANSWERED, FAILED, QUEUED, REJECTED, SENT, TIMEOUT
+from teltonika_protocol import GPRS_NACK, GPRS_RESPONSE, build_command_frame, calculate_crc16
+from test_fragmentation import fragment1_hex, fragment2_hex
+from test_support import isolated_server, recv_exact
+from test_web_server import free_port
+from web_server import MAX_COMMAND_BODY, start_web_server
+
+IMEI = '352093081452251'
+
+def make_response_frame(message_type, payload, codec_id=0x0C):
+    """Odpověď zařízení na příkaz (výchozí Codec12)"""
+    body = struct.pack('>BBBI', codec_id, 1, message_type, len(payload)) + payload + b'\x01'
+    return b'\x00\x00\x00\x00' + struct.pack('>I', len(body)) + body + struct.pack('>I', calculate_crc16(body))
+
+def test_queue_states():
+    print("=== TEST COMMAND QUEUE STATES ===")
+    changes = []
+    commands = CommandQueue(response_timeout=0.05, max_pending=2)
+    commands.on_change = changes.append
+
+    first = commands.enqueue(IMEI, ' getinfo ')
+    second = commands.enqueue(IMEI, 'getver')
+    for invalid in ('', 'x' * 600, 'get\x00info', 'příkaz'):
+        try:
+            commands.enqueue('123', invalid)
+            assert False, f"Invalid command accepted: {invalid!r}"
+        except ValueError:
+            pass
+    try:
+        commands.enqueue(IMEI, 'getstatus')
+        assert False, "Queue limit not enforced"
+    except ValueError:
+        pass
+    assert first.command == 'getinfo' and first.status == QUEUED
+
+    # Nejvýše jeden odeslaný příkaz na zařízení
+    assert commands.next_command(IMEI) is first and first.status == SENT
+    assert commands.next_command(IMEI) is None
+    assert commands.complete(IMEI, 'RTC:2019/7/22') is first and first.status == ANSWERED
+    assert commands.complete(IMEI, 'late') is None
+
+    # Bez odpovědi se po timeoutu pokračuje dalším příkazem
+    assert commands.next_command(IMEI) is second
+    time.sleep(0.06)
+    assert commands.next_command(IMEI) is None and second.status == TIMEOUT
+    assert not commands.has_pending(IMEI)
+
+    third = commands.enqueue(IMEI, 'getstatus')
+    commands.next_command(IMEI)
+    commands.disconnect(IMEI)
+    assert third.status == FAILED
+    assert [c['id'] for c in commands.list_commands(IMEI)] == [third.command_id, second.command_id, first.command_id]
+    assert commands.get(first.command_id)['response'] == 'RTC:2019/7/22'
+    assert commands.stats() == {'pending': 0, 'in_flight': 0}
+    assert [change['status'] for change in changes if change['id'] == first.command_id] == [QUEUED, SENT, ANSWERED]
+    print("✅ Command queue states test passed")
+
+def test_command_over_connection():
+    print("=== TEST COMMAND OVER CONNECTION ===")
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    with isolated_server():
+        commands = tcp_server.get_csv_logger().commands
+        client, server = socket.socketpair()
+        try:
+            handler = threading.Thread(target=tcp_server.handle_client, args=(server, ('test', 1), None))
+            handler.start()
+            client.settimeout(5)
+            client.sendall(struct.pack('>H', len(IMEI)) + IMEI.encode('ascii'))
+            assert recv_exact(client, 1) == b'\x01'
+
+            # Bez příkazu jen ACK
+            client.sendall(frame)
+            assert struct.unpack('>I', recv_exact(client, 4))[0] == frame[9]
+
+            getinfo = commands.enqueue(IMEI, 'getinfo')
+            getver = commands.enqueue(IMEI, 'getver')
+            client.sendall(frame)
+            assert struct.unpack('>I', recv_exact(client, 4))[0] == frame[9]
+            expected = build_command_frame('getinfo')
+            assert recv_exact(client, len(expected)) == expected
+            assert getinfo.status == SENT
+
+            # Odpověď se nepotvrzuje, další příkaz odejde hned za ní
+            client.sendall(make_response_frame(GPRS_RESPONSE, b'RTC:2019/7/22 7:53'))
+            expected = build_command_frame('getver')
+            assert recv_exact(client, len(expected)) == expected
+            assert getinfo.status == ANSWERED and getinfo.response == 'RTC:2019/7/22 7:53'
+
+            # nACK (Codec14 s IMEI zařízení) příkaz odmítne
+            client.sendall(make_response_frame(GPRS_NACK, bytes.fromhex('0' + IMEI), 0x0E))
+            client.sendall(frame)
+            assert struct.unpack('>I', recv_exact(client, 4))[0] == frame[9]
+            assert getver.status == REJECTED
+        finally:
+            client.close()
+        handler.join(5)
+
+        tcp_server.ingest_pipeline.close()
+        csv_logger = tcp_server.get_csv_logger()
+        assert len(csv_logger.read_last_records(IMEI, 100)) == 5
+        assert csv_logger.get_stats()['commands'] == {'pending': 0, 'in_flight': 0}
+        print("✅ Command over connection test passed")
+
+def post_command(port, payload):
+    """POST /api/commands - vrací (status, JSON odpověď)"""
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+    request = urllib.request.Request(f'http://127.0.0.1:{port}/api/commands', data=body, method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_commands_api():
+    print("=== TEST COMMANDS API ===")
+    with isolated_server() as base_dir:
+        csv_logger = tcp_server.get_csv_logger()
+        csv_logger.create_device_info(IMEI)
+        disabled, enabled = free_port(), free_port()
+        threading.Thread(target=start_web_server, args=('127.0.0.1', disabled, base_dir, 2, 0.0),
+                         daemon=True).start()
+        threading.Thread(target=start_web_server, args=('127.0.0.1', enabled, base_dir, 2, 0.0),
+                         kwargs={'allow_commands': True}, daemon=True).start()
+        time.sleep(0.3)
+
+        # Bez volby allow_commands se příkaz nezařadí
+        status, body = post_command(disabled, {'imei': IMEI, 'command': 'getinfo'})
+        assert status == 403 and 'allow_commands' in body['error']
+
+        # Neznámé IMEI, dlouhý příkaz a velké tělo požadavku se odmítnou
+        assert post_command(enabled, {'imei': '123456789012345', 'command': 'getinfo'})[0] == 400
+        assert post_command(enabled, {'imei': IMEI, 'command': 'x' * (MAX_COMMAND_LENGTH + 1)})[0] == 400
+        assert post_command(enabled, b'{"imei": "' + b'1' * MAX_COMMAND_BODY + b'"}')[0] == 400
+        assert not csv_logger.commands.has_pending(IMEI)
+
+        status, body = post_command(enabled, {'imei': IMEI, 'command': 'getinfo'})
+        assert status == 202 and body['status'] == QUEUED
+        assert csv_logger.commands.has_pending(IMEI)
+        print("✅ Commands API test passed")
+
+if __name__ == "__main__":
+    test_queue_states()
+    test_command_over_connection()
+    test_commands_api()
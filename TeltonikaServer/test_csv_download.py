@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Test streamovaného stahování CSV - Range, podmíněné požadavky a gzip"""
+
+import gzip
+import http.client
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import csv_logger as csv_logger_module
+import segments
+from csv_logger import CSVLogger, get_shared_logger
+from segments import RotationPolicy, compress_segment, list_segments
+from web_server import start_web_server
+from test_fragmentation import fragment1_hex, fragment2_hex
+from test_web_server import free_port
+
+IMEI = '352093081452251'
+
+def request(port, headers=None, query=''):
+    """Vrátí (status, hlavičky, tělo) - i pro 304/416"""
+    req = urllib.request.Request(f'http://127.0.0.1:{port}/api/download_csv?imei={IMEI}{query}',
+                                 headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+def test_csv_export():
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST CSV EXPORT ===")
+        # Starší data v data.csv, novější v data.bin
+        csv_logger = CSVLogger(base_dir, raw_storage='csv')
+        for i in range(3):
+            csv_logger.log_raw_frame(IMEI, frame[:50 + i])
+        csv_logger.raw_storage = 'binary'
+        for i in range(20):
+            csv_logger.log_raw_frame(IMEI, frame[:200 + 37 * i])
+
+        # Malé bloky - rozsahy přes hranice bloků, data.csv i data.bin
+        csv_logger_module.EXPORT_CHUNK_SIZE = 1000
+        export = csv_logger.open_csv_export(IMEI)
+        content = b''.join(export.iter_bytes())
+        assert len(content) == export.size
+        assert content.count(b'\r\n') == 1 + 3 + 20
+        assert content.endswith(frame[:200 + 37 * 19].hex().upper().encode() + b'\r\n')
+        for start, end in [(0, 10), (5, export.size), (export.size - 1, export.size),
+                           (300, 4000), (2500, 2501), (export.size // 2, export.size - 7)]:
+            assert b''.join(export.iter_bytes(start, end)) == content[start:end], (start, end)
+
+        # Data zapsaná po otevření exportu do něj nepatří
+        csv_logger.log_raw_frame(IMEI, frame)
+        assert b''.join(export.iter_bytes()) == content
+        with csv_logger.open_csv_export(IMEI) as newer:
+            assert newer.etag != export.etag
+        export.close()
+
+        # Jen binární úložiště - hlavička CSV se doplní
+        other = CSVLogger(os.path.join(base_dir, 'other'))
+        other.log_raw_frame(IMEI, frame)
+        assert other.export_csv(IMEI).startswith('timestamp,raw_data\r\n')
+        assert other.export_csv('000000000000000') is None
+        print("✅ CSV export OK")
+    finally:
+        csv_logger_module.EXPORT_CHUNK_SIZE = 64 * 1024
+        shutil.rmtree(base_dir)
+
+def test_export_during_rotation():
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST CSV EXPORT DURING ROTATION ===")
+        # Nekomprimované segmenty - komprese proběhne až během stahování
+        csv_logger = CSVLogger(base_dir, raw_storage='csv')
+        csv_logger.set_rotation(RotationPolicy(max_bytes=5000, daily=False, compress=False))
+        for _ in range(5):
+            csv_logger.log_raw_frame(IMEI, frame)
+        csv_logger.raw_storage = 'binary'
+        for _ in range(5):
+            csv_logger.log_raw_frame(IMEI, frame)
+        device_dir = os.path.join(csv_logger.devices_dir, IMEI)
+        closed = list_segments(os.path.join(device_dir, 'data.csv')) + list_segments(os.path.join(device_dir, 'data.bin'))
+        assert len(closed) >= 2
+
+        csv_logger_module.EXPORT_CHUNK_SIZE = 1000
+        with csv_logger.open_csv_export(IMEI) as export:
+            content = b''.join(export.iter_bytes())
+            assert content.count(b'\r\n') == 1 + 10
+            chunks = export.iter_bytes()
+            first = next(chunks)
+
+            # Segmenty se zkomprimují (původní soubor zmizí) a aktivní soubory se uzavřou
+            for segment in closed:
+                compress_segment(segment)
+            csv_logger.set_rotation(RotationPolicy(max_bytes=1, daily=False))
+            csv_logger.log_raw_frame(IMEI, frame)
+            csv_logger.raw_storage = 'csv'
+            csv_logger.log_raw_frame(IMEI, frame)
+            segments.wait_for_compression()
+            assert not any(os.path.exists(segment) for segment in closed)
+
+            assert first + b''.join(chunks) == content
+            assert b''.join(export.iter_bytes(100, export.size - 100)) == content[100:-100]
+
+            # Segment, který zmizel mezi výpisem a otevřením, se čte z .gz
+            f, size, _ = export._open(closed[0])
+            assert f is not None and size == segments.data_size(closed[0] + '.gz')
+        print("✅ CSV export during rotation OK")
+    finally:
+        csv_logger_module.EXPORT_CHUNK_SIZE = 64 * 1024
+        shutil.rmtree(base_dir)
+
+def test_csv_download():
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST CSV DOWNLOAD ===")
+        csv_logger = get_shared_logger(base_dir)
+        for _ in range(50):
+            csv_logger.log_raw_frame(IMEI, frame)
+        expected = csv_logger.export_csv(IMEI).encode('utf-8')
+
+        port = free_port()
+        threading.Thread(target=start_web_server, args=('127.0.0.1', port, base_dir, 4, 60.0), daemon=True).start()
+        time.sleep(0.3)
+
+        status, headers, body = request(port)
+        assert status == 200 and body == expected
+        assert int(headers['Content-Length']) == len(expected)
+        assert headers['Accept-Ranges'] == 'bytes'
+        etag = headers['ETag']
+        print(f"Staženo {len(body)} bytes, ETag {etag}")
+
+        # Navázání přerušeného stahování
+        status, headers, body = request(port, {'Range': 'bytes=1000-'})
+        assert status == 206 and body == expected[1000:]
+        assert headers['Content-Range'] == f'bytes 1000-{len(expected) - 1}/{len(expected)}'
+        status, _, body = request(port, {'Range': 'bytes=-100'})
+        assert status == 206 and body == expected[-100:]
+        status, _, body = request(port, {'Range': 'bytes=10-19', 'If-Range': etag})
+        assert status == 206 and body == expected[10:20]
+        status, _, body = request(port, {'Range': 'bytes=10-19', 'If-Range': '"stale"'})
+        assert status == 200 and body == expected
+        status, headers, _ = request(port, {'Range': f'bytes={len(expected)}-'})
+        assert status == 416 and headers['Content-Range'] == f'bytes */{len(expected)}'
+
+        # Podmíněné požadavky
+        assert request(port, {'If-None-Match': etag})[0] == 304
+        status, headers, _ = request(port)
+        assert request(port, {'If-Modified-Since': headers['Last-Modified']})[0] == 304
+
+        # Gzip jen na vyžádání
+        status, headers, body = request(port, {'Accept-Encoding': 'gzip'}, '&gzip=1')
+        assert status == 200 and headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(body) == expected
+        print(f"Gzip: {len(body)} bytes")
+        assert request(port, {'Accept-Encoding': 'gzip'})[1]['Content-Encoding'] is None
+
+        # Nový záznam změní ETag
+        csv_logger.log_raw_frame(IMEI, frame)
+        assert request(port, {'If-None-Match': etag})[0] == 200
+
+        # Chyba po odeslání hlavičky - spojení se přeruší, do těla se nepřipíše chybová odpověď
+        open_csv_export = csv_logger.open_csv_export
+        def failing_export(imei):
+            export = open_csv_export(imei)
+            def iter_bytes(start=0, end=None):
+                yield b'timestamp'
+                raise OSError("disk error")
+            export.iter_bytes = iter_bytes
+            return export
+        csv_logger.open_csv_export = failing_export
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', f'/api/download_csv?imei={IMEI}')
+            response = connection.getresponse()
+            assert response.status == 200
+            try:
+                body = response.read()
+                assert False, f"Truncated body not detected ({len(body)} bytes)"
+            except http.client.IncompleteRead as e:
+                assert e.partial == b'timestamp'
+            connection.close()
+        finally:
+            csv_logger.open_csv_export = open_csv_export
+        print("✅ CSV download OK")
+    finally:
+        shutil.rmtree(base_dir)
+
+if __name__ == "__main__":
+    test_csv_export()
+    test_export_during_rotation()
+    test_csv_download()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Test dekódovaného režimu /api/device_data a cache dekódovaných rámců"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import teltonika_protocol
+from csv_logger import CSVLogger, get_shared_logger
+from web_server import start_web_server
+from test_fragmentation import fragment1_hex, fragment2_hex
+from test_web_server import free_port, fetch
+
+IMEI = '352093081452251'
+
+def test_decoded_records():
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    base_dir = tempfile.mkdtemp()
+    parse = teltonika_protocol.parse_avl_packet_with_length
+    calls = []
+    teltonika_protocol.parse_avl_packet_with_length = lambda data: calls.append(1) or parse(data)
+    try:
+        print("=== TEST DECODED RECORDS ===")
+        csv_logger = CSVLogger(base_dir, raw_storage='csv')
+        csv_logger.log_raw_frame(IMEI, frame)
+        csv_logger.log_raw_record(IMEI, 'ZZ')  # Poškozený řádek
+        csv_logger.raw_storage = 'binary'
+        for _ in range(3):
+            csv_logger.log_raw_frame(IMEI, frame)
+
+        frames = csv_logger.read_last_records(IMEI, 10, decoded=True)
+        assert len(frames) == 5 and len(calls) == 5
+        assert frames[1]['records'] == [] and 'error' in frames[1]
+        decoded = frames[-1]
+        assert decoded['codec'] == 'codec8_extended' and len(decoded['records']) == 11
+        record = decoded['records'][0]
+        assert record['gps']['latitude'] == 50.09217 and record['timestamp_ms'] == 1755498234010
+        assert record['timestamp'] == '2025-08-18T06:23:54.010Z'
+        assert len(record['io_data']) == 20
+        json.dumps(frames)
+
+        # Opakovaný dotaz i časové okno nad stejnými rámci jdou z cache
+        assert csv_logger.read_last_records(IMEI, 10, decoded=True) == frames
+        assert csv_logger.query_records(IMEI, limit=10, decoded=True)[0] == frames
+        assert len(calls) == 5
+        print(f"Dekódováno {len(calls)} rámců pro 3 dotazy")
+        print("✅ Decoded records OK")
+    finally:
+        teltonika_protocol.parse_avl_packet_with_length = parse
+        shutil.rmtree(base_dir)
+
+def test_decoded_api():
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST DECODED API ===")
+        csv_logger = get_shared_logger(base_dir)
+        csv_logger.log_raw_frame(IMEI, frame)
+        port = free_port()
+        threading.Thread(target=start_web_server, args=('127.0.0.1', port, base_dir, 2, 60.0), daemon=True).start()
+        time.sleep(0.3)
+
+        frames = json.loads(fetch(port, f'api/device_data?imei={IMEI}&decoded=1'))
+        assert frames[0]['records'][0]['gps']['longitude'] == 14.5129599
+        page = json.loads(fetch(port, f'api/device_data?imei={IMEI}&from=0&decoded=1'))
+        assert page['records'] == frames and page['next_cursor'] is None
+        # Bez decoded zůstávají hex řádky
+        assert json.loads(fetch(port, f'api/device_data?imei={IMEI}'))[0]['raw_data'] == frame.hex().upper()
+        print("✅ Decoded API OK")
+    finally:
+        shutil.rmtree(base_dir)
+
+if __name__ == "__main__":
+    test_decoded_records()
+    test_decoded_api()
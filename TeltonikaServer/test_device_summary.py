@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Test souhrnu zařízení pro /api/devices (DeviceSummaryCache)"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from csv_logger import CSVLogger
+from test_fragmentation import fragment1_hex, fragment2_hex
+
+IMEI = '352093081452251'
+
+def make_logger(base_dir, scans):
+    """CSVLogger, který zaznamenává volání scanneru (imei, soubor, start_offset)"""
+    logger = CSVLogger(base_dir)
+    scanner = logger.summary.scanner
+    def recording_scanner(imei, file_name, start_offset):
+        scans.append((imei, file_name, start_offset))
+        return scanner(imei, file_name, start_offset)
+    logger.summary.scanner = recording_scanner
+    return logger
+
+def test_device_summary():
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST DEVICE SUMMARY ===")
+        scans = []
+        logger = make_logger(base_dir, scans)
+
+        # Starší data v data.csv + nová v data.bin
+        logger.raw_storage = 'csv'
+        for _ in range(3):
+            logger.log_raw_frame(IMEI, frame)
+        logger.raw_storage = 'binary'
+        logger.log_raw_frame(IMEI, frame)
+
+        devices = logger.get_all_devices()
+        assert len(devices) == 1 and devices[0]['record_count'] == 4
+        assert devices[0]['last_seen'] != "Unknown"
+        device_dir = os.path.join(base_dir, 'devices', IMEI)
+        assert devices[0]['byte_size'] == sum(os.path.getsize(os.path.join(device_dir, name))
+                                              for name in ('data.csv', 'data.bin'))
+
+        # Další zápisy se započítají bez čtení souborů
+        scans.clear()
+        for _ in range(5):
+            logger.log_raw_frame(IMEI, frame)
+        logger.raw_storage = 'csv'
+        logger.log_raw_frame(IMEI, frame)
+        assert logger.get_all_devices()[0]['record_count'] == 10
+        assert scans == []
+        logger.summary.save()
+
+        # Nová instance (restart) - soubor narostl mimo cache, dopočítá se jen konec
+        bin_size = os.path.getsize(os.path.join(device_dir, 'data.bin'))
+        CSVLogger(base_dir).record_store.append(IMEI, frame)
+        scans.clear()
+        restarted = make_logger(base_dir, scans)
+        assert restarted.get_all_devices()[0]['record_count'] == 11
+        assert scans == [(IMEI, 'data.bin', bin_size)]
+
+        # Zkrácený soubor se spočítá celý znovu
+        with open(os.path.join(device_dir, 'data.csv'), 'r+b') as f:
+            f.truncate(os.path.getsize(os.path.join(device_dir, 'data.csv')) // 2)
+        scans.clear()
+        counted = restarted.get_all_devices()[0]['record_count']
+        assert scans == [(IMEI, 'data.csv', 0)]
+        assert counted == 7 + 1  # 7 rámců v data.bin + jeden celý řádek v data.csv
+        print(f"Souhrn: {restarted.get_all_devices()}")
+        print("✅ Device summary OK")
+    finally:
+        shutil.rmtree(base_dir)
+
+if __name__ == "__main__":
+    test_device_summary()
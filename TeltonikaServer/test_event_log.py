@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Test bufferovaného zápisu server logu"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from csv_logger import CSVLogger
+from event_log import BufferedEventLog
+
+THREADS = 8
+LINES = 500
+
+def test_event_log_ordering():
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST EVENT LOG ORDERING ===")
+        path = os.path.join(base_dir, 'server.log')
+        # Pořadí zařazení je vidět v čísle řádku (sestavuje ho format_line pod zámkem)
+        counter = iter(range(THREADS * LINES))
+        written = []
+        event_log = BufferedEventLog(path, format_line=lambda message: f"{next(counter)} {message}",
+                                     on_write=written.append, batch_lines=64, flush_interval=0.05)
+
+        def worker(thread_id):
+            for i in range(LINES):
+                event_log.write(f"thread {thread_id} line {i}")
+
+        threads = [threading.Thread(target=worker, args=(thread_id,)) for thread_id in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert event_log.flush(timeout=5)
+
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        assert [int(line.split(' ', 1)[0]) for line in lines] == list(range(THREADS * LINES))
+        # Řádky každého threadu jsou v pořadí volání
+        for thread_id in range(THREADS):
+            own = [int(line.rsplit(' ', 1)[1]) for line in lines if f"thread {thread_id} " in line]
+            assert own == list(range(LINES))
+
+        stats = event_log.stats()
+        print(f"Stats: {stats}")
+        assert stats['lines_written'] == THREADS * LINES and stats['pending_lines'] == 0
+        assert THREADS * LINES // 64 <= stats['batches'] < THREADS * LINES
+        assert sum(len(batch) for batch in written) == THREADS * LINES
+        assert 0 < stats['avg_flush_latency_ms'] <= stats['max_flush_latency_ms']
+        print("✅ Event log ordering test passed")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+def test_event_log_flush_interval_and_close():
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST EVENT LOG FLUSH INTERVAL ===")
+        path = os.path.join(base_dir, 'server.log')
+        event_log = BufferedEventLog(path, batch_lines=1000, flush_interval=0.1)
+        event_log.write("first")
+        # Neúplná dávka se zapíše po flush_interval i bez flush()
+        deadline = time.time() + 5
+        while not os.path.exists(path) and time.time() < deadline:
+            time.sleep(0.01)
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == "first\n"
+
+        # Ukončení zapíše zbytek fronty, další řádky se zapisují přímo
+        event_log.write("second")
+        event_log.close()
+        event_log.write("third")
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == "first\nsecond\nthird\n"
+        print("✅ Event log flush interval test passed")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+def test_write_after_close_with_reader():
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST WRITE AFTER CLOSE WITH READER ===")
+        path = os.path.join(base_dir, 'server.log')
+        event_log = BufferedEventLog(path, batch_lines=1000, flush_interval=10)
+        event_log.write("queued")
+        # Řádek čeká ve frontě - čtenář ho dostane bez čekání na flush
+        content, pending = event_log.read_with_pending(lambda: os.path.exists(path))
+        assert (content, pending) == (False, ["queued"])
+        event_log.close()
+
+        # Přímé zápisy po ukončení souběžně se čtením - bez deadlocku, nic nechybí ani není dvakrát
+        stop = threading.Event()
+        snapshots = []
+        def reader():
+            while not stop.is_set():
+                def read():
+                    with open(path, encoding='utf-8') as f:
+                        return f.read().splitlines()
+                lines, pending = event_log.read_with_pending(read)
+                snapshots.append(lines + pending)
+        reader_thread = threading.Thread(target=reader)
+        reader_thread.start()
+        writers = [threading.Thread(target=lambda thread_id=thread_id: [event_log.write(f"late {thread_id} {i}")
+                                                                       for i in range(100)])
+                   for thread_id in range(4)]
+        for thread in writers:
+            thread.start()
+        for thread in writers:
+            thread.join(5)
+            assert not thread.is_alive(), "Write after close deadlocked"
+        stop.set()
+        reader_thread.join(5)
+        assert not reader_thread.is_alive()
+
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        assert lines[0] == "queued" and len(lines) == 401
+        assert all(len(snapshot) == len(set(snapshot)) for snapshot in snapshots)
+        assert event_log.read_with_pending(lambda: None)[1] == []
+        print("✅ Write after close with reader test passed")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+def test_csv_logger_server_log():
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST CSV LOGGER SERVER LOG ===")
+        csv_logger = CSVLogger(base_dir)
+        csv_logger.event_log.flush_interval = 10
+        version = csv_logger.log_version
+        for i in range(10):
+            csv_logger.log_server_event(f"event {i}")
+        # Čtení logu nečeká na zápis fronty - nezapsané řádky se připojí z paměti
+        started = time.monotonic()
+        lines = csv_logger.get_server_log_tail(100).splitlines()
+        assert time.monotonic() - started < 1
+        assert [line.split('] ', 1)[1] for line in lines] == [f"event {i}" for i in range(10)]
+        assert csv_logger.get_server_log_tail(3).splitlines() == lines[-3:]
+        assert csv_logger.get_stats()['event_log']['lines_written'] == 0
+
+        assert csv_logger.event_log.flush(timeout=5)
+        assert csv_logger.get_server_log_tail(100).splitlines() == lines
+        assert csv_logger.log_version > version
+        assert csv_logger.get_stats()['event_log']['lines_written'] == 10
+        csv_logger.event_log.close()
+        print("✅ CSV logger server log test passed")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_event_log_ordering()
+    test_event_log_flush_interval_and_close()
+    test_write_after_close_with_reader()
+    test_csv_logger_server_log()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Test potvrzování AVL rámců - poškozené rámce bez ACK, více rámců v jednom segmentu"""
+
+import os
+import socket
+import struct
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tcp_server
+from teltonika_protocol import calculate_crc16, parse_udp_header, wrap_avl_data
+from test_fragmentation import fragment1_hex, fragment2_hex
+from test_support import isolated_server, recv_exact
+from test_udp_server import UDP_CODEC8_HEX
+
+IMEI = '352093081452251'
+
+def assert_no_ack(sock):
+    """Server na rámec neodpoví"""
+    sock.settimeout(0.3)
+    try:
+        data = sock.recv(16)
+        assert False, f"Unexpected ACK {data.hex()}"
+    except socket.timeout:
+        pass
+    finally:
+        sock.settimeout(5)
+
+def test_frame_ack():
+    print("=== TEST FRAME ACK ===")
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    datagram = bytes.fromhex(UDP_CODEC8_HEX)
+    codec8_frame = wrap_avl_data(datagram[parse_udp_header(datagram).data_offset:])
+
+    # Poškozené CRC
+    crc_broken = bytearray(frame)
+    crc_broken[100] ^= 0xFF
+    # Počet záznamů na konci neodpovídá hlavičce, CRC je platné
+    data = bytearray(frame[8:-4])
+    data[-1] = 10
+    count_broken = frame[:8] + bytes(data) + struct.pack('>I', calculate_crc16(bytes(data)))
+
+    with isolated_server():
+        client, server = socket.socketpair()
+        try:
+            handler = threading.Thread(target=tcp_server.handle_client, args=(server, ('test', 1), None))
+            handler.start()
+            client.settimeout(5)
+            client.sendall(struct.pack('>H', len(IMEI)) + IMEI.encode('ascii'))
+            assert recv_exact(client, 1) == b'\x01'
+
+            client.sendall(bytes(crc_broken))
+            assert_no_ack(client)
+            client.sendall(count_broken)
+            assert_no_ack(client)
+
+            # Spojení pokračuje - platný rámec se potvrdí
+            client.sendall(frame)
+            assert struct.unpack('>I', recv_exact(client, 4))[0] == 11
+
+            # Dva rámce v jednom segmentu - každý má vlastní ACK se svým počtem záznamů
+            client.sendall(frame + codec8_frame)
+            assert struct.unpack('>II', recv_exact(client, 8)) == (11, 1)
+            assert_no_ack(client)
+        finally:
+            client.close()
+        handler.join(5)
+
+        tcp_server.ingest_pipeline.close()
+        csv_logger = tcp_server.get_csv_logger()
+        # Uloží se rámce s platným CRC (i ten s nesouhlasným počtem)
+        assert len(csv_logger.read_last_records(IMEI, 100)) == 4
+        assert tcp_server.get_imei_registry().registry[IMEI]['total_records'] == 23
+        print("✅ Frame ACK test passed")
+
+if __name__ == "__main__":
+    test_frame_ack()
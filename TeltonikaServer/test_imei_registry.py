@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Test odloženého a atomického ukládání IMEI registru"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from imei_registry import IMEIRegistry
+
+def test_imei_registry():
+    base_dir = tempfile.mkdtemp()
+    registry_path = os.path.join(base_dir, 'imei_registry.json')
+    try:
+        print("=== TEST IMEI REGISTRY ===")
+        registry = IMEIRegistry(registry_path, flush_interval=0.2, flush_changes=1000)
+
+        # Souběžná spojení z více threadů
+        def client(n):
+            imei = f'35209308145{n:04d}'
+            for i in range(50):
+                registry.register_imei_connection(imei, f'10.0.0.{i % 20}')
+                registry.register_avl_records(imei, 11)
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = registry.get_registry_stats()
+        assert stats['total_devices'] == 8
+        assert stats['total_connections'] == 8 * 50
+        assert stats['total_records'] == 8 * 50 * 11
+        assert len(registry.get_imei_info('352093081450000')['ip_addresses']) == 10
+
+        # Odložené uložení po intervalu
+        time.sleep(0.6)
+        with open(registry_path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        assert saved['352093081450003']['total_records'] == 50 * 11
+        assert not os.path.exists(registry_path + '.tmp')
+
+        # Uložení po dosažení počtu změn
+        registry = IMEIRegistry(registry_path, flush_interval=60, flush_changes=5)
+        for _ in range(5):
+            registry.register_avl_records('352093081450000', 1)
+        time.sleep(0.2)
+        assert IMEIRegistry(registry_path).get_imei_info('352093081450000')['total_records'] == 50 * 11 + 5
+
+        # flush_interval=0 = uložení při každé změně
+        registry = IMEIRegistry(registry_path, flush_interval=0)
+        assert registry.register_imei_connection('352093081459999', '10.0.0.1')
+        assert '352093081459999' in IMEIRegistry(registry_path).get_all_imeis()
+        print("✅ IMEI registry OK")
+    finally:
+        shutil.rmtree(base_dir)
+
+if __name__ == "__main__":
+    test_imei_registry()
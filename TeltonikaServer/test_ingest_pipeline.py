@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Test ingest pipeline - ACK po zápisu rámce, backpressure při pomalém disku"""
+
+import os
+import socket
+import struct
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tcp_server
+from ingest_pipeline import PipelineStage
+from test_support import isolated_server, recv_exact
+from test_fragmentation import fragment1_hex, fragment2_hex
+
+IMEI = '352093081452251'
+
+def test_stage_ordering():
+    print("=== TEST PIPELINE STAGE ORDERING ===")
+    stage = PipelineStage('test', workers=4, queue_size=8)
+    results = {}
+    lock = threading.Lock()
+
+    def job(key, i):
+        with lock:
+            results.setdefault(key, []).append(i)
+
+    def producer(key):
+        for i in range(200):
+            stage.submit(key, job, key, i)
+
+    threads = [threading.Thread(target=producer, args=(f'imei{n}',)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stage.close()
+    # Úlohy jednoho klíče se provedou v pořadí zařazení
+    assert all(values == list(range(200)) for values in results.values()) and len(results) == 6
+    stats = stage.stats()
+    assert stats['submitted'] == stats['completed'] == 1200 and stats['queue_depth'] == 0
+    assert stats['max_queue_depth'] <= 8
+    print("✅ Stage ordering test passed")
+
+def test_ack_after_write():
+    print("=== TEST ACK AFTER WRITE ===")
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    # Jeden storage worker s frontou na 4 úlohy
+    with isolated_server(ingest=(1, 1, 4)):
+        csv_logger = tcp_server.get_csv_logger()
+
+        # Pomalý disk - zápis rámce čeká na otevření brány, první zápis po ní selže
+        gate = threading.Event()
+        failures = [True]
+        log_raw_frame = csv_logger.log_raw_frame
+
+        def slow_log_raw_frame(*args):
+            gate.wait()
+            if failures and failures.pop():
+                raise OSError("disk full")
+            log_raw_frame(*args)
+        csv_logger.log_raw_frame = slow_log_raw_frame
+
+        client, server = socket.socketpair()
+        try:
+            handler = threading.Thread(target=tcp_server.handle_client, args=(server, ('test', 1), None))
+            handler.start()
+            client.sendall(struct.pack('>H', len(IMEI)) + IMEI.encode('ascii'))
+            assert recv_exact(client, 1) == b'\x01'
+
+            # Dokud rámec není na disku, ACK neodejde - plná fronta zastaví čtení spojení
+            for _ in range(6):
+                client.sendall(frame)
+            client.settimeout(0.3)
+            try:
+                client.recv(4)
+                assert False, "ACK sent before the frame was stored"
+            except socket.timeout:
+                pass
+
+            # Po uvolnění disku se potvrdí jen zapsané rámce (první zápis selhal)
+            gate.set()
+            client.settimeout(5)
+            acks = struct.unpack('>5I', recv_exact(client, 20))
+            assert acks == (frame[9],) * 5
+            client.settimeout(0.3)
+            try:
+                data = client.recv(4)
+                assert False, f"Unexpected ACK {data.hex()}"
+            except socket.timeout:
+                pass
+        finally:
+            gate.set()
+            client.close()
+        handler.join(5)
+
+        tcp_server.ingest_pipeline.close()
+        assert len(csv_logger.read_last_records(IMEI, 100)) == 5
+        stats = csv_logger.get_stats()['ingest']
+        print(f"Storage stats: {stats['storage']}")
+        assert stats['storage']['blocked_submits'] >= 1 and stats['storage']['errors'] == 1
+        assert stats['parse']['completed'] == 6
+        print("✅ ACK after write test passed")
+
+if __name__ == "__main__":
+    test_stage_ordering()
+    test_ack_after_write()
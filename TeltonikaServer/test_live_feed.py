@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Test živého proudu (/api/events) - nové záznamy a řádky logu bez dotazování"""
+
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from csv_logger import get_shared_logger
+from live_feed import LiveFeed
+from web_server import start_web_server
+from test_fragmentation import fragment1_hex, fragment2_hex
+from test_web_server import free_port, fetch
+
+IMEI = '352093081452251'
+
+def open_stream(port, query='', headers=''):
+    sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    sock.sendall(f'GET /api/events{query} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n'.encode())
+    return sock
+
+def read_events(sock, count):
+    """Přečte count událostí (bez komentářů) - vrací [(id, typ, data)]"""
+    buffer = b''
+    events = []
+    while len(events) < count:
+        chunk = sock.recv(65536)
+        assert chunk, "stream closed"
+        buffer += chunk
+        *blocks, buffer = buffer.split(b'\n\n')
+        for block in blocks:
+            fields = dict(line.split(': ', 1) for line in block.decode().split('\n')
+                          if ': ' in line and not line.startswith(':'))
+            if 'event' in fields:
+                events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+def test_live_feed():
+    print("=== TEST LIVE FEED ===")
+    feed = LiveFeed(size=3)
+    assert feed.wait_events(0, timeout=0.01) == []
+    for i in range(5):
+        feed.publish('log', i)
+    assert [event.data for event in feed.wait_events(3)] == [3, 4]
+    assert feed.wait_events(1) is None  # Události 2 už vypadly z bufferu
+    assert feed.wait_events(99) is None
+    threading.Timer(0.1, feed.publish, ('log', 5)).start()
+    assert [event.data for event in feed.wait_events(5, timeout=2)] == [5]
+    print("✅ Live feed OK")
+
+def test_event_stream():
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST EVENT STREAM ===")
+        csv_logger = get_shared_logger(base_dir)
+        port = free_port()
+        threading.Thread(target=start_web_server, args=('127.0.0.1', port, base_dir, 2, 60.0), daemon=True).start()
+        time.sleep(0.3)
+
+        # Více otevřených proudů než workerů - ostatní požadavky se dál obsluhují
+        streams = [open_stream(port) for _ in range(3)]
+        filtered = open_stream(port, '?imei=000000000000000')
+        time.sleep(0.3)
+        assert json.loads(fetch(port, 'api/devices')) == []
+
+        csv_logger.log_raw_frame(IMEI, frame)
+        csv_logger.log_server_event("Live event")
+        for sock in streams:
+            (record_id, record_type, record), (_, log_type, log) = read_events(sock, 2)
+            assert record_type == 'record' and log_type == 'log'
+            assert record['imei'] == IMEI and record['raw_data'] == frame.hex().upper()
+            assert log['line'].endswith("Live event")
+        # Proud filtrovaný podle IMEI dostane jen log
+        assert read_events(filtered, 1)[0][1] == 'log'
+
+        # Navázání po výpadku - zmeškané události se doručí podle Last-Event-ID
+        for sock in streams:
+            sock.close()
+        csv_logger.raw_storage = 'csv'
+        csv_logger.log_raw_frame(IMEI, frame)
+        resumed = open_stream(port, headers=f'Last-Event-ID: {record_id}\r\n')
+        events = read_events(resumed, 2)
+        assert [event_type for _, event_type, _ in events] == ['log', 'record']
+        assert events[1][2]['raw_data'] == frame.hex().upper()
+        resumed.close()
+        filtered.close()
+        print("✅ Event stream OK")
+    finally:
+        shutil.rmtree(base_dir)
+
+if __name__ == "__main__":
+    test_live_feed()
+    test_event_stream()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Test binárního úložiště surových AVL rámců (data.bin) a jeho čtení přes CSVLogger"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from csv_logger import CSVLogger
+from record_store import RecordStore, ENTRY_OVERHEAD, FILE_MAGIC
+from test_fragmentation import fragment1_hex, fragment2_hex
+
+IMEI = '352093081452251'
+
+def test_record_store():
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST RECORD STORE ===")
+        store = RecordStore(base_dir)
+
+        # Zapisovač otevřený po dobu spojení, rámce i jako memoryview
+        writer = store.open_writer(IMEI)
+        for i in range(5):
+            store.append(IMEI, memoryview(frame), received_ms=1755498234000 + i)
+        store.close_writer(IMEI, writer)
+        # Zápis mimo spojení otevře soubor jen pro jeden rámec
+        store.append(IMEI, frame[:100], received_ms=1755498239000)
+
+        path = store.get_record_file(IMEI)
+        assert os.path.getsize(path) == len(FILE_MAGIC) + 5 * (ENTRY_OVERHEAD + len(frame)) + ENTRY_OVERHEAD + 100
+        print(f"data.bin: {os.path.getsize(path)} bytes, hex v CSV by zabral > {2 * 5 * len(frame)} bytes")
+
+        frames = list(store.iter_frames(IMEI))
+        assert [f.received_ms for f in frames] == [1755498234000 + i for i in range(5)] + [1755498239000]
+        assert frames[0].frame == frame and frames[-1].frame == frame[:100]
+        assert store.count_frames(IMEI) == 6
+
+        last = store.read_last_frames(IMEI, 3)
+        assert last == frames[-3:]
+        assert store.read_last_frames(IMEI, 100) == frames
+
+        # Přerušený zápis na konci souboru se ignoruje
+        with open(path, 'ab') as f:
+            f.write(b'\x00' * 20)
+        assert store.read_last_frames(IMEI, 2) == frames[-2:]
+        assert len(list(store.iter_frames(IMEI))) == 6
+
+        # CSVLogger čte binární úložiště ve stejném tvaru jako data.csv
+        csv_logger = CSVLogger(base_dir)
+        records = csv_logger.read_last_records(IMEI, 2)
+        assert len(records) == 2
+        assert records[0]['raw_data'] == frame.hex().upper()
+        assert csv_logger.get_all_devices()[0]['record_count'] == 6
+        assert csv_logger.export_csv(IMEI).count('\n') == 7
+        print("✅ Record store OK")
+    finally:
+        shutil.rmtree(base_dir)
+
+if __name__ == "__main__":
+    test_record_store()
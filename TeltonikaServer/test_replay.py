@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Test přehrání historie - data.csv, data.bin a komprimovaný segment ve více procesech"""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from record_store import RecordStore
+from replay import _existing_file, list_work, output_name, replay
+from time_service import get_time_service
+from test_fragmentation import fragment1_hex, fragment2_hex
+
+FRAME_HEX = (fragment1_hex + fragment2_hex).upper()
+IMEIS = ['352093081452251', '350317176700155']
+
+def make_history(base_dir):
+    """Dvě zařízení: CSV segment (gzip) + data.csv, druhé data.bin"""
+    device_dir = os.path.join(base_dir, 'devices', IMEIS[0])
+    os.makedirs(device_dir)
+    rows = ''.join(f'2025-08-18 08:23:{second:02d},{FRAME_HEX}\r\n' for second in range(3))
+    with gzip.open(os.path.join(device_dir, 'data-20250818T000000Z.csv.gz'), 'wt') as f:
+        f.write('timestamp,raw_data\r\n' + rows)
+    with open(os.path.join(device_dir, 'data.csv'), 'w') as f:
+        # Poškozený řádek se zapíše s chybou, neúplný poslední řádek se přeskočí
+        f.write('timestamp,raw_data\r\n' + rows + '2025-08-18 08:24:00,00000000DEAD\r\n2025-08-18 08:24:01,0000')
+
+    store = RecordStore(base_dir)
+    for i in range(5):
+        store.append(IMEIS[1], bytes.fromhex(FRAME_HEX), 1755505434000 + i * 1000)
+
+def test_replay():
+    print("=== TEST REPLAY ===")
+    base_dir = tempfile.mkdtemp()
+    try:
+        make_history(base_dir)
+        work = list_work(os.path.join(base_dir, 'devices'))
+        assert [(imei, file_name) for imei, file_name, _ in work] == [
+            (IMEIS[1], 'data.bin'), (IMEIS[0], 'data-20250818T000000Z.csv.gz'), (IMEIS[0], 'data.csv')]
+        assert output_name('data-20250818T000000Z.csv.gz') == 'data-20250818T000000Z.csv.jsonl'
+
+        # Segment zkomprimovaný nebo smazaný během výpisu - použije se .gz, smazaný se přeskočí
+        device_dir = os.path.join(base_dir, 'devices', IMEIS[0])
+        assert _existing_file(device_dir, 'data-20250818T000000Z.csv') == \
+            ('data-20250818T000000Z.csv.gz', os.path.getsize(os.path.join(device_dir, 'data-20250818T000000Z.csv.gz')))
+        assert _existing_file(device_dir, 'data-20250817T000000Z.csv') is None
+
+        messages = []
+        output_dir = os.path.join(base_dir, 'decoded')
+        totals = replay(base_dir, output_dir, workers=2, report=messages.append)
+        print('\n'.join(messages))
+        assert (totals['files'], totals['frames'], totals['errors']) == (3, 12, 1)
+        assert totals['records'] == 11 * 11
+        assert len(messages) == 5 and messages[-1].startswith('Done')
+
+        with open(os.path.join(output_dir, IMEIS[1], 'data.bin.jsonl')) as f:
+            frames = [json.loads(line) for line in f]
+        assert len(frames) == 5 and frames[0]['codec'] == 'codec8_extended' and len(frames[0]['records']) == 11
+        assert frames[0]['timestamp'] == get_time_service().format_epoch_ms(1755505434000)
+
+        with open(os.path.join(output_dir, IMEIS[0], 'data.csv.jsonl')) as f:
+            frames = [json.loads(line) for line in f]
+        assert [frame['timestamp'] for frame in frames][-2:] == ['2025-08-18 08:23:02', '2025-08-18 08:24:00']
+        assert 'error' in frames[-1]
+
+        # Výběr zařízení a komprimovaný výstup
+        totals = replay(base_dir, output_dir, workers=1, imeis=[IMEIS[1]], compress=True, report=lambda _: None)
+        assert totals['files'] == 1
+        with gzip.open(os.path.join(output_dir, IMEIS[1], 'data.bin.jsonl.gz'), 'rt') as f:
+            assert sum(1 for _ in f) == 5
+        print("✅ Replay test passed")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_replay()
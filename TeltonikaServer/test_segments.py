@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Test rotace data.bin, data.csv a server.log do komprimovaných segmentů"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import segments
+from csv_logger import CSVLogger
+from segments import RotationPolicy, apply_retention, compress_segment, data_size, list_segments, open_segment
+
+BIN_IMEI = '352093081452251'
+CSV_IMEI = '352093081452252'
+RECORDS = 100
+
+def frame(i):
+    return i.to_bytes(4, 'big') * 16
+
+def write_records(csv_logger):
+    """Binární rámce přes otevřený zapisovač spojení, CSV záznamy a řádky server logu"""
+    csv_logger.raw_storage = 'binary'
+    writer = csv_logger.open_raw_writer(BIN_IMEI)
+    for i in range(RECORDS):
+        csv_logger.log_raw_frame(BIN_IMEI, frame(i))
+    csv_logger.close_raw_writer(BIN_IMEI, writer)
+
+    csv_logger.raw_storage = 'csv'
+    for i in range(RECORDS):
+        csv_logger.log_raw_frame(CSV_IMEI, frame(i))
+
+    # Server log se zapisuje po dávkách - rotace se kontroluje před každou dávkou
+    for i in range(RECORDS):
+        csv_logger.log_server_event(f"event {i} " + 'x' * 60)
+        if i % 10 == 9:
+            csv_logger.event_log.flush()
+    segments.wait_for_compression()
+
+def test_rotation():
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST ROTATION ===")
+        csv_logger = CSVLogger(base_dir)
+        csv_logger.set_rotation(RotationPolicy(max_bytes=2000, daily=False))
+        write_records(csv_logger)
+
+        bin_path = csv_logger.record_store.get_record_file(BIN_IMEI)
+        csv_path = os.path.join(csv_logger.devices_dir, CSV_IMEI, 'data.csv')
+        for path in (bin_path, csv_path, csv_logger.server_log):
+            closed = list_segments(path)
+            print(f"{os.path.basename(path)}: {len(closed)} segments")
+            assert len(closed) >= 3
+            assert all(segment.endswith('.gz') for segment in closed)
+            assert os.path.getsize(path) < 2000 + 200
+
+        # Čtení pokrývá segmenty i aktivní soubor
+        expected = [frame(i).hex().upper() for i in range(RECORDS)]
+        for imei in (BIN_IMEI, CSV_IMEI):
+            rows = csv_logger.read_last_records(imei, 1000)
+            assert [row['raw_data'] for row in rows] == expected
+            assert [row['raw_data'] for row in csv_logger.read_last_records(imei, 30)] == expected[-30:]
+
+            export = csv_logger.export_csv(imei).splitlines()
+            assert export[0] == 'timestamp,raw_data'
+            assert [line.split(',')[1] for line in export[1:]] == expected
+
+            pages = []
+            records, cursor = csv_logger.query_records(imei, limit=30)
+            pages.append(records)
+            while cursor:
+                records, cursor = csv_logger.query_records(imei, limit=30, cursor=cursor)
+                pages.append(records)
+            assert [len(page) for page in pages] == [30, 30, 30, 10]
+            assert [row['raw_data'] for page in pages for row in page] == expected
+
+        counts = {device['imei']: device['record_count'] for device in csv_logger.get_all_devices()}
+        assert counts == {BIN_IMEI: RECORDS, CSV_IMEI: RECORDS}
+
+        log_lines = csv_logger.get_server_log_tail(1000).splitlines()
+        assert [line.split('] ', 1)[1] for line in log_lines] == [f"event {i} " + 'x' * 60 for i in range(RECORDS)]
+        assert csv_logger.get_server_log_tail(10).splitlines() == log_lines[-10:]
+
+        # Retence smaže staré segmenty - souhrn i dotazy počítají jen se zbylými daty
+        _, cursor = csv_logger.query_records(BIN_IMEI, limit=5)
+        future = time.time() + 3 * 86400
+        assert apply_retention(bin_path, 1, now=future)
+        assert apply_retention(csv_logger.server_log, 1, now=future)
+        assert list_segments(bin_path) == [] and list_segments(csv_logger.server_log) == []
+        remaining = csv_logger.record_store.count_frames(BIN_IMEI)
+        counts = {device['imei']: device['record_count'] for device in csv_logger.get_all_devices()}
+        assert counts[BIN_IMEI] == remaining < RECORDS
+        records, _ = csv_logger.query_records(BIN_IMEI, limit=1000, cursor=cursor)
+        assert [row['raw_data'] for row in records] == expected[-remaining:]
+        print("✅ Rotation test passed")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+def test_compressed_fallback():
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST COMPRESSED SEGMENT FALLBACK ===")
+        segment = os.path.join(base_dir, 'data-20250818T000000Z.csv')
+        content = b'timestamp,raw_data\r\n' + b'2025-08-18 08:23:54,00\r\n' * 100
+        with open(segment, 'wb') as f:
+            f.write(content)
+
+        # Čtenář otevřel segment před kompresí - čte dál i po smazání původního souboru
+        with open_segment(segment) as reader:
+            assert compress_segment(segment) == segment + '.gz'
+            assert not os.path.exists(segment)
+            assert reader.read() == content
+
+        # Segment z dřívějšího výpisu se otevře z .gz se stejnými offsety
+        assert data_size(segment) == len(content)
+        with open_segment(segment) as f:
+            f.seek(20)
+            assert f.read() == content[20:]
+        os.remove(segment + '.gz')
+        try:
+            open_segment(segment)
+            assert False, "Missing segment opened"
+        except FileNotFoundError:
+            pass
+        print("✅ Compressed segment fallback test passed")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+def test_daily_rotation():
+    print("=== TEST DAILY ROTATION ===")
+    policy = RotationPolicy(max_bytes=0, daily=True)
+    now = time.time()
+    assert policy.should_rotate(100, now - 86400, now)
+    assert not policy.should_rotate(100, now, now)
+    # Prázdný soubor se neuzavírá
+    assert not policy.should_rotate(0, now - 86400, now)
+    assert not RotationPolicy(max_bytes=0, daily=False).should_rotate(10 ** 9, now - 86400, now)
+    print("✅ Daily rotation test passed")
+
+if __name__ == "__main__":
+    test_rotation()
+    test_compressed_fallback()
+    test_daily_rotation()
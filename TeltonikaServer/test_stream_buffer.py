@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Test paměťového reassembly bufferu (StreamBuffer) na fragmentovaných datech"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from buffer_manager import StreamBuffer
+from test_fragmentation import fragment1_hex, fragment2_hex
+
+def test_stream_buffer():
+    fragment1 = bytes.fromhex(fragment1_hex)
+    fragment2 = bytes.fromhex(fragment2_hex)
+    complete = fragment1 + fragment2
+
+    print("=== TEST STREAM BUFFER ===")
+    stream_buffer = StreamBuffer()
+
+    # První fragment - rámec ještě není kompletní
+    stream_buffer.feed(fragment1)
+    frames = stream_buffer.pop_frames()
+    print(f"Po fragmentu 1: {len(frames)} rámců, čeká {len(stream_buffer)} bytes")
+    assert frames == []
+    assert len(stream_buffer) == len(fragment1)
+
+    # Druhý fragment dokončí rámec
+    stream_buffer.feed(fragment2)
+    frames = stream_buffer.pop_frames()
+    print(f"Po fragmentu 2: {len(frames)} rámců, čeká {len(stream_buffer)} bytes")
+    assert len(frames) == 1
+    assert isinstance(frames[0], memoryview)
+    assert frames[0] == complete
+    assert len(stream_buffer) == 0
+
+    # Smetí před rámcem a dva rámce v jednom segmentu, druhý rozdělený
+    stream_buffer.feed(b'\x01\x02\x03' + complete + complete[:100])
+    frames_garbage = stream_buffer.pop_frames()
+    stream_buffer.feed(complete[100:])
+    frames_rest = stream_buffer.pop_frames()
+    print(f"Se smetím: {len(frames_garbage)} + {len(frames_rest)} rámců")
+    assert [bytes(f) for f in frames_garbage + frames_rest] == [complete, complete]
+
+    # Dříve vrácené rámce zůstávají platné i po dalším feed()
+    assert frames[0] == complete
+    assert stream_buffer.discarded == 3
+
+    # Poškozený rámec a falešná preamble s platnou délkou se přeskočí,
+    # následující rámec se najde podle další preamble
+    broken = bytearray(complete)
+    broken[100] ^= 0xFF
+    fake = b'\x00\x00\x00\x00\x00\x00\x00\x20' + b'\x01' * 40
+    stream_buffer = StreamBuffer()
+    stream_buffer.feed(bytes(broken) + fake + complete)
+    frames = stream_buffer.pop_frames()
+    print(f"Po poškozeném rámci: {len(frames)} rámců, zahozeno {stream_buffer.discarded} bytes")
+    assert [bytes(f) for f in frames] == [complete]
+    assert stream_buffer.discarded == len(broken) + len(fake) and len(stream_buffer) == 0
+
+    # Délka nad limitem parseru se nečeká, hledá se další preamble
+    stream_buffer = StreamBuffer(b'\x00\x00\x00\x00\x00\x01\x00\x00' + complete)
+    assert [bytes(f) for f in stream_buffer.pop_frames()] == [complete]
+    print("✅ StreamBuffer OK")
+
+if __name__ == "__main__":
+    test_stream_buffer()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Test streamového čtení rámců - resynchronizace po šumu, soubor, mmap a socket"""
+
+import io
+import mmap
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from teltonika_protocol import (MAX_AVL_DATA_LENGTH, build_command_frame, iter_avl_frames, iter_avl_packets,
+                                iter_avl_records, parse_avl_packet, parse_avl_packet_with_length, wrap_avl_data)
+from test_fragmentation import fragment1_hex, fragment2_hex
+
+FRAME = bytes.fromhex(fragment1_hex + fragment2_hex)
+
+def make_archive(frames, seed=1):
+    """Rámce prokládané šumem - nuly, useknuté rámce a náhodná data"""
+    rng = random.Random(seed)
+    noise = [b'', b'\x00' * 7, b'garbage', FRAME[:300], b'\x00\x00\x00\x00\x00\x00\x10\x00', bytes(rng.randrange(256) for _ in range(50))]
+    parts = []
+    for _ in range(frames):
+        parts.append(rng.choice(noise))
+        parts.append(FRAME)
+    parts.append(FRAME[:100])
+    return b''.join(parts)
+
+def test_resync():
+    print("=== TEST STREAM RESYNC ===")
+    archive = make_archive(200)
+    frames = list(iter_avl_frames(archive))
+    assert len(frames) == 200 and all(frame == FRAME for frame in frames)
+
+    # Stejný výsledek při čtení po libovolně malých blocích
+    for chunk_size in (1, 7, 1000, 65536):
+        assert sum(1 for _ in iter_avl_frames(io.BytesIO(archive), chunk_size)) == 200
+    chunks = [archive[i:i + 333] for i in range(0, len(archive), 333)]
+    assert sum(1 for _ in iter_avl_frames(iter(chunks))) == 200
+
+    # Poškozené CRC - rámec se přeskočí, bez kontroly CRC se vrátí
+    broken = bytearray(FRAME)
+    broken[100] ^= 0xFF
+    assert list(iter_avl_frames(bytes(broken) + FRAME)) == [FRAME]
+    assert len(list(iter_avl_frames(bytes(broken), check_crc=False))) == 1
+
+    # Rámec delší než limit parseru se nevrátí (a nečeká se na jeho data)
+    oversized = wrap_avl_data(b'\x8e\x01' + b'\x01' * (MAX_AVL_DATA_LENGTH - 2) + b'\x01')
+    assert parse_avl_packet_with_length(oversized)[2] == 'unknown'
+    assert list(iter_avl_frames(oversized + FRAME)) == [FRAME]
+
+    # parse_avl_packet najde rámec za šumem
+    records, count, codec_type = parse_avl_packet(b'garbage\x00\x00' + FRAME)
+    assert (count, codec_type) == (11, 'codec8_extended')
+    assert parse_avl_packet(b'\x00' * 64)[2] == 'unknown'
+    print("✅ Stream resync test passed")
+
+def test_lazy_decoding():
+    print("=== TEST LAZY DECODING ===")
+    command = build_command_frame('getinfo')
+    packets = iter_avl_packets([FRAME, command, FRAME])
+    frame, records, codec_type = next(packets)
+    assert frame == FRAME and len(records) == 11 and codec_type == 'codec8_extended'
+    assert next(packets)[2] == 'codec12'
+
+    # Záznamy příkazového kanálu se vynechají
+    records = list(iter_avl_records([FRAME, command, FRAME]))
+    assert len(records) == 22 and records[0].timestamp_ms == records[11].timestamp_ms
+    print("✅ Lazy decoding test passed")
+
+def test_file_and_socket():
+    print("=== TEST FILE, MMAP AND SOCKET ===")
+    archive = make_archive(500, seed=2)
+    with tempfile.TemporaryFile() as f:
+        f.write(archive)
+        f.flush()
+        f.seek(0)
+        assert sum(1 for _ in iter_avl_frames(f, 4096)) == 500
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            assert sum(1 for _ in iter_avl_frames(mapped)) == 500
+
+    client, server = socket.socketpair()
+    sender = threading.Thread(target=lambda: (client.sendall(archive), client.close()))
+    sender.start()
+    try:
+        assert sum(1 for _ in iter_avl_records(server, 1500)) == 500 * 11
+    finally:
+        sender.join()
+        server.close()
+    print("✅ File, mmap and socket test passed")
+
+if __name__ == "__main__":
+    test_resync()
+    test_lazy_decoding()
+    test_file_and_socket()
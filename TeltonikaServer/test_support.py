@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Společné pomůcky testů TCP/UDP serveru - izolovaný tcp_server a čtení ze socketu"""
+
+import inspect
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tcp_server
+
+# Sdílené komponenty, které gettery tcp_serveru vytváří při prvním použití
+_COMPONENTS = ('csv_logger', 'imei_registry', 'buffer_manager', 'ingest_pipeline')
+
+def recv_exact(sock, size):
+    """Přečte přesně size bytes (méně jen pokud protistrana zavře spojení)"""
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def _module_state():
+    """Globální proměnné tcp_serveru (bez funkcí, tříd a modulů)"""
+    return {name: value for name, value in vars(tcp_server).items()
+            if not name.startswith('__') and not callable(value) and not inspect.ismodule(value)}
+
+@contextmanager
+def isolated_server(connection_limit=0, storage='binary', rotation=None, ingest=None):
+    """
+    tcp_server nad dočasnou složkou s novými komponentami - vrací tuto složku
+    Na konci dokončí pipeline a server log a obnoví všechny globální proměnné modulu,
+    nové globální proměnné smaže. Spojení musí být zavřená před koncem bloku.
+    """
+    saved = _module_state()
+    base_dir = tempfile.mkdtemp()
+    try:
+        tcp_server.CONFIG_DIR = base_dir
+        for name in _COMPONENTS:
+            setattr(tcp_server, name, None)
+        tcp_server._configure_server(False, 16, connection_limit, storage, rotation, ingest)
+        yield base_dir
+    finally:
+        if tcp_server.ingest_pipeline is not None:
+            tcp_server.ingest_pipeline.close()
+        if tcp_server.csv_logger is not None:
+            tcp_server.csv_logger.event_log.close()
+        for name in set(_module_state()) - set(saved):
+            delattr(tcp_server, name)
+        for name, value in saved.items():
+            setattr(tcp_server, name, value)
+        shutil.rmtree(base_dir, ignore_errors=True)
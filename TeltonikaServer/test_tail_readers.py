@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Test čtení konce data.csv a server.log od konce souboru (read_tail_lines)"""
+
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import csv_logger as csv_logger_module
+from csv_logger import CSVLogger, read_tail_lines
+
+IMEI = '352093081452251'
+
+def test_tail_readers():
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST TAIL READERS ===")
+        logger = CSVLogger(base_dir, raw_storage='csv')
+        for i in range(3000):
+            logger.log_raw_record(IMEI, f'{i:04X}' * 40)
+        with open(logger.server_log, 'w', encoding='utf-8') as f:
+            for i in range(3000):
+                f.write(f"[2025-08-18 06:23:54] Událost č. {i}\n")
+
+        csv_file = os.path.join(base_dir, 'devices', IMEI, 'data.csv')
+        with open(csv_file, 'r', encoding='utf-8') as f:
+            all_rows = list(csv.DictReader(f))
+
+        # Malé bloky - řádky přes hranice bloků
+        for block_size in (7, 100, csv_logger_module.TAIL_BLOCK_SIZE):
+            csv_logger_module.TAIL_BLOCK_SIZE = block_size
+            for count in (1, 2, 999, 2999, 3000, 5000):
+                assert logger.read_last_records(IMEI, count) == all_rows[-count:], (block_size, count)
+            tail = logger.get_server_log_tail(10)
+            assert tail.splitlines() == [f"[2025-08-18 06:23:54] Událost č. {i}" for i in range(2990, 3000)]
+            assert len(logger.get_server_log_tail(10000).splitlines()) == 3000
+        csv_logger_module.TAIL_BLOCK_SIZE = 64 * 1024
+
+        lines, reached_start = read_tail_lines(logger.server_log, 5, block_size=64)
+        assert not reached_start and len(lines) >= 5
+
+        # Čas čtení nezávisí na velikosti souboru
+        start = time.perf_counter()
+        for _ in range(100):
+            logger.read_last_records(IMEI, 50)
+        print(f"read_last_records(50): {(time.perf_counter() - start) * 10:.2f} ms")
+        print("✅ Tail readers OK")
+    finally:
+        shutil.rmtree(base_dir)
+
+if __name__ == "__main__":
+    test_tail_readers()
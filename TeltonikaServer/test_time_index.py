@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Test dotazů na časové okno a stránkování přes řídký index čas → offset"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from csv_logger import CSVLogger, get_shared_logger
+from record_store import ENTRY_OVERHEAD
+from time_index import SparseTimeIndex, INDEX_INTERVAL
+from web_server import start_web_server
+from test_web_server import free_port, fetch
+
+IMEI = '352093081452251'
+BASE_MS = 1755498234000
+
+def write_records(csv_logger, csv_count, bin_count):
+    """Starší záznamy v data.csv, novější v data.bin - po sekundě"""
+    device_dir = os.path.join(csv_logger.devices_dir, IMEI)
+    os.makedirs(device_dir, exist_ok=True)
+    with open(os.path.join(device_dir, 'data.csv'), 'w', newline='') as f:
+        f.write('timestamp,raw_data\r\n')
+        for i in range(csv_count):
+            f.write(f'{csv_logger._format_epoch_ms(BASE_MS + i * 1000)},{i:08X}\r\n')
+    for i in range(csv_count, csv_count + bin_count):
+        csv_logger.record_store.append(IMEI, i.to_bytes(4, 'big'), BASE_MS + i * 1000)
+
+def record_index(row):
+    return int(row['raw_data'], 16)
+
+def test_time_index():
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST TIME INDEX ===")
+        csv_logger = CSVLogger(base_dir)
+        write_records(csv_logger, 500, 1000)
+
+        # Okno přes oba soubory, po stránkách
+        start_ms, end_ms = BASE_MS + 450 * 1000, BASE_MS + 1099 * 1000
+        pages = []
+        records, cursor = csv_logger.query_records(IMEI, start_ms, end_ms, limit=200)
+        pages.append(records)
+        while cursor:
+            records, cursor = csv_logger.query_records(IMEI, limit=200, cursor=cursor)
+            pages.append(records)
+        assert [len(page) for page in pages] == [200, 200, 200, 50]
+        assert [record_index(row) for page in pages for row in page] == list(range(450, 1100))
+
+        # Jen horní mez, bez mezí a prázdné okno
+        records, cursor = csv_logger.query_records(IMEI, end_ms=BASE_MS + 9000, limit=100)
+        assert [record_index(row) for row in records] == list(range(10)) and cursor is None
+        assert len(csv_logger.query_records(IMEI, limit=2000)[0]) == 1500
+        assert csv_logger.query_records(IMEI, BASE_MS + 10 ** 9)[0] == []
+
+        # Začátek okna se hledá v indexu - čte se nejvýše INDEX_INTERVAL záznamů navíc
+        bin_index = csv_logger._get_time_index(IMEI, 'data.bin')
+        assert len(bin_index) == (1000 + INDEX_INTERVAL - 1) // INDEX_INTERVAL
+        offset = bin_index.seek(BASE_MS + 1400 * 1000)
+        skipped = sum(1 for stored_frame in csv_logger.record_store.iter_frames(IMEI, offset)
+                      if stored_frame.received_ms < BASE_MS + 1400 * 1000)
+        assert skipped < INDEX_INTERVAL
+
+        # Index se po restartu načte ze souboru a doplní jen o nové záznamy
+        csv_logger.record_store.append(IMEI, (1500).to_bytes(4, 'big'), BASE_MS + 1500 * 1000)
+        scanned = []
+        def scanner(start):
+            scanned.append(start)
+            return ((o, o + ENTRY_OVERHEAD + length, ms) for o, ms, length in csv_logger.record_store.iter_headers(IMEI, start))
+        reloaded = SparseTimeIndex(bin_index.path, scanner)
+        assert reloaded.seek(BASE_MS + 1500 * 1000) == bin_index.seek(BASE_MS + 1500 * 1000)
+        assert scanned == [bin_index._offsets[-1]]
+
+        # Neplatný kurzor a čas
+        for bad in ('xyz', 'W10'):
+            try:
+                csv_logger.query_records(IMEI, cursor=bad)
+                assert False
+            except ValueError:
+                pass
+        assert csv_logger.parse_time('2025-08-18') == csv_logger.parse_time('2025-08-18 00:00:00')
+        print("✅ Time index OK")
+    finally:
+        shutil.rmtree(base_dir)
+
+def test_device_data_paging_api():
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST DEVICE DATA PAGING API ===")
+        csv_logger = get_shared_logger(base_dir)
+        write_records(csv_logger, 10, 30)
+        port = free_port()
+        threading.Thread(target=start_web_server, args=('127.0.0.1', port, base_dir, 2, 60.0), daemon=True).start()
+        time.sleep(0.3)
+
+        start = urllib.parse.quote(csv_logger._format_epoch_ms(BASE_MS + 5000))
+        page = json.loads(fetch(port, f'api/device_data?imei={IMEI}&from={start}&limit=20'))
+        assert [record_index(row) for row in page['records']] == list(range(5, 25))
+        page = json.loads(fetch(port, f'api/device_data?imei={IMEI}&limit=20&cursor={page["next_cursor"]}'))
+        assert [record_index(row) for row in page['records']] == list(range(25, 40))
+        assert page['next_cursor'] is None
+
+        # Bez parametrů okna zůstává původní odpověď (posledních N záznamů)
+        assert len(json.loads(fetch(port, f'api/device_data?imei={IMEI}&limit=5'))) == 5
+        try:
+            fetch(port, f'api/device_data?imei={IMEI}&from=yesterday')
+            assert False
+        except urllib.error.HTTPError as e:
+            assert e.code == 400
+        print("✅ Device data paging API OK")
+    finally:
+        shutil.rmtree(base_dir)
+
+if __name__ == "__main__":
+    test_time_index()
+    test_device_data_paging_api()
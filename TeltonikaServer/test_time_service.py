@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Test sdílené časové zóny a cache formátovaného času"""
+
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytz
+from time_service import TimeService, get_time_service, LOCAL_TIME_FORMAT
+
+def test_time_service():
+    print("=== TEST TIME SERVICE ===")
+    service = TimeService('Europe/Prague')
+    tz = pytz.timezone('Europe/Prague')
+
+    # Stejná sekunda = stejný hotový řetězec
+    for _ in range(3):
+        before = datetime.now(tz).strftime(LOCAL_TIME_FORMAT)
+        text = service.local_time()
+        after = datetime.now(tz).strftime(LOCAL_TIME_FORMAT)
+        if before == after:
+            assert text == before
+            assert service.local_time() is text
+            break
+
+    # Přechod letního času (26. 10. 2025 03:00 CEST -> 02:00 CET)
+    for utc_time, expected in (('2025-10-26 00:30:00', '2025-10-26 02:30:00'),
+                               ('2025-10-26 01:30:00', '2025-10-26 02:30:00'),
+                               ('2025-10-26 02:30:00', '2025-10-26 03:30:00'),
+                               ('2025-08-18 06:23:54', '2025-08-18 08:23:54')):
+        epoch = datetime.strptime(utc_time, LOCAL_TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+        assert service.format_epoch_ms(int(epoch * 1000) + 999) == expected
+
+    local = datetime(2025, 8, 18, 8, 23, 54)
+    assert service.format_epoch_ms(service.parse_local(local)) == '2025-08-18 08:23:54'
+
+    assert abs(service.epoch_ms() - time.time() * 1000) < 1000
+    assert get_time_service() is get_time_service()
+    print("✅ Time service test passed")
+
+if __name__ == "__main__":
+    test_time_service()
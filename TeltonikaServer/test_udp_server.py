@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Test UDP listeneru - hlavička datagramu, ACK, opakované datagramy a uložení rámců"""
+
+import os
+import select
+import socket
+import struct
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tcp_server
+from teltonika_protocol import build_udp_ack, parse_udp_header, parse_avl_packet_with_length, validate_avl_packet_crc, wrap_avl_data
+from udp_server import UDPListener
+from test_fragmentation import fragment1_hex, fragment2_hex
+from test_support import isolated_server
+
+# Příklad datagramu z dokumentace Teltonika (Codec8, 1 záznam) a jeho ACK
+UDP_CODEC8_HEX = ('003DCAFE0105000F33353230393430383532333135393508010000016B4F815B30010000000000000000000000'
+                  '000000000103021503010101425DBC000001')
+UDP_ACK_HEX = '0005CAFE010501'
+IMEI = '352094085231595'
+
+def make_datagram(packet_id, avl_packet_id, imei, avl_data):
+    """UDP datagram s AVL daty (bez preambule a CRC)"""
+    body = struct.pack('>HBBH', packet_id, 0x01, avl_packet_id, len(imei)) + imei.encode('ascii') + avl_data
+    return struct.pack('>H', len(body)) + body
+
+def test_udp_header():
+    print("=== TEST UDP HEADER ===")
+    datagram = bytes.fromhex(UDP_CODEC8_HEX)
+    header = parse_udp_header(datagram)
+    assert (header.packet_id, header.avl_packet_id, header.imei) == (0xCAFE, 0x05, IMEI)
+    assert build_udp_ack(header.packet_id, header.avl_packet_id, 1).hex().upper() == UDP_ACK_HEX
+
+    frame = wrap_avl_data(datagram[header.data_offset:])
+    assert validate_avl_packet_crc(frame)
+    records, count, codec_type, _ = parse_avl_packet_with_length(frame)
+    assert (count, codec_type) == (1, 'codec8') and records[0].timestamp_ms == 0x16B4F815B30
+
+    assert parse_udp_header(datagram[:-1]) is None
+    assert parse_udp_header(make_datagram(1, 1, 'abc', b'\x08\x00\x00')) is None
+    assert parse_udp_header(b'\x00\x01') is None
+    print("✅ UDP header test passed")
+
+def receive_all(listener, expected):
+    """Zpracuje dávky, dokud listener nepřečte očekávaný počet datagramů"""
+    while listener.stats()['datagrams'] < expected:
+        assert select.select([listener.sock], [], [], 5)[0], "Datagram not received"
+        listener.process_batch(listener.receive_batch())
+
+def test_udp_listener():
+    print("=== TEST UDP LISTENER ===")
+    with isolated_server():
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            server.bind(('127.0.0.1', 0))
+            client.settimeout(5)
+            listener = UDPListener(server, batch_size=4, session_timeout=60)
+
+            # Velký rámec (11 záznamů Codec8E) jako UDP datagram
+            tcp_frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+            big = make_datagram(0x0001, 0x10, IMEI, tcp_frame[8:-4])
+            datagrams = [bytes.fromhex(UDP_CODEC8_HEX), big, big, b'\x00\x05garbage',
+                         make_datagram(0x0002, 0x11, IMEI, b'\x08\x02' + tcp_frame[10:-5] + b'\x03')]
+            for datagram in datagrams:
+                client.sendto(datagram, server.getsockname())
+            receive_all(listener, len(datagrams))
+
+            # ACK pro platné datagramy (opakovaný se potvrdí znovu), žádný pro poškozené
+            acks = [client.recv(16) for _ in range(3)]
+            assert acks[0].hex().upper() == UDP_ACK_HEX
+            assert acks[1] == acks[2] == build_udp_ack(0x0001, 0x10, 11)
+            client.settimeout(0.2)
+            try:
+                client.recv(16)
+                assert False, "ACK sent for an invalid datagram"
+            except socket.timeout:
+                pass
+
+            stats = listener.stats()
+            assert (stats['duplicates'], stats['invalid'], stats['sessions']) == (1, 2, 1)
+            assert stats['batches'] >= 2 and stats['max_batch'] <= 4
+
+            # Nezapsaný datagram se nepotvrdí a jeho opakování se uloží znovu
+            csv_logger = tcp_server.get_csv_logger()
+            failures = [True]
+            log_raw_frame = csv_logger.log_raw_frame
+
+            def failing_log_raw_frame(*args):
+                if failures and failures.pop():
+                    raise OSError("disk full")
+                log_raw_frame(*args)
+            csv_logger.log_raw_frame = failing_log_raw_frame
+            single = bytes.fromhex(UDP_CODEC8_HEX)
+            retried = make_datagram(0x0003, 0x12, IMEI, single[parse_udp_header(single).data_offset:])
+            client.sendto(retried, server.getsockname())
+            receive_all(listener, len(datagrams) + 1)
+            try:
+                client.recv(16)
+                assert False, "ACK sent for a datagram that was not stored"
+            except socket.timeout:
+                pass
+            client.settimeout(5)
+            client.sendto(retried, server.getsockname())
+            receive_all(listener, len(datagrams) + 2)
+            assert client.recv(16) == build_udp_ack(0x0003, 0x12, 1)
+            csv_logger.log_raw_frame = log_raw_frame
+
+            # Relace po timeoutu zavře zapisovač
+            listener.expire_devices(listener.devices[IMEI].last_seen + 60)
+            assert not listener.devices
+        finally:
+            client.close()
+            server.close()
+
+        tcp_server.ingest_pipeline.close()
+        rows = csv_logger.read_last_records(IMEI, 100)
+        assert len(rows) == 3 and rows[1]['raw_data'] == tcp_frame.hex().upper()
+        assert tcp_server.get_imei_registry().registry[IMEI]['total_records'] == 14
+        print("✅ UDP listener test passed")
+
+if __name__ == "__main__":
+    test_udp_header()
+    test_udp_listener()
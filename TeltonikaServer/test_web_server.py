@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Test web serveru - souběžné požadavky v poolu a cache odpovědí API"""
+
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from csv_logger import get_shared_logger
+from web_server import start_web_server
+from test_fragmentation import fragment1_hex, fragment2_hex
+
+IMEI = '352093081452251'
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def fetch(port, path):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/{path}', timeout=5) as response:
+        return response.read()
+
+def test_web_server():
+    frame = bytes.fromhex(fragment1_hex + fragment2_hex)
+    base_dir = tempfile.mkdtemp()
+    try:
+        print("=== TEST WEB SERVER ===")
+        csv_logger = get_shared_logger(base_dir)
+        csv_logger.log_raw_frame(IMEI, frame)
+
+        port = free_port()
+        threading.Thread(target=start_web_server, args=('127.0.0.1', port, base_dir, 4, 60.0), daemon=True).start()
+        time.sleep(0.3)
+
+        # Pomalé stahování neblokuje ostatní požadavky
+        open_csv_export = csv_logger.open_csv_export
+        def slow_export(imei):
+            time.sleep(1.0)
+            return open_csv_export(imei)
+        csv_logger.open_csv_export = slow_export
+        download = threading.Thread(target=fetch, args=(port, f'api/download_csv?imei={IMEI}'))
+        download.start()
+        time.sleep(0.1)
+        start = time.perf_counter()
+        devices = json.loads(fetch(port, 'api/devices'))
+        elapsed = time.perf_counter() - start
+        download.join()
+        print(f"/api/devices během stahování: {elapsed * 1000:.0f} ms")
+        assert elapsed < 0.5
+        assert devices[0]['record_count'] == 1
+
+        # Opakované dotazy jdou z cache, zápis z TCP strany ji zneplatní
+        calls = []
+        get_all_devices = csv_logger.get_all_devices
+        csv_logger.get_all_devices = lambda: calls.append(1) or get_all_devices()
+        fetch(port, 'api/devices')
+        fetch(port, 'api/devices')
+        assert calls == []
+        csv_logger.log_raw_frame(IMEI, frame)
+        assert json.loads(fetch(port, 'api/devices'))[0]['record_count'] == 2
+        assert calls == [1]
+
+        records = json.loads(fetch(port, f'api/device_data?imei={IMEI}&limit=10'))
+        assert len(records) == 2
+        csv_logger.log_server_event("Test event")
+        assert b"Test event" in fetch(port, 'api/server_log?limit=5')
+        print("✅ Web server OK")
+    finally:
+        shutil.rmtree(base_dir)
+
+if __name__ == "__main__":
+    test_web_server()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Řídký index čas → offset pro datové soubory zařízení (dotazy na časové okno)"""
+
+import os
+import struct
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Iterator, Tuple
+
+INDEX_SUFFIX = '.idx'
+# Bod indexu pro každý N-tý záznam - dotaz přečte nejvýše N záznamů před začátkem okna
+INDEX_INTERVAL = 128
+# Bod indexu: (čas v epoch ms, offset záznamu v datovém souboru)
+_INDEX_ENTRY = struct.Struct('>qQ')
+
+# scanner(start_offset) -> (offset záznamu, offset konce záznamu, čas záznamu v podobě daného souboru)
+Scanner = Callable[[int], Iterator[Tuple[int, int, Any]]]
+
+
+class SparseTimeIndex:
+    """
+    Index jednoho datového souboru - čas a offset každého INDEX_INTERVAL-tého záznamu
+    Doplňuje se až před dotazem a prochází jen data zapsaná od posledního bodu.
+    Body se připisují do <soubor>.idx, takže po restartu se index jen načte.
+    Předpokládá záznamy seřazené podle času (soubory se jen připisují).
+    """
+
+    def __init__(self, path: str, scanner: Scanner, time_key: Callable[[Any], int] = int,
+                 interval: int = INDEX_INTERVAL):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.scanner = scanner
+        self.time_key = time_key
+        self.interval = interval
+
+        self._times = []
+        self._offsets = []
+        # Offset, do kterého jsou záznamy zpracované, a počet záznamů od posledního bodu
+        self._scanned = 0
+        self._since_point = 0
+        self._lock = threading.Lock()
+
+        self._load()
+
+    def _load(self):
+        """Načte uložené body - pokračuje se od posledního z nich"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        usable = len(data) - len(data) % _INDEX_ENTRY.size
+        for time_ms, offset in _INDEX_ENTRY.iter_unpack(data[:usable]):
+            self._times.append(time_ms)
+            self._offsets.append(offset)
+        if self._offsets:
+            self._scanned = self._offsets[-1]
+
+    def _reset(self):
+        """Zahodí index (datový soubor byl přepsán nebo smazán)"""
+        self._times = []
+        self._offsets = []
+        self._scanned = 0
+        self._since_point = 0
+        try:
+            os.remove(self.index_path)
+        except FileNotFoundError:
+            pass
+
+    def reset(self):
+        """Zahodí index i jeho soubor (aktivní datový soubor byl uzavřen rotací)"""
+        with self._lock:
+            self._reset()
+
+    def refresh(self):
+        """Doplní index o záznamy zapsané od poslední aktualizace"""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            if self._offsets:
+                self._reset()
+            return
+        if size < self._scanned or (self._offsets and self._offsets[-1] >= size):
+            self._reset()
+        if size == self._scanned:
+            return
+
+        new_points = []
+        for offset, end, record_time in self.scanner(self._scanned):
+            # Záznam na posledním bodu (pokračování po načtení) se znovu nepřidává
+            if self._since_point % self.interval == 0 and (not self._offsets or offset > self._offsets[-1]):
+                point = (self.time_key(record_time), offset)
+                self._times.append(point[0])
+                self._offsets.append(offset)
+                new_points.append(point)
+            self._since_point += 1
+            self._scanned = end
+
+        if new_points:
+            try:
+                with open(self.index_path, 'ab') as f:
+                    f.write(b''.join(_INDEX_ENTRY.pack(*point) for point in new_points))
+            except OSError as e:
+                print(f"Error saving time index {self.index_path}: {e}")
+
+    def seek(self, time_ms: int) -> int:
+        """
+        Vrátí offset, od kterého stačí číst záznamy s časem >= time_ms
+        (poslední bod před time_ms, 0 = od začátku souboru)
+        """
+        with self._lock:
+            self._refresh()
+            i = bisect_left(self._times, time_ms) - 1
+            return self._offsets[i] if i >= 0 else 0
+
+    def __len__(self):
+        return len(self._offsets)
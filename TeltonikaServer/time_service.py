@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Sdílená časová zóna a formátování času pro logy a záznamy (zóna se načte jednou)"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+import pytz
+
+DEFAULT_TIMEZONE = 'Europe/Prague'
+LOCAL_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class TimeService:
+    """
+    Časová zóna z prostředí HA (TZ) a lokální čas ve formátu 'YYYY-MM-DD HH:MM:SS'
+    Text se formátuje jednou za sekundu - všechny řádky v téže sekundě dostanou
+    hotový řetězec. Čtení starších dat má vlastní cache, aby se s aktuálním
+    časem nepřetlačovalo.
+    """
+
+    def __init__(self, tz_name: str = None):
+        self.timezone = pytz.timezone(tz_name or os.environ.get('TZ', DEFAULT_TIMEZONE))
+        # (sekunda epoch, text) - dvojice se nahrazuje celá, čtení nepotřebuje zámek
+        self._now_cache = (None, '')
+        self._epoch_cache = (None, '')
+
+    def _format_second(self, second: int) -> str:
+        return datetime.fromtimestamp(second, self.timezone).strftime(LOCAL_TIME_FORMAT)
+
+    def local_time(self) -> str:
+        """Aktuální lokální čas"""
+        second = int(time.time())
+        cached_second, text = self._now_cache
+        if cached_second != second:
+            text = self._format_second(second)
+            self._now_cache = (second, text)
+        return text
+
+    def format_epoch_ms(self, epoch_ms: int) -> str:
+        """Lokální čas záznamu uloženého v epoch ms"""
+        second = epoch_ms // 1000
+        cached_second, text = self._epoch_cache
+        if cached_second != second:
+            text = self._format_second(second)
+            self._epoch_cache = (second, text)
+        return text
+
+    def parse_local(self, local_time: datetime) -> int:
+        """Lokální čas (bez zóny) na epoch ms"""
+        return int(self.timezone.localize(local_time).timestamp() * 1000)
+
+    @staticmethod
+    def epoch_ms() -> int:
+        """Aktuální čas v epoch ms pro ukládání záznamů"""
+        return time.time_ns() // 1000000
+
+
+_time_service = None
+_time_service_lock = threading.Lock()
+
+
+def get_time_service() -> TimeService:
+    """Sdílená instance pro celý proces"""
+    global _time_service
+    if _time_service is None:
+        with _time_service_lock:
+            if _time_service is None:
+                _time_service = TimeService()
+    return _time_service
+
+
+def local_time() -> str:
+    return get_time_service().local_time()
+
+
+def epoch_ms() -> int:
+    return TimeService.epoch_ms()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""UDP listener pro Teltonika AVL - datagramy jdou do stejné ingest pipeline jako TCP rámce"""
+
+import select
+import socket
+import time
+
+from tcp_server import (DeviceSession, close_device_session, get_csv_logger, get_imei_registry,
+                        get_ingest_pipeline, log_print, open_device_session, process_avl_frame, store_avl_frame)
+from teltonika_protocol import build_udp_ack, get_codec, parse_udp_header, wrap_avl_data
+from time_service import epoch_ms
+
+# Kolik datagramů se přečte z fronty socketu najednou (Python nemá recvmmsg)
+UDP_BATCH_SIZE = 64
+# Maximální velikost datagramu a požadovaný přijímací buffer jádra
+UDP_MAX_DATAGRAM = 65535
+UDP_RECEIVE_BUFFER = 4 * 1024 * 1024
+# Po jaké době bez datagramu (s) se relace zařízení uzavře (zavře se zapisovač data.bin)
+UDP_SESSION_TIMEOUT = 300.0
+
+
+class UDPDevice:
+    """Relace zařízení bez spojení - otevřený zapisovač a poslední přijatý AVL packet ID"""
+    __slots__ = ('session', 'address', 'last_seen', 'last_packet')
+
+    def __init__(self, imei, address):
+        self.session = DeviceSession(imei)
+        self.address = address
+        self.last_seen = time.monotonic()
+        self.last_packet = None
+
+
+class UDPListener:
+    """
+    Jeden socket a jeden thread pro všechna UDP zařízení
+    Po probuzení se z fronty socketu přečte dávka datagramů neblokujícím čtením
+    (náhrada recvmmsg) a rámce se zařadí do ingest pipeline. ACK pošle storage
+    worker až po zápisu rámce. Datagram bez ACK zařízení samo zopakuje - opakovaný
+    AVL packet ID se jen znovu potvrdí a neukládá se dvakrát.
+    """
+
+    def __init__(self, sock, allowed_imeis=None, batch_size=UDP_BATCH_SIZE, session_timeout=UDP_SESSION_TIMEOUT):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.allowed_imeis = allowed_imeis
+        self.batch_size = batch_size
+        self.session_timeout = session_timeout
+        self.devices = {}
+        self._buffers = [bytearray(UDP_MAX_DATAGRAM) for _ in range(batch_size)]
+        self._next_expiry = time.monotonic() + session_timeout
+        self._closed = False
+
+        # Metriky pro /api/stats
+        self._datagrams = 0
+        self._batches = 0
+        self._max_batch = 0
+        self._invalid = 0
+        self._duplicates = 0
+        self._rejected = 0
+
+    def receive_batch(self):
+        """Přečte vše, co čeká ve frontě socketu (nejvýše batch_size datagramů)"""
+        batch = []
+        for buffer in self._buffers:
+            try:
+                size, address = self.sock.recvfrom_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                # ICMP port unreachable z předchozího sendto (Windows), datagram nečeká
+                continue
+            # Rámec půjde do fronty pipeline - nesmí odkazovat do sdíleného bufferu
+            batch.append((bytes(buffer[:size]), address))
+        return batch
+
+    def handle_datagram(self, data, address, received_ms):
+        """
+        Zkontroluje datagram a připraví úlohy pro ingest pipeline
+        Returns: (IMEI, úlohy [(fáze, funkce, argumenty)]) - poslední úloha pošle ACK
+        """
+        header = parse_udp_header(data)
+        if header is None:
+            self._invalid += 1
+            get_csv_logger().log_server_event(f"Invalid UDP datagram from {address} ({len(data)} bytes)")
+            return None, []
+
+        device = self._open_device(header.imei, address)
+        if device is None:
+            return header.imei, []
+
+        avl_data = memoryview(data)[header.data_offset:]
+        record_count = avl_data[1]
+        if get_codec(avl_data[0]) is None or avl_data[-1] != record_count:
+            self._invalid += 1
+            get_csv_logger().log_server_event(
+                f"Malformed UDP AVL data from IMEI {header.imei} (codec 0x{avl_data[0]:02X}), not acknowledged")
+            return header.imei, []
+        pipeline = get_ingest_pipeline()
+        ack = build_udp_ack(header.packet_id, header.avl_packet_id, record_count)
+        ack_job = (pipeline.storage, self._acknowledge, (device, ack))
+
+        # ACK se ztratil a zařízení datagram opakuje - stačí potvrdit znovu (po zápisu prvního)
+        if device.last_packet == header.avl_packet_id:
+            self._duplicates += 1
+            return header.imei, [ack_job]
+        device.last_packet = header.avl_packet_id
+
+        frame = wrap_avl_data(avl_data)
+        jobs = [(pipeline.storage, store_avl_frame, (device.session, frame, received_ms)),
+                (pipeline.parse, process_avl_frame, (header.imei, frame, record_count)),
+                ack_job]
+        return header.imei, jobs
+
+    def _acknowledge(self, device, ack):
+        """Storage worker: pošle ACK po zápisu rámce - při chybě zápisu se opakovaný datagram znovu uloží"""
+        if device.session.write_failed:
+            device.last_packet = None
+            get_csv_logger().log_server_event(f"Could not store UDP AVL data from IMEI {device.session.imei}, "
+                                              f"not acknowledged")
+            return
+        try:
+            self.sock.sendto(ack, device.address)
+        except OSError as e:
+            get_csv_logger().log_server_event(f"Could not send UDP ACK to {device.address}: {e}")
+
+    def _open_device(self, imei, address):
+        """Relace zařízení - první datagram IMEI odpovídá TCP handshake"""
+        device = self.devices.get(imei)
+        if device is not None:
+            device.last_seen = time.monotonic()
+            device.address = address
+            return device
+
+        registry = get_imei_registry()
+        if not registry.is_imei_allowed(imei, self.allowed_imeis or []):
+            self._rejected += 1
+            return None
+        is_new_device = registry.register_imei_connection(imei, address[0])
+        csv_logger = get_csv_logger()
+        status = "NEW DEVICE" if is_new_device else "KNOWN DEVICE"
+        csv_logger.log_server_event(f"IMEI {imei} sending over UDP from {address} ({status})")
+        if is_new_device:
+            csv_logger.create_device_info(imei)
+
+        device = UDPDevice(imei, address)
+        get_ingest_pipeline().storage.submit(imei, open_device_session, device.session)
+        self.devices[imei] = device
+        return device
+
+    def expire_devices(self, now=None):
+        """Uzavře relace zařízení, která dlouho nic neposlala"""
+        now = time.monotonic() if now is None else now
+        self._next_expiry = now + min(self.session_timeout, 60.0)
+        expired = [device for device in self.devices.values() if now - device.last_seen >= self.session_timeout]
+        for device in expired:
+            self._close_device(device)
+            get_csv_logger().log_server_event(f"UDP session of IMEI {device.session.imei} expired")
+
+    def _close_device(self, device):
+        del self.devices[device.session.imei]
+        get_ingest_pipeline().storage.submit(device.session.imei, close_device_session, device.session)
+
+    def process_batch(self, batch):
+        """Zařadí rámce celé dávky (plná fronta pipeline zdrží čtení socketu)"""
+        received_ms = epoch_ms()
+        for data, address in batch:
+            try:
+                imei, jobs = self.handle_datagram(data, address, received_ms)
+                for stage, func, args in jobs:
+                    stage.submit(imei, func, *args)
+            except Exception as e:
+                get_csv_logger().log_server_event(f"Error processing UDP datagram from {address}: {e}")
+
+        self._datagrams += len(batch)
+        self._batches += 1
+        if len(batch) > self._max_batch:
+            self._max_batch = len(batch)
+
+    def serve_forever(self, poll_interval=1.0):
+        """Smyčka listeneru - čeká na datagramy a zpracovává je po dávkách"""
+        while not self._closed:
+            readable, _, _ = select.select([self.sock], [], [], poll_interval)
+            if readable:
+                while True:
+                    batch = self.receive_batch()
+                    if not batch:
+                        break
+                    self.process_batch(batch)
+                    if len(batch) < self.batch_size:
+                        break
+            if time.monotonic() >= self._next_expiry:
+                self.expire_devices()
+
+    def close(self):
+        """Ukončí smyčku a uzavře relace všech zařízení"""
+        self._closed = True
+        for device in list(self.devices.values()):
+            self._close_device(device)
+
+    def stats(self):
+        """Metriky pro /api/stats"""
+        return {
+            'datagrams': self._datagrams,
+            'batches': self._batches,
+            'avg_batch': round(self._datagrams / self._batches, 2) if self._batches else 0.0,
+            'max_batch': self._max_batch,
+            'invalid': self._invalid,
+            'duplicates': self._duplicates,
+            'rejected': self._rejected,
+            'sessions': len(self.devices),
+        }
+
+
+def start_udp_server(host='0.0.0.0', port=3030, allowed_imeis=None):
+    """
+    Spustí UDP listener (blokuje) - volá se z TCP serveru po nastavení sdílených komponent
+    Returns až po ukončení listeneru
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+    except OSError as e:
+        log_print(f"Could not raise UDP receive buffer: {e}")
+    sock.bind((host, port))
+
+    listener = UDPListener(sock, allowed_imeis)
+    get_csv_logger().register_stats('udp', listener.stats)
+    log_print(f"UDP listener on {host}:{port} (receive buffer {sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} bytes)")
+    get_csv_logger().log_server_event(f"UDP listener started on port {port}")
+    try:
+        listener.serve_forever()
+    finally:
+        listener.close()
+        sock.close()
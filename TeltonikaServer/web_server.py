@@ -3,14 +3,123 @@
 
 import os
 import json
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 from datetime import datetime
-from csv_logger import CSVLogger
+from email.utils import formatdate, parsedate_to_datetime
+from csv_logger import get_shared_logger
 from buffer_manager import BufferManager
 
+# Počet worker threadů pro obsluhu HTTP požadavků
+DEFAULT_WEB_WORKERS = 8
+# Jak dlouho (s) lze vrátit uloženou odpověď API, pokud se data mezitím nezměnila
+RESPONSE_CACHE_TTL = 2.0
+RESPONSE_CACHE_MAX_ENTRIES = 256
+# Živý proud (/api/events) - max. počet současných odběratelů, interval keepalive (s)
+# a timeout zápisu, po kterém se nestíhající klient odpojí
+MAX_EVENT_STREAMS = 32
+EVENT_KEEPALIVE_INTERVAL = 15.0
+EVENT_SEND_TIMEOUT = 10.0
+# Max. velikost těla POST /api/commands (bytes)
+MAX_COMMAND_BODY = 4096
+
+
+class ResponseCache:
+    """
+    TTL cache hotových odpovědí API
+    Položka platí nejvýše ttl sekund a jen dokud se nezmění verze dat
+    (CSVLogger zvyšuje verzi při každém zápisu z TCP serveru)
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """Vrátí uloženou odpověď (status, body, content_type), nebo None"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, entry_version, response = entry
+        if entry_version != version or time.monotonic() > expires:
+            return None
+        return response
+
+    def put(self, key, version, response):
+        """Uloží odpověď pro danou verzi dat"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (time.monotonic() + self.ttl, version, response)
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer, který obsluhuje požadavky v omezeném poolu worker threadů"""
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WEB_WORKERS,
+                 max_streams=MAX_EVENT_STREAMS):
+        super().__init__(server_address, handler_class)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='web')
+        # Dlouhotrvající spojení (SSE) vyjmutá z poolu - zavírá je jejich vlastní thread
+        self.max_streams = max_streams
+        self._detached = set()
+        self._detached_lock = threading.Lock()
+        self.closing = False
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def detach_request(self, request):
+        """Vyjme spojení z poolu, aby ho worker po odpovědi nezavřel (False = limit vyčerpán)"""
+        with self._detached_lock:
+            if len(self._detached) >= self.max_streams:
+                return False
+            self._detached.add(request)
+            return True
+
+    def release_request(self, request):
+        """Zavře spojení dříve vyjmuté z poolu"""
+        with self._detached_lock:
+            self._detached.discard(request)
+        super().shutdown_request(request)
+
+    def shutdown_request(self, request):
+        with self._detached_lock:
+            if request in self._detached:
+                return
+        super().shutdown_request(request)
+
+    def server_close(self):
+        self.closing = True
+        super().server_close()
+        self._executor.shutdown(wait=False)
+
+
 class TeltonikaWebHandler(BaseHTTPRequestHandler):
-    # base_dir bude nastaven při vytvoření instance
+    # base_dir a response_cache budou nastaveny při vytvoření instance
+    response_cache = ResponseCache(ttl=0)
+    # Posílání příkazů zařízením (POST /api/commands) je potřeba výslovně povolit
+    allow_commands = False
 
     def do_GET(self):
         """Zpracuje GET požadavky"""
@@ -27,14 +136,31 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
                 query = parse_qs(parsed_url.query)
                 imei = query.get('imei', [None])[0]
                 limit = int(query.get('limit', [2000])[0])
-                self._serve_device_data_api(imei, limit)
+                start = query.get('from', [None])[0]
+                end = query.get('to', [None])[0]
+                cursor = query.get('cursor', [None])[0]
+                decoded = query.get('decoded', ['0'])[0] in ('1', 'true')
+                self._serve_device_data_api(imei, limit, start, end, cursor, decoded)
             elif path == '/api/server_log':
                 limit = int(parse_qs(parsed_url.query).get('limit', [2000])[0])
                 self._serve_server_log_api(limit)
+            elif path == '/api/stats':
+                self._serve_stats_api()
+            elif path == '/api/commands':
+                query = parse_qs(parsed_url.query)
+                imei = query.get('imei', [None])[0]
+                command_id = query.get('id', [None])[0]
+                self._serve_commands_api(imei, int(command_id) if command_id else None)
+            elif path == '/api/events':
+                query = parse_qs(parsed_url.query)
+                imei = query.get('imei', [None])[0]
+                last_id = self.headers.get('Last-Event-ID') or query.get('last_id', [None])[0]
+                self._serve_events(imei, int(last_id) if last_id else None)
             elif path == '/api/download_csv':
                 query = parse_qs(parsed_url.query)
                 imei = query.get('imei', [None])[0]
-                self._serve_csv_download(imei)
+                compress = query.get('gzip', ['0'])[0] in ('1', 'true')
+                self._serve_csv_download(imei, compress)
             else:
                 self._serve_404()
         except Exception as e:
@@ -43,6 +169,19 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
             traceback.print_exc()
             self._serve_error(str(e))
 
+    def do_POST(self):
+        """Zpracuje POST požadavky (zařazení příkazu pro zařízení)"""
+        path = urlparse(self.path).path
+        try:
+            if path == '/api/commands':
+                self._queue_command_api()
+            else:
+                self._serve_404()
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            self._serve_error(str(e))
+
     def _serve_main_page(self):
         """Služí hlavní HTML stránku s taby"""
         html = """<!DOCTYPE html>
@@ -167,6 +306,11 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
         
         let currentDevice = null;
         let refreshInterval = null;
+        let activeTab = 'overview';
+        let devices = {};
+        let eventSource = null;
+        const MAX_DEVICE_ROWS = 100;
+        const MAX_LOG_LINES = 500;
         
         function showTab(tabName, element) {
             // Skryj všechny taby
@@ -176,6 +320,7 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
             // Zobraz vybraný tab
             document.getElementById(tabName).style.display = 'block';
             if (element) element.classList.add('active');
+            activeTab = tabName;
             
             // Zastavit automatické obnovování
             if (refreshInterval) {
@@ -190,8 +335,10 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
                 loadDevices();
             } else if (tabName === 'server-log') {
                 loadServerLog();
-                // Automatické obnovování server logu
-                refreshInterval = setInterval(loadServerLog, 5000);
+                // Nové řádky posílá živý proud, bez něj se log obnovuje dotazováním
+                if (!eventSource) {
+                    refreshInterval = setInterval(loadServerLog, 5000);
+                }
             }
         }
         
@@ -205,25 +352,8 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
                 
                 const responseText = await response.text();
                 
-                const devices = JSON.parse(responseText);
-                
-                let html = '<h3>Registrovaná zařízení (' + devices.length + ')</h3>';
-                if (devices.length === 0) {
-                    html += '<p>Zatím se nepřipojila žádná zařízení.</p>';
-                } else {
-                    html += '<table><tr><th>IMEI</th><th>Název</th><th>Poslední záznam</th><th>Počet záznamů</th></tr>';
-                    devices.forEach(device => {
-                        html += `<tr>
-                            <td>$${device.imei}</td>
-                            <td>Device $${device.imei}</td>
-                            <td>$${device.last_seen}</td>
-                            <td>$${device.record_count}</td>
-                        </tr>`;
-                    });
-                    html += '</table>';
-                }
-                
-                document.getElementById('devices-overview').innerHTML = html;
+                setDevices(JSON.parse(responseText));
+                renderOverview();
             } catch (error) {
                 let errorMsg = 'Unknown error';
                 if (error.message) {
@@ -245,19 +375,8 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
                 
                 const responseText = await response.text();
                 
-                const devices = JSON.parse(responseText);
-                
-                let html = '';
-                devices.forEach(device => {
-                    const isSelected = currentDevice === device.imei ? 'selected' : '';
-                    html += `<div class="device-item $${isSelected}" onclick="selectDevice('$${device.imei}')">
-                        <strong>$${device.imei}</strong><br>
-                        <small>Záznamů: $${device.record_count}</small><br>
-                        <small>Naposledy: $${device.last_seen}</small>
-                    </div>`;
-                });
-                
-                document.getElementById('device-list').innerHTML = html;
+                setDevices(JSON.parse(responseText));
+                renderDeviceList();
                 
                 // Pokud máme vybrané zařízení, načti jeho data
                 if (currentDevice) {
@@ -274,6 +393,46 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
             }
         }
         
+        function setDevices(deviceList) {
+            devices = {};
+            deviceList.forEach(device => devices[device.imei] = device);
+        }
+        
+        function renderOverview() {
+            const deviceList = Object.values(devices);
+            let html = '<h3>Registrovaná zařízení (' + deviceList.length + ')</h3>';
+            if (deviceList.length === 0) {
+                html += '<p>Zatím se nepřipojila žádná zařízení.</p>';
+            } else {
+                html += '<table><tr><th>IMEI</th><th>Název</th><th>Poslední záznam</th><th>Počet záznamů</th></tr>';
+                deviceList.forEach(device => {
+                    html += `<tr>
+                        <td>$${device.imei}</td>
+                        <td>Device $${device.imei}</td>
+                        <td>$${device.last_seen}</td>
+                        <td>$${device.record_count}</td>
+                    </tr>`;
+                });
+                html += '</table>';
+            }
+            
+            document.getElementById('devices-overview').innerHTML = html;
+        }
+        
+        function renderDeviceList() {
+            let html = '';
+            Object.values(devices).forEach(device => {
+                const isSelected = currentDevice === device.imei ? 'selected' : '';
+                html += `<div class="device-item $${isSelected}" onclick="selectDevice('$${device.imei}')">
+                    <strong>$${device.imei}</strong><br>
+                    <small>Záznamů: $${device.record_count}</small><br>
+                    <small>Naposledy: $${device.last_seen}</small>
+                </div>`;
+            });
+            
+            document.getElementById('device-list').innerHTML = html;
+        }
+        
         function selectDevice(imei) {
             currentDevice = imei;
             loadDevices(); // Obnoví seznam s označeným zařízením
@@ -299,10 +458,10 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
                 }
                 
                 let html = `<div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px;">
-                    <h3>RAW Data pro zařízení $${imei} (posledních $${records.length} záznamů)</h3>
+                    <h3>RAW Data pro zařízení $${imei} (posledních <span id="device-data-count">$${records.length}</span> záznamů)</h3>
                     <a href="api/download_csv?imei=$${imei}" class="download-btn">📥 Stáhnout CSV</a>
                 </div>`;
-                html += '<table><tr>';
+                html += '<table id="device-data-table"><tr>';
                 html += '<th>Čas</th><th>RAW Data</th>';
                 html += '</tr>';
                 
@@ -352,17 +511,96 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
             }
         }
         
+        function appendDeviceRecord(record) {
+            const table = document.getElementById('device-data-table');
+            if (!table) {
+                // Zatím žádná data - načti tabulku celou
+                loadDeviceData(record.imei);
+                return;
+            }
+            const row = table.insertRow(-1);
+            row.insertCell(-1).textContent = record.timestamp;
+            const dataCell = row.insertCell(-1);
+            dataCell.style.cssText = 'font-family: monospace; font-size: 11px; word-break: break-all;';
+            dataCell.textContent = record.raw_data;
+            while (table.rows.length > MAX_DEVICE_ROWS + 1) {
+                table.deleteRow(1);
+            }
+            document.getElementById('device-data-count').textContent = table.rows.length - 1;
+        }
+        
+        function appendLogLine(line) {
+            const container = document.getElementById('server-log-content');
+            const atBottom = container.scrollTop + container.clientHeight >= container.scrollHeight - 5;
+            container.appendChild(document.createTextNode(line));
+            container.appendChild(document.createElement('br'));
+            while (container.childNodes.length > 2 * MAX_LOG_LINES) {
+                container.removeChild(container.firstChild);
+            }
+            if (atBottom) {
+                container.scrollTop = container.scrollHeight;
+            }
+        }
+        
+        function onLiveRecord(record) {
+            const device = devices[record.imei];
+            if (device) {
+                device.record_count += 1;
+                device.last_seen = record.timestamp;
+            } else {
+                devices[record.imei] = {imei: record.imei, last_seen: record.timestamp, record_count: 1};
+            }
+            
+            if (activeTab === 'overview') {
+                renderOverview();
+            } else if (activeTab === 'devices') {
+                renderDeviceList();
+                if (record.imei === currentDevice) {
+                    appendDeviceRecord(record);
+                }
+            }
+        }
+        
+        function reloadActiveTab() {
+            if (activeTab === 'overview') {
+                loadOverview();
+            } else if (activeTab === 'devices') {
+                loadDevices();
+            } else if (activeTab === 'server-log') {
+                loadServerLog();
+            }
+        }
+        
+        // Živý proud nových záznamů a logu místo periodického dotazování
+        function startLiveFeed() {
+            if (!window.EventSource) {
+                return;
+            }
+            eventSource = new EventSource('api/events');
+            eventSource.addEventListener('record', event => onLiveRecord(JSON.parse(event.data)));
+            eventSource.addEventListener('log', event => {
+                if (activeTab === 'server-log') {
+                    appendLogLine(JSON.parse(event.data).line);
+                }
+            });
+            eventSource.addEventListener('reset', reloadActiveTab);
+        }
+        
         
         // Načti přehled při načtení stránky
         window.onload = function() {
+            startLiveFeed();
             loadOverview();
         };
         
-        // Zastavit interval při zavření stránky
+        // Zastavit interval a živý proud při zavření stránky
         window.onbeforeunload = function() {
             if (refreshInterval) {
                 clearInterval(refreshInterval);
             }
+            if (eventSource) {
+                eventSource.close();
+            }
         };
     </script>
 </body>
@@ -380,16 +618,22 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
                 self._send_json_response({"error": f"Base directory not found: {self.base_dir}"}, status=500)
                 return
                 
-            csv_logger = CSVLogger(self.base_dir)
-            devices = csv_logger.get_all_devices()
-            self._send_json_response(devices)
+            csv_logger = get_shared_logger(self.base_dir)
+            self._send_cached(('devices',), csv_logger.data_version,
+                              lambda: self._json_response(csv_logger.get_all_devices()))
         except Exception as e:
             import traceback
             traceback.print_exc()
             self._send_json_response({"error": f"API Error: {str(e)}"}, status=500)
 
-    def _serve_device_data_api(self, imei, limit):
-        """API endpoint pro data konkrétního zařízení"""
+    def _serve_device_data_api(self, imei, limit, start=None, end=None, cursor=None, decoded=False):
+        """
+        API endpoint pro data konkrétního zařízení
+        Bez parametrů vrací posledních limit záznamů. S from/to (epoch ms nebo lokální
+        'YYYY-MM-DD HH:MM:SS') nebo cursor vrací časové okno od nejstaršího po stránkách:
+        {"records": [...], "next_cursor": "..." nebo null}
+        S decoded=1 je místo hex řádku dekódovaný rámec {timestamp, codec, records: [GPS/IO]}
+        """
         if not imei:
             self._send_json_response({"error": "IMEI parameter required"}, status=400)
             return
@@ -399,9 +643,29 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
                 self._send_json_response({"error": f"Base directory not found: {self.base_dir}"}, status=500)
                 return
                 
-            csv_logger = CSVLogger(self.base_dir)
-            records = csv_logger.read_last_records(imei, limit)
-            self._send_json_response(records)
+            csv_logger = get_shared_logger(self.base_dir)
+            if start or end or cursor:
+                try:
+                    start_ms = csv_logger.parse_time(start) if start else None
+                    end_ms = csv_logger.parse_time(end) if end else None
+                except ValueError as e:
+                    self._send_json_response({"error": str(e)}, status=400)
+                    return
+                
+                def build_page():
+                    try:
+                        records, next_cursor = csv_logger.query_records(imei, start_ms, end_ms, limit, cursor,
+                                                                        decoded)
+                    except ValueError as e:
+                        return self._json_response({"error": str(e)}, status=400)
+                    return self._json_response({"records": records, "next_cursor": next_cursor})
+                
+                self._send_cached(('device_data', imei, limit, start_ms, end_ms, cursor, decoded),
+                                  csv_logger.data_version, build_page)
+                return
+            
+            self._send_cached(('device_data', imei, limit, decoded), csv_logger.data_version,
+                              lambda: self._json_response(csv_logger.read_last_records(imei, limit, decoded)))
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -414,64 +678,319 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
                 self._send_response(500, f"Base directory not found: {self.base_dir}", 'text/plain')
                 return
                 
-            csv_logger = CSVLogger(self.base_dir)
-            log_content = csv_logger.get_server_log_tail(limit)
-            self._send_response(200, log_content, 'text/plain')
+            csv_logger = get_shared_logger(self.base_dir)
+            self._send_cached(('server_log', limit), csv_logger.log_version,
+                              lambda: (200, csv_logger.get_server_log_tail(limit).encode('utf-8'), 'text/plain'))
         except Exception as e:
             import traceback
             traceback.print_exc()
             self._send_response(500, f"Server log API Error: {e}", 'text/plain')
 
-    def _serve_csv_download(self, imei):
-        """API endpoint pro stažení CSV souboru zařízení"""
+    def _serve_stats_api(self):
+        """API endpoint pro provozní metriky (fronta a latence zápisu server logu)"""
+        try:
+            csv_logger = get_shared_logger(self.base_dir)
+            self._send_json_response(csv_logger.get_stats())
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            self._send_json_response({"error": f"API Error: {str(e)}"}, status=500)
+
+    def _serve_commands_api(self, imei, command_id):
+        """API endpoint pro stav příkazů - jeden příkaz (?id=), nebo poslední příkazy (volitelně ?imei=)"""
+        commands = get_shared_logger(self.base_dir).commands
+        if command_id is None:
+            self._send_json_response(commands.list_commands(imei))
+            return
+        command = commands.get(command_id)
+        if command is None:
+            self._send_json_response({"error": f"Unknown command {command_id}"}, status=404)
+        else:
+            self._send_json_response(command)
+
+    def _queue_command_api(self):
+        """
+        Zařadí příkaz pro zařízení: {"imei": "...", "command": "getinfo"}
+        Příkaz odejde jako Codec12 po dalším ACK otevřeného spojení zařízení,
+        odpověď se doplní do stavu příkazu (GET /api/commands?id=...)
+        Jen s volbou allow_commands a pro zařízení, které se už připojilo.
+        """
+        if not self.allow_commands:
+            self._send_json_response({"error": "Device commands are disabled (allow_commands option)"}, status=403)
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_COMMAND_BODY:
+                self.close_connection = True
+                self._send_json_response({"error": f"Request body larger than {MAX_COMMAND_BODY} bytes"}, status=400)
+                return
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            imei = str(payload.get('imei') or '')
+            command = str(payload.get('command') or '')
+        except (ValueError, AttributeError):
+            self._send_json_response({"error": "JSON body with imei and command required"}, status=400)
+            return
+        if not imei.isdigit():
+            self._send_json_response({"error": "IMEI parameter required"}, status=400)
+            return
+        csv_logger = get_shared_logger(self.base_dir)
+        if not csv_logger.is_known_device(imei):
+            self._send_json_response({"error": f"Unknown IMEI {imei}"}, status=400)
+            return
+        try:
+            queued = csv_logger.commands.enqueue(imei, command)
+        except ValueError as e:
+            self._send_json_response({"error": str(e)}, status=400)
+            return
+        self._send_json_response(queued.to_dict(), status=202)
+
+    def _serve_events(self, imei, last_id):
+        """
+        SSE endpoint - posílá nové záznamy ('record') a řádky server logu ('log'),
+        jakmile je TCP server zapíše. Spojení se vyjme z poolu workerů a obsluhuje
+        ho vlastní thread, takže otevřené stránky neblokují ostatní požadavky.
+        """
+        live_feed = get_shared_logger(self.base_dir).live_feed
+        if last_id is None:
+            last_id = live_feed.last_id
+        if not self.server.detach_request(self.request):
+            self._send_response(503, "Too many event streams", 'text/plain')
+            return
+        
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+        except Exception:
+            self.server.release_request(self.request)
+            raise
+        self.close_connection = True
+        threading.Thread(target=self._stream_events, args=(self.request, live_feed, imei, last_id),
+                         name='web-events', daemon=True).start()
+
+    def _stream_events(self, sock, live_feed, imei, last_id):
+        """Smyčka jednoho SSE odběratele (vlastní thread)"""
+        try:
+            sock.settimeout(EVENT_SEND_TIMEOUT)
+            with live_feed.subscribe():
+                sock.sendall(b'retry: 3000\n\n')
+                while not self.server.closing:
+                    events = live_feed.wait_events(last_id, EVENT_KEEPALIVE_INTERVAL)
+                    if events is None:
+                        # Klient nestíhal nebo se připojuje po restartu - ať načte data znovu
+                        last_id = live_feed.last_id
+                        chunk = f'id: {last_id}\nevent: reset\ndata: {{}}\n\n'
+                    elif not events:
+                        chunk = ': keepalive\n\n'
+                    else:
+                        last_id = events[-1].event_id
+                        chunk = ''.join(
+                            f'id: {event.event_id}\nevent: {event.event_type}\n'
+                            f'data: {json.dumps(event.data, ensure_ascii=False)}\n\n'
+                            for event in events
+                            if imei is None or event.event_type not in ('record', 'command')
+                            or event.data['imei'] == imei)
+                    if chunk:
+                        sock.sendall(chunk.encode('utf-8'))
+        except OSError:
+            pass  # Klient se odpojil
+        finally:
+            self.server.release_request(sock)
+
+    def _serve_csv_download(self, imei, compress=False):
+        """
+        API endpoint pro stažení CSV souboru zařízení
+        Export se posílá po blocích (konstantní paměť), podporuje Range (navázání
+        přerušeného stahování), ETag/If-Modified-Since a volitelně gzip (?gzip=1)
+        """
         if not imei:
             self._send_response(400, "Missing IMEI parameter", 'text/plain')
             return
         
-            
+        export = None
+        headers_sent = False
         try:
-            import os
-            from datetime import datetime
+            # CSV z data.csv i binárního úložiště data.bin
+            csv_logger = get_shared_logger(self.base_dir)
+            export = csv_logger.open_csv_export(imei)
             
-            # Cesta k CSV souboru
-            csv_file = os.path.join(self.base_dir, 'devices', imei, 'data.csv')
-            
-            if not os.path.exists(csv_file):
+            if export is None:
                 self._send_response(404, f"CSV file not found for IMEI {imei}", 'text/plain')
                 return
             
-            # Načti CSV content
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                csv_content = f.read()
+            last_modified = formatdate(export.mtime, usegmt=True)
+            if self._not_modified(export.etag, export.mtime):
+                self.send_response(304)
+                self.send_header('ETag', export.etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                return
+            
+            byte_range = self._parse_range(export.size, export.etag, export.mtime)
+            if byte_range == 'invalid':
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{export.size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
             
             # Generuj filename s datem
             today = datetime.now().strftime('%Y-%m-%d')
             filename = f"teltonika_{imei}_{today}.csv"
             
+            # Gzip jen pro celý soubor - rozsahy se vztahují k nekomprimovaným datům
+            accepts_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+            compress = compress and accepts_gzip and byte_range is None
+            start, end = byte_range or (0, export.size)
+            
             # Pošli jako stažený soubor
-            self.send_response(200)
+            headers_sent = True
+            self.send_response(206 if byte_range else 200)
             self.send_header('Content-Type', 'text/csv; charset=utf-8')
             self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', export.etag)
+            self.send_header('Last-Modified', last_modified)
             self.send_header('Access-Control-Allow-Origin', '*')
+            if byte_range:
+                self.send_header('Content-Range', f'bytes {start}-{end - 1}/{export.size}')
+            if compress:
+                # Délka komprimovaných dat není předem známá - konec těla = zavření spojení
+                self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Vary', 'Accept-Encoding')
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            else:
+                self.send_header('Content-Length', str(end - start))
             self.end_headers()
-            self.wfile.write(csv_content.encode('utf-8'))
             
+            if self.command == 'HEAD':
+                return
+            chunks = export.iter_bytes(start, end)
+            if compress:
+                chunks = self._gzip_chunks(chunks)
+            for chunk in chunks:
+                self.wfile.write(chunk)
+            
+        except (BrokenPipeError, ConnectionResetError):
+            # Klient přerušil stahování - může navázat přes Range
+            self.close_connection = True
         except Exception as e:
-            self._send_response(500, f"Error downloading CSV: {e}", 'text/plain')
+            if not headers_sent:
+                self._send_response(500, f"Error downloading CSV: {e}", 'text/plain')
+                return
+            # Hlavička 200/206 už odešla - nedokončené tělo pozná klient podle zavřeného spojení
+            print(f"Error streaming CSV for IMEI {imei}, connection aborted: {e}")
+            self.close_connection = True
+        finally:
+            if export is not None:
+                export.close()
+
+    def _not_modified(self, etag, mtime):
+        """True, pokud klient má aktuální verzi (If-None-Match má přednost před If-Modified-Since)"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _parse_range(self, size, etag, mtime):
+        """
+        Zpracuje hlavičku Range (jeden rozsah bytes=start-end, bytes=start-, bytes=-suffix)
+        Returns: (start, end) s exkluzivním koncem, None pro celý soubor, 'invalid' pro 416
+        """
+        range_header = self.headers.get('Range')
+        if not range_header or not range_header.startswith('bytes='):
+            return None
+        
+        # If-Range: rozsah platí jen pro nezměněný soubor, jinak se posílá celý
+        if_range = self.headers.get('If-Range')
+        if if_range:
+            if if_range.startswith('"') or if_range.startswith('W/'):
+                if if_range != etag:
+                    return None
+            else:
+                try:
+                    if int(mtime) > parsedate_to_datetime(if_range).timestamp():
+                        return None
+                except (TypeError, ValueError):
+                    return None
+        
+        spec = range_header[len('bytes='):].strip()
+        if ',' in spec:
+            return None  # Více rozsahů (multipart) nepodporujeme - pošli celý soubor
+        first, _, last = spec.partition('-')
+        try:
+            if not first:
+                suffix = int(last)
+                if suffix <= 0:
+                    return 'invalid'
+                return max(0, size - suffix), size
+            start = int(first)
+            end = int(last) + 1 if last else size
+        except ValueError:
+            return None
+        if start >= size or end <= start:
+            return 'invalid'
+        return start, min(end, size)
 
+    @staticmethod
+    def _gzip_chunks(chunks):
+        """Komprimuje proud bloků do gzip formátu"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def do_HEAD(self):
+        """HEAD jen pro stažení CSV (velikost a ETag bez těla)"""
+        parsed_url = urlparse(self.path)
+        if parsed_url.path == '/api/download_csv':
+            imei = parse_qs(parsed_url.query).get('imei', [None])[0]
+            self._serve_csv_download(imei)
+        else:
+            self._serve_404()
 
     def _send_response(self, status_code, content, content_type):
         """Pošle HTTP odpověď"""
+        self._send_bytes(status_code, content.encode('utf-8'), content_type)
+
+    def _send_bytes(self, status_code, body, content_type):
+        """Pošle HTTP odpověď s již zakódovaným tělem"""
         self.send_response(status_code)
         self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(content.encode('utf-8'))
+        self.wfile.write(body)
+
+    def _json_response(self, data, status=200):
+        """Sestaví JSON odpověď (status, body, content_type)"""
+        json_data = json.dumps(data, ensure_ascii=False, indent=2)
+        return status, json_data.encode('utf-8'), 'application/json'
 
     def _send_json_response(self, data, status=200):
         """Pošle JSON odpověď"""
-        json_data = json.dumps(data, ensure_ascii=False, indent=2)
-        self._send_response(status, json_data, 'application/json')
+        self._send_bytes(*self._json_response(data, status))
+
+    def _send_cached(self, key, version, build_response):
+        """Pošle odpověď z cache, nebo ji sestaví a uloží (jen úspěšné odpovědi)"""
+        response = self.response_cache.get(key, version)
+        if response is None:
+            response = build_response()
+            if response[0] == 200:
+                self.response_cache.put(key, version, response)
+        self._send_bytes(*response)
 
     def _serve_404(self):
         """404 Not Found"""
@@ -485,8 +1004,9 @@ class TeltonikaWebHandler(BaseHTTPRequestHandler):
         """Potlač výchozí HTTP server logy"""
         pass
 
-def start_web_server(host='0.0.0.0', port=3031, base_dir=None):
-    """Spustí web server"""
+def start_web_server(host='0.0.0.0', port=3031, base_dir=None, workers=DEFAULT_WEB_WORKERS,
+                     cache_ttl=RESPONSE_CACHE_TTL, allow_commands=False):
+    """Spustí web server (požadavky obsluhuje pool worker threadů)"""
     
     # Pokud není base_dir specifikováno, použij stejnou logiku jako main.py
     if base_dir is None:
@@ -498,12 +1018,15 @@ def start_web_server(host='0.0.0.0', port=3031, base_dir=None):
     
     # Vytvoříme handler s nastaveným base_dir
     class ConfiguredHandler(TeltonikaWebHandler):
+        response_cache = ResponseCache(ttl=cache_ttl)
+        
         def __init__(self, *args, **kwargs):
             self.base_dir = base_dir
+            self.allow_commands = allow_commands
             super().__init__(*args, **kwargs)
     
-    server = HTTPServer((host, port), ConfiguredHandler)
-    print(f"Web server listening on http://{host}:{port}")
+    server = PooledHTTPServer((host, port), ConfiguredHandler, workers)
+    print(f"Web server listening on http://{host}:{port} ({workers} workers)")
     print(f"Using base directory: {base_dir}")
     
     try: